@@ -0,0 +1,370 @@
+# Benchmarks the feature extraction: the spacy parse, every feature and every
+# artifact of the feature registry (features.registry) which is calculated by
+# extract_features.calculate_features, the loading of the lookup tables and the
+# writing of the output file. The benchmarks run on the texts of the demo corpora
+# (demo_data) and on synthetic documents of 10 to 10,000 sentences, which are
+# drawn from the sentences of the demo corpora. The results are written as
+# JSON with the git commit, so that the results of two commits can be compared
+# (see --compare).
+# Run the benchmarks from the root directory of the repository:
+# $ python benchmarks/benchmark_features.py -o "benchmark_results.json"
+# $ python benchmarks/benchmark_features.py -o "new.json" --compare "old.json"
+import re
+import sys
+import json
+import time
+import random
+import platform
+import statistics
+import subprocess
+import tempfile
+import click
+
+from pathlib import Path
+from datetime import datetime, timezone
+
+# the modules of the repository are imported from its root directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from constants import SPACY_MODEL, FEATURE_GROUPS, FEATURES, TOKEN_FREQ, TOKEN_LOG_RANK_KEYS, \
+    TOKEN_LOG_RANKS, TOKEN_LOG_RANK_HASH, DISCOURSE_MARKER, DISCOURSE_MARKER_WITH_SENSE, ALL_DISCOURSE_MARKER, \
+    DEMO_MINIKLEXI, DEMO_KLEXIKON, DEMO_WIKI
+from utils_and_preprocess.utils import get_data_from_json_file, select_feature_groups
+from utils_and_preprocess.resources import get_model_version
+from utils_and_preprocess.feature_writer import open_feature_writer, write_feature_row, \
+    close_feature_writer, create_feature_row, OUTPUT_FORMATS, pyarrow
+from extract_features import load_model_for_feature_groups, load_lookup_tables, calculate_features, \
+    get_selected_features
+from features.registry import ARTIFACTS, plan_features, get_feature_arguments, compute_artifact, compute_feature
+from features.doc_statistics import STATISTICS_BACKENDS, get_lemmas
+from features.semantic_similarity_features import calculate_average_semantic_similarity, \
+    calculate_linear_average_semantic_similarity, sample_average_semantic_similarity, SIMILARITY_SAMPLE_BUDGET
+from features.lexical_features import load_log_rank_table, create_log_rank_table
+from features.discourse_features import create_discourse_marker_matcher, create_sense_index
+
+# the demo corpora with the key of their texts
+DEMO_CORPORA = {
+    "miniklexi": (DEMO_MINIKLEXI, "einfache"),
+    "klexikon": (DEMO_KLEXIKON, "klexikon"),
+    "wiki": (DEMO_WIKI, "wiki")
+}
+# number of sentences of the synthetic documents
+SYNTHETIC_SIZES = [10, 100, 1000, 10000]
+# number of rows written in the benchmark of the output file
+NUMBER_OF_ROWS = 10000
+# the word classes of the semantic similarity features
+WORD_CLASSES = ["nouns", "verbs", "adjectives"]
+
+
+def get_git_commit():
+    """Returns the current git commit of the repository and if the working tree
+    has changes, or None outside of a git repository.
+    :return: dict or None """
+    repository = Path(__file__).resolve().parent.parent
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=repository, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        changes = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=repository,
+                                 capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return {"commit": commit, "dirty": bool(changes)}
+
+
+def time_function(function, repeats, setup=None):
+    """Calls the function repeats times and measures the wall time of each call.
+    :param function: function without arguments
+    :param repeats: int
+    :param setup: function without arguments which is called (untimed) before each call or None
+    :return: dict with the times in seconds """
+    times = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {"min": min(times), "mean": statistics.mean(times), "median": statistics.median(times),
+            "repeats": repeats}
+
+
+def read_demo_corpora():
+    """Reads the texts of the demo corpora, a corpus which can not be read is
+    left out.
+    :return: dict with the corpus names as keys and lists of texts as values """
+    corpora = dict()
+    for corpus, (corpus_path, key) in DEMO_CORPORA.items():
+        try:
+            corpora[corpus] = [elem["text"] for elem in get_data_from_json_file(corpus_path)[key]]
+        except (OSError, ValueError, KeyError) as error:
+            print(f"The demo corpus {corpus_path} is left out: {error}")
+    return corpora
+
+
+def create_synthetic_documents(texts, sizes, seed=0):
+    """Creates one synthetic document for each size from sentences which are
+    drawn (with replacement) from the texts. The sentences are split at the
+    sentence punctuation.
+    :param texts: list of strings
+    :param sizes: list of numbers of sentences
+    :param seed: int
+    :return: dict with the names of the documents as keys and lists with the text as values """
+    sentences = [sentence for text in texts for sentence in re.split(r"(?<=[.!?])\s+", text) if sentence]
+    rng = random.Random(seed)
+    return {f"synthetic_{size}": [" ".join(rng.choice(sentences) for _ in range(size))] for size in sizes}
+
+
+def benchmark_tables(nlp, repeats):
+    """Times the loading of the lookup tables without the caches of
+    utils_and_preprocess.resources.
+    :param nlp: spacy model (for the discourse marker matcher)
+    :param repeats: int
+    :return: list of dicts """
+    def load_discourse_marker_tables():
+        disc_marker = get_data_from_json_file(DISCOURSE_MARKER)
+        discourse_markers_with_sense = get_data_from_json_file(DISCOURSE_MARKER_WITH_SENSE)
+        create_sense_index(get_data_from_json_file(ALL_DISCOURSE_MARKER))
+        create_discourse_marker_matcher(nlp, disc_marker, discourse_markers_with_sense)
+
+    tables = {
+        "log_rank_table_npy": lambda: load_log_rank_table(TOKEN_LOG_RANK_KEYS, TOKEN_LOG_RANKS,
+                                                           TOKEN_LOG_RANK_HASH, TOKEN_FREQ),
+        "log_rank_table_json": lambda: create_log_rank_table(get_data_from_json_file(TOKEN_FREQ)),
+        "discourse_marker_tables": load_discourse_marker_tables
+    }
+    return [dict(benchmark=f"load_{table}", input="tables", **time_function(load, repeats))
+            for table, load in tables.items()]
+
+
+def benchmark_parse(nlp, name, texts, repeats):
+    """Times the parsing of the texts with nlp.pipe.
+    :param nlp: spacy model
+    :param name: str, the name of the input
+    :param texts: list of strings
+    :param repeats: int
+    :return: tuple (dict, list of the parsed docs) """
+    docs = []
+
+    def parse():
+        docs[:] = nlp.pipe(texts)
+
+    timing = time_function(parse, repeats)
+    size = {"documents": len(docs), "characters": sum(len(text) for text in texts),
+            "tokens": sum(len(doc) for doc in docs)}
+    return dict(benchmark="parse", input=name, **size, **timing), docs, size
+
+
+def reset_user_data(docs, keep=()):
+    """Removes the cached artifacts of the docs (e.g. the doc statistics and
+    the discourse marker matches, see features.registry.ARTIFACTS) except the keys in keep.
+    :param docs: list of spacy.tokens.doc.Doc
+    :param keep: tuple of keys of doc.user_data """
+    for doc in docs:
+        for key in list(doc.user_data):
+            if key not in keep:
+                del doc.user_data[key]
+
+
+def benchmark_features(docs, name, size, nlp, log_rank_table, discourse_marker, groups, repeats):
+    """Times every artifact (the token statistics with each backend) and every
+    feature of the plan of the selected groups (see features.registry) and
+    calculate_features on the parsed docs. The features are timed with their
+    artifacts already computed, so that each feature is only timed with its own work.
+    :param docs: list of spacy.tokens.doc.Doc
+    :param name: str, the name of the input
+    :param size: dict with the number of documents, characters and tokens
+    :param nlp: spacy model
+    :param log_rank_table: log-rank table of the token frequencies
+    :param discourse_marker: dict of discourse markers and senses or None
+    :param groups: list of feature groups
+    :param repeats: int
+    :return: list of dicts """
+    results = []
+    plan = plan_features(tuple(get_selected_features(groups)))
+    for artifact in plan["artifacts"]:
+        backends = STATISTICS_BACKENDS if artifact == "doc_statistics" else ["python"]
+        for backend in backends:
+            arguments = [get_feature_arguments(doc, nlp, log_rank_table, discourse_marker, backend) for doc in docs]
+            timing = time_function(lambda: [compute_artifact(artifact, doc_arguments) for doc_arguments in arguments],
+                                   repeats, setup=lambda: reset_user_data(docs))
+            benchmark = f"{artifact}_{backend}" if artifact == "doc_statistics" else artifact
+            results.append(dict(benchmark=benchmark, input=name, **size, **timing))
+
+    reset_user_data(docs)
+    arguments = [get_feature_arguments(doc, nlp, log_rank_table, discourse_marker) for doc in docs]
+    for doc_arguments in arguments:
+        for artifact in plan["artifacts"]:
+            compute_artifact(artifact, doc_arguments)
+    artifact_keys = tuple(ARTIFACTS[artifact]["key"] for artifact in plan["artifacts"])
+    for feature, selection in zip(plan["features"], plan["selections"]):
+        timing = time_function(lambda: [compute_feature(feature, doc_arguments, selection)
+                                        for doc_arguments in arguments],
+                               repeats, setup=lambda: reset_user_data(docs, artifact_keys))
+        benchmark = f"{feature['group']}.{feature['function'].__name__}"
+        results.append(dict(benchmark=benchmark, input=name, **size, **timing))
+
+    timing = time_function(lambda: [calculate_features(doc, nlp, log_rank_table, discourse_marker, groups=groups)
+                                    for doc in docs], repeats, setup=lambda: reset_user_data(docs))
+    results.append(dict(benchmark="calculate_features", input=name, **size, **timing))
+    return results
+
+
+def benchmark_similarity_modes(docs, name, size, nlp, repeats, budget=SIMILARITY_SAMPLE_BUDGET):
+    """Times the modes of the average semantic similarity (see
+    features.semantic_similarity_features.SIMILARITY_MODES) on the lemmas of
+    the nouns, verbs and adjectives of the docs and compares their results with
+    the exact averages: the largest absolute error of each mode and for the
+    sampled mode the widest confidence interval and the share of the intervals
+    which contain the exact average.
+    :param docs: list of spacy.tokens.doc.Doc
+    :param name: str, the name of the input
+    :param size: dict with the number of documents, characters and tokens
+    :param nlp: spacy model
+    :param repeats: int
+    :param budget: number of sampled pairs
+    :return: list of dicts """
+    lists_of_lemmas = [get_lemmas(doc)[word_class] for doc in docs for word_class in WORD_CLASSES]
+    exact = [calculate_average_semantic_similarity(lemmas, nlp) for lemmas in lists_of_lemmas]
+    results = []
+    timing = time_function(lambda: [calculate_average_semantic_similarity(lemmas, nlp)
+                                    for lemmas in lists_of_lemmas], repeats)
+    results.append(dict(benchmark="similarity_exact", input=name, **size, **timing))
+
+    linear = [calculate_linear_average_semantic_similarity(lemmas, nlp) for lemmas in lists_of_lemmas]
+    timing = time_function(lambda: [calculate_linear_average_semantic_similarity(lemmas, nlp)
+                                    for lemmas in lists_of_lemmas], repeats)
+    results.append(dict(benchmark="similarity_linear", input=name, **size, **timing,
+                        max_error=max(abs(value - exact_value) for value, exact_value in zip(linear, exact))))
+
+    estimates = [sample_average_semantic_similarity(lemmas, nlp, budget) for lemmas in lists_of_lemmas]
+    timing = time_function(lambda: [sample_average_semantic_similarity(lemmas, nlp, budget)
+                                    for lemmas in lists_of_lemmas], repeats)
+    results.append(dict(benchmark="similarity_sampled", input=name, **size, **timing, budget=budget,
+                        max_error=max(abs(estimate["mean"] - exact_value)
+                                      for estimate, exact_value in zip(estimates, exact)),
+                        max_interval=max(estimate["high"] - estimate["low"] for estimate in estimates),
+                        coverage=statistics.mean(estimate["low"] <= exact_value <= estimate["high"]
+                                                 for estimate, exact_value in zip(estimates, exact))))
+    return results
+
+
+def benchmark_output(repeats, number_of_rows=NUMBER_OF_ROWS):
+    """Times the writing of random feature rows in every output format (the
+    binary formats only with pyarrow), sorted and not sorted for csv.
+    :param repeats: int
+    :param number_of_rows: int
+    :return: list of dicts """
+    rng = random.Random(0)
+    header = ["#id"] + FEATURES
+    rows = [(str(rng.randrange(10 ** 9)), [rng.random() for _ in FEATURES]) for _ in range(number_of_rows)]
+    settings = [("csv", True), ("csv", False)] + [(output_format, True) for output_format in OUTPUT_FORMATS
+                                                  if output_format != "csv"]
+    results = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for output_format, sort_rows in settings:
+            if output_format in ("parquet", "arrow") and pyarrow is None:
+                continue
+            output_path = str(Path(output_dir) / f"features.{output_format}")
+
+            def write():
+                feature_writer = open_feature_writer(output_path, header, sort_rows, output_format=output_format)
+                for row_id, vec in rows:
+                    write_feature_row(feature_writer, create_feature_row(row_id, vec), row_id)
+                close_feature_writer(feature_writer)
+
+            benchmark = f"write_{output_format}" + ("" if sort_rows else "_unsorted")
+            results.append(dict(benchmark=benchmark, input=f"{number_of_rows}_rows", rows=number_of_rows,
+                                **time_function(write, repeats)))
+    return results
+
+
+def run_benchmarks(sizes, repeats, groups, use_demo_corpora=True):
+    """Runs all benchmarks.
+    :param sizes: list of numbers of sentences of the synthetic documents
+    :param repeats: int
+    :param groups: list of feature groups
+    :param use_demo_corpora: bool, if the demo corpora are benchmarked (their
+        sentences are used for the synthetic documents in any case)
+    :return: list of dicts """
+    results = []
+    # the model is cached by utils_and_preprocess.resources, so it is loaded once
+    models = []
+    timing = time_function(lambda: models.append(load_model_for_feature_groups(groups)), 1)
+    results.append(dict(benchmark="load_model", input=SPACY_MODEL, **timing))
+    nlp = models[0]
+    log_rank_table, discourse_marker = load_lookup_tables(nlp, groups)
+    results.extend(benchmark_tables(nlp, repeats))
+
+    corpora = read_demo_corpora()
+    inputs = {f"demo_{corpus}": texts for corpus, texts in corpora.items()} if use_demo_corpora else dict()
+    inputs.update(create_synthetic_documents([text for texts in corpora.values() for text in texts], sizes))
+    for name, texts in inputs.items():
+        # the synthetic documents can be longer than the default max_length of spacy
+        nlp.max_length = max(nlp.max_length, max(len(text) for text in texts) + 1)
+        print(f"Benchmarking {name} ...")
+        parse_result, docs, size = benchmark_parse(nlp, name, texts, repeats)
+        results.append(parse_result)
+        results.extend(benchmark_features(docs, name, size, nlp, log_rank_table, discourse_marker, groups,
+                                          repeats))
+        if "semantic_similarity" in groups:
+            results.extend(benchmark_similarity_modes(docs, name, size, nlp, repeats))
+
+    print("Benchmarking the output ...")
+    results.extend(benchmark_output(repeats))
+    return results
+
+
+def compare_results(results, other_results):
+    """Prints the ratio of the minimal times of the benchmarks which are in both
+    results (> 1 means slower than the other results).
+    :param results: list of dicts
+    :param other_results: list of dicts """
+    other_times = {(result["benchmark"], result["input"]): result["min"] for result in other_results}
+    print(f"{'benchmark':<70} {'input':<18} {'other (s)':>12} {'now (s)':>12} {'ratio':>7}")
+    for result in results:
+        other_time = other_times.get((result["benchmark"], result["input"]))
+        if other_time:
+            print(f"{result['benchmark']:<70} {result['input']:<18} {other_time:>12.6f} "
+                  f"{result['min']:>12.6f} {result['min'] / other_time:>7.2f}")
+
+
+@click.command()
+@click.option("-o", "output_path", type=str, default="benchmark_results.json",
+              help="The path (str) of the JSON file with the results.")
+@click.option("-r", "--repeats", "repeats", type=int, default=3,
+              help="The number of repetitions (int) of each benchmark, the minimum is compared.")
+@click.option("-s", "--sizes", "sizes", type=int, multiple=True, default=SYNTHETIC_SIZES,
+              help="The number of sentences (int) of a synthetic document, can be given more than once.")
+@click.option("-g", "--groups", "groups", type=click.Choice(list(FEATURE_GROUPS)), multiple=True,
+              help="A feature group which is benchmarked, can be given more than once (default: all groups).")
+@click.option("--no-demo", "no_demo", is_flag=True, default=False,
+              help="Only the synthetic documents are benchmarked, not the texts of the demo corpora.")
+@click.option("--compare", "compare_path", type=str, default=None,
+              help="The path (str) of the results of another run (e.g. of another commit) to compare with.")
+def cli(output_path, repeats, sizes, groups, no_demo, compare_path):
+    if not Path(TOKEN_FREQ).exists():
+        print("Run the benchmarks from the root directory of the repository.")
+        return
+    groups = select_feature_groups(groups)
+    results = run_benchmarks(list(sizes), repeats, groups, not no_demo)
+    report = {
+        "git": get_git_commit(),
+        "date": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "model": SPACY_MODEL,
+        "model_version": get_model_version(SPACY_MODEL),
+        "groups": groups,
+        "features": get_selected_features(groups),
+        "results": results
+    }
+    with open(output_path, "w", encoding="utf-8") as output_file:
+        json.dump(report, output_file, indent=2)
+    print("Find the benchmark results in", output_path)
+
+    if compare_path:
+        compare_results(results, get_data_from_json_file(compare_path)["results"])
+
+
+if __name__ == "__main__":
+    cli()
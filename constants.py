@@ -1,3 +1,14 @@
+# spacy model
+SPACY_MODEL = "de_core_news_md"
+# all pipeline components of the spacy model (senter is disabled by default)
+PIPELINE_COMPONENTS = ["tok2vec", "tagger", "morphologizer", "parser", "lemmatizer",
+                       "attribute_ruler", "ner", "senter"]
+# documents longer than this number of characters (the default max_length of
+# spacy) are split into chunks at paragraph boundaries, see extract_features
+CHUNK_SIZE = 1000000
+# the separators at which a long document is split, the first one found is used
+CHUNK_SEPARATORS = ["\n\n", "\n", " "]
+# data
 MINIKLEXI = "data/miniklexi_corpus.txt"
 KLEXIKON = "data/klexi_corpus.txt"
 WIKI = "data/wiki_corpus.txt"
@@ -7,72 +18,133 @@ DEMO_KLEXIKON = "demo_data/demo_klexi_corpus.txt"
 DEMO_WIKI = "demo_data/demo_wiki_corpus.txt"
 # tables
 TOKEN_FREQ = "generated_tables/token_freq_table.json"
+# the log-rank table of TOKEN_FREQ as .npy files and the hash of TOKEN_FREQ they were
+# generated from, they are generated at the first use (not committed), see
+# features.lexical_features.load_log_rank_table
+TOKEN_LOG_RANK_KEYS = "generated_tables/token_log_rank_keys.npy"
+TOKEN_LOG_RANKS = "generated_tables/token_log_ranks.npy"
+TOKEN_LOG_RANK_HASH = "generated_tables/token_log_rank_table.sha256"
 DISCOURSE_MARKER = "generated_tables/discourse_markers.json"
 DISCOURSE_MARKER_WITH_SENSE = "generated_tables/discourse_markers_with_sense.json"
 ALL_DISCOURSE_MARKER = "generated_tables/all_discourse_marker_senses.json"
 
-FEATURES = [
-            # surface features
-            "sentence_length",
-            "characters_per_word",
-            "syllables_per_word",
-            "text_length",
-            # syntactic features
-            "noun_phrases_per_sent",
-            "tree_height",
-            "sub_clauses_per_sent",
-            "sents_with_verb_as_root",
-            "sents_with_nouns_as_root",
-            # POS tag features
-            "POS_verbs",
-            "POS_aux_verbs",
-            "POS_nouns",
-            "POS_adjectives",
-            "POS_punctuations",
-            "POS_determiners",
-            "POS_pronouns",
-            "POS_conjunctions",
-            "POS_numerales",
-            "POS_adpositions",
-            # lexical features
-            "ttr",
-            "lexical_complexity_score",
-            # verb tense
-            "verbs_in_sentence",
-            # semantic_similarity_features
-            "semantic_similarity_nouns",
-            "semantic_similarity_verbs",
-            "semantic_similarity_adjectives",
-            # discourse features
-            "pronouns_per_sentence",
-            "articles_per_sentence",
-            "count_of_discourse_markers",
-            # discourse marker senses
-            "Contingency.Cause.Reason",
-            "Expansion.Substitution.Arg2-as-subst",
-            "Contingency.Cause.Result",
-            "Contingency.Purpose.Arg1-as-goal",
-            "Expansion.Conjunction",
-            "Temporal.Asynchronous.Succession",
-            "Comparison.Contrast",
-            "Temporal.Asynchronous.Precedence",
-            "Expansion.Exception.Arg2-as-except",
-            "Comparison.Concession.Arg1-as-denier",
-            "Contingency.Negative-condition.Arg2-as-negCond",
-            "Expansion.Disjunction",
-            "Expansion.Manner.Arg1-as-manner",
-            "Expansion.Level-of-detail.Arg1-as-detail",
-            "Contingency.Negative-condition.Arg1-as-negCond",
-            "Comparison.Concession.Arg2-as-denier",
-            "Temporal.Synchronous",
-            "Contingency.Purpose.Arg2-as-goal",
-            "Expansion.Exception.Arg1-as-except",
-            "Expansion.Instantiation",
-            "Expansion.Level-of-detail.Arg2-as-detail",
-            "Expansion.Substitution.Arg1-as-subst",
-            "Contingency.Condition.Arg1-as-cond",
-            "Expansion.Instantiation.Arg2-as-instance",
-            "Contingency.Condition.Arg2-as-cond",
-            "Expansion.Equivalence",
-            "Expansion.Manner.Arg2-as-manner"
-            ]
+# increase the version if the computation of a feature changes, e.g. to
+# invalidate the feature cache (utils_and_preprocess/feature_cache.py)
+FEATURES_VERSION = 2
+# surface features
+SURFACE_FEATURES = [
+    "sentence_length",
+    "characters_per_word",
+    "syllables_per_word",
+    "text_length"
+]
+
+# syntactic features
+SYNTACTIC_FEATURES = [
+    "noun_phrases_per_sent",
+    "tree_height",
+    "sub_clauses_per_sent",
+    "sents_with_verb_as_root",
+    "sents_with_nouns_as_root"
+]
+
+# POS tag features
+POS_TAG_FEATURES = [
+    "POS_verbs",
+    "POS_aux_verbs",
+    "POS_nouns",
+    "POS_adjectives",
+    "POS_punctuations",
+    "POS_determiners",
+    "POS_pronouns",
+    "POS_conjunctions",
+    "POS_numerales",
+    "POS_adpositions"
+]
+
+# lexical features
+LEXICAL_FEATURES = [
+    "ttr",
+    "lexical_complexity_score"
+]
+
+# verb tense
+VERB_TENSE_FEATURES = [
+    "verbs_in_sentence"
+]
+
+# semantic_similarity_features
+SEMANTIC_SIMILARITY_FEATURES = [
+    "semantic_similarity_nouns",
+    "semantic_similarity_verbs",
+    "semantic_similarity_adjectives"
+]
+# the bounds of the 95% confidence intervals of the semantic similarity features
+# with --similarity sampled, these columns follow all other features
+SEMANTIC_SIMILARITY_INTERVAL_FEATURES = [f"{feature}_{bound}" for feature in SEMANTIC_SIMILARITY_FEATURES
+                                         for bound in ("low", "high")]
+
+# discourse features
+DISCOURSE_FEATURES = [
+    "pronouns_per_sentence",
+    "articles_per_sentence",
+    "count_of_discourse_markers"
+]
+
+# discourse marker senses
+DISCOURSE_MARKER_SENSE_FEATURES = [
+    "Contingency.Cause.Reason",
+    "Expansion.Substitution.Arg2-as-subst",
+    "Contingency.Cause.Result",
+    "Contingency.Purpose.Arg1-as-goal",
+    "Expansion.Conjunction",
+    "Temporal.Asynchronous.Succession",
+    "Comparison.Contrast",
+    "Temporal.Asynchronous.Precedence",
+    "Expansion.Exception.Arg2-as-except",
+    "Comparison.Concession.Arg1-as-denier",
+    "Contingency.Negative-condition.Arg2-as-negCond",
+    "Expansion.Disjunction",
+    "Expansion.Manner.Arg1-as-manner",
+    "Expansion.Level-of-detail.Arg1-as-detail",
+    "Contingency.Negative-condition.Arg1-as-negCond",
+    "Comparison.Concession.Arg2-as-denier",
+    "Temporal.Synchronous",
+    "Contingency.Purpose.Arg2-as-goal",
+    "Expansion.Exception.Arg1-as-except",
+    "Expansion.Instantiation",
+    "Expansion.Level-of-detail.Arg2-as-detail",
+    "Expansion.Substitution.Arg1-as-subst",
+    "Contingency.Condition.Arg1-as-cond",
+    "Expansion.Instantiation.Arg2-as-instance",
+    "Contingency.Condition.Arg2-as-cond",
+    "Expansion.Equivalence",
+    "Expansion.Manner.Arg2-as-manner"
+]
+
+# the feature groups in the order of the features, the columns of the features in
+# features.registry.FEATURE_REGISTRY are checked against them
+FEATURE_GROUPS = {
+    "surface": SURFACE_FEATURES,
+    "syntactic": SYNTACTIC_FEATURES,
+    "pos_tags": POS_TAG_FEATURES,
+    "lexical": LEXICAL_FEATURES,
+    "verb_tense": VERB_TENSE_FEATURES,
+    "semantic_similarity": SEMANTIC_SIMILARITY_FEATURES,
+    "discourse": DISCOURSE_FEATURES,
+    "discourse_marker_senses": DISCOURSE_MARKER_SENSE_FEATURES
+}
+FEATURES = [feature for group_features in FEATURE_GROUPS.values() for feature in group_features]
+# the pipeline components of the spacy model needed by each feature group,
+# "sentences" stands for the sentence boundaries of the parser (or of the
+# senter, if the parser is not needed), see extract_features.get_pipeline_components
+FEATURE_GROUP_COMPONENTS = {
+    "surface": ["sentences"],
+    "syntactic": ["tagger", "morphologizer", "attribute_ruler", "parser"],
+    "pos_tags": ["tagger", "morphologizer", "attribute_ruler"],
+    "lexical": ["tagger", "morphologizer", "attribute_ruler", "lemmatizer"],
+    "verb_tense": ["morphologizer", "attribute_ruler", "sentences"],
+    "semantic_similarity": ["tagger", "morphologizer", "attribute_ruler", "lemmatizer"],
+    "discourse": ["tagger", "morphologizer", "attribute_ruler", "sentences"],
+    "discourse_marker_senses": []
+}
@@ -5,66 +5,73 @@
 # features are to be extracted. And the name of the file in which the results are to
 # be saved. An example call of the script could look like this:
 # $ python extract_features.py  -p "dir_to_data/" -o "output_file_name"
-import spacy
+import time
 import click
-import csv
 
-from os import scandir
+from os import scandir, path
 from pathlib import Path
+from multiprocessing import Pool
 
 # The list of all features can be found in the file utils.constants
 # under FEATURES. This also facilitates the quick adjustment of the
 # feature set.
-from constants import FEATURES
-from utils_and_preprocess.utils import validate_doc, get_data_from_json_file
-
-from features.surface_features import \
-    get_average_sentence_length_in_token, \
-    get_average_characters_per_word, \
-    get_average_syllables_per_word, \
-    get_text_length_in_token
-
-from features.syntactic_features import \
-    get_average_number_of_noun_phrases_per_sentence, \
-    get_average_heights, \
-    get_average_number_of_subordinate_clauses_per_sentence, \
-    get_average_count_of_sentences_with_verb_as_root, \
-    get_average_count_of_sentences_with_nouns_as_root
-
-from features.proportion_of_POS_tags_features import \
-    get_POS_tag_proportion_for_verbs, \
-    get_POS_tag_proportion_for_aux_verbs, \
-    get_POS_tag_proportion_for_nouns, \
-    get_POS_tag_proportion_for_adjectives, \
-    get_POS_tag_proportion_for_punctuations, \
-    get_POS_tag_proportion_for_determiners, \
-    get_POS_tag_proportion_for_pronouns, \
-    get_POS_tag_proportion_for_conjunctions, \
-    get_POS_tag_proportion_for_numerales, \
-    get_POS_tag_proportion_for_adpositions
+from constants import FEATURES, FEATURES_VERSION, SPACY_MODEL, PIPELINE_COMPONENTS, \
+    FEATURE_GROUPS, FEATURE_GROUP_COMPONENTS, CHUNK_SIZE, SEMANTIC_SIMILARITY_INTERVAL_FEATURES
+from utils_and_preprocess.utils import validate_text, validate_parsed_doc, select_feature_groups, \
+    split_text_into_chunks, convert_to_python_numbers
 
-from constants import TOKEN_FREQ
-# based on the DeReWo corpus
-# https://www.ids-mannheim.de/digspra/kl/projekte/methoden/derewo/
+from utils_and_preprocess.resources import get_nlp, get_model_version, get_log_rank_table, \
+    get_discourse_marker
+
+from utils_and_preprocess.feature_cache import create_fingerprint, open_feature_cache, \
+    close_feature_cache, save_features, filter_cached_documents, hash_text
+
+from utils_and_preprocess.parse_store import open_parse_store, close_parse_store, \
+    add_parsed_doc, add_doc_bin, read_parsed_docs, read_parse_store_components, create_doc_bin
+
+from utils_and_preprocess.feature_writer import open_feature_writer, write_feature_row, \
+    close_feature_writer, create_feature_row, OUTPUT_FORMATS, FLOAT_TYPES
+
+from utils_and_preprocess.profiler import create_profiler, record_time, record_document, time_iterator, \
+    merge_profilers, write_profile_report, PROFILE_REPORT_FORMATS
 
-from features.lexical_features import calculate_ttr, \
-    calculate_lexical_complexity_score
+from features.doc_statistics import STATISTICS_BACKENDS
+from features.semantic_similarity_features import create_similarity_options, get_similarity_intervals, \
+    SIMILARITY_MODES, SIMILARITY_SAMPLE_BUDGET
+from features.aggregates import count_doc_aggregates, combine_aggregates, calculate_features_from_aggregates, \
+    calculate_semantic_similarity_features_from_aggregates
 
-from features.verb_tense_feature import get_average_number_of_verbs_in_sentence
+from features.registry import plan_features, get_feature_arguments, evaluate_plan, evaluate_plan_with_profiler
 
-from features.semantic_similarity_features import \
-    get_average_semantic_similarity_of_all_nouns, \
-    get_average_semantic_similarity_of_all_verbs, \
-    get_average_semantic_similarity_of_all_adjectives
+from constants import TOKEN_FREQ
+# based on the DeReWo corpus
+# https://www.ids-mannheim.de/digspra/kl/projekte/methoden/derewo/
 
 from constants import DISCOURSE_MARKER, \
     DISCOURSE_MARKER_WITH_SENSE, ALL_DISCOURSE_MARKER
 
-from features.discourse_features import \
-    get_average_count_of_pronouns_per_sentence, \
-    get_average_count_of_definite_articles_per_sentence, \
-    get_average_count_of_discourse_markers_per_sentence, \
-    get_count_for_discourse_marker_senses
+
+def load_lookup_tables(nlp, groups=None):
+    """Returns the token frequencies (based on the DeReWo corpus) as memory-mapped
+    log-rank table (see features.lexical_features.load_log_rank_table) and the
+    discourse marker tables (based on the DimLex) which are needed to
+    calculate the features. The discourse markers are compiled into a matcher
+    with the tokenizer of the spacy model. The tables are loaded once per
+    process, see utils_and_preprocess.resources. A table which is not needed
+    by the feature groups is not loaded (None).
+
+    :param nlp: spacy model
+    :param groups: list of feature groups or None (all groups), see select_feature_groups
+    :return: tuple (log-rank table dict or None, dict of discourse markers and senses or None)
+    """
+    groups = select_feature_groups(groups)
+    log_rank_table = None
+    if "lexical" in groups:
+        log_rank_table = get_log_rank_table()
+    discourse_marker = None
+    if "discourse" in groups or "discourse_marker_senses" in groups:
+        discourse_marker = get_discourse_marker(nlp)
+    return log_rank_table, discourse_marker
 
 
 def create_feature_to_idx_dict(features):
@@ -82,94 +89,656 @@ def create_feature_to_idx_dict(features):
     return feature_to_index
 
 
-def calculate_features(doc, nlp, tokens_freq, discourse_marker):
-    """Calls all functions that extract the linguistic features of text complexity.
-    Returns a list of numbers (vector). If the list of features to be extracted
-    changes, then the order here and in utils.constants FEATURES must be aligned.
+def get_selected_features(groups=None):
+    """Returns the names of the features of the selected groups in the order
+    of calculate_features.
+
+    :param groups: iterable of feature groups or None (all groups)
+    :return: list of feature names
+    """
+    return [feature for group in select_feature_groups(groups) for feature in FEATURE_GROUPS[group]]
+
+
+def has_similarity_intervals(groups=None, similarity=None):
+    """Checks if the confidence intervals of the sampled semantic similarity are
+    added to the features, i.e. the mode is "sampled" and the semantic
+    similarity features are selected.
+
+    :param groups: iterable of feature groups or None (all groups)
+    :param similarity: dict or None (exact), see features.semantic_similarity_features.create_similarity_options
+    :return: bool
+    """
+    return similarity is not None and similarity["mode"] == "sampled" and \
+        "semantic_similarity" in select_feature_groups(groups)
+
+
+def get_output_features(groups=None, similarity=None):
+    """Returns the names of the features of the selected groups and the bounds of
+    the confidence intervals of the sampled semantic similarity (see
+    has_similarity_intervals), the columns of the output.
+
+    :param groups: iterable of feature groups or None (all groups)
+    :param similarity: dict or None (exact), see features.semantic_similarity_features.create_similarity_options
+    :return: list of feature names
+    """
+    if has_similarity_intervals(groups, similarity):
+        return get_selected_features(groups) + SEMANTIC_SIMILARITY_INTERVAL_FEATURES
+    return get_selected_features(groups)
+
+
+def create_run_options(backend="python", groups=None, similarity=None, chunk_size=CHUNK_SIZE, profiler=None,
+                       skip_ids=None):
+    """Creates the options of a run of the feature extraction, which are passed
+    to the generate_features functions as one dict.
+
+    :param backend: "python" or "array", the backend for the token statistics
+    :param groups: list of feature groups or None (all groups), see select_feature_groups
+    :param similarity: dict or None (exact), see features.semantic_similarity_features.create_similarity_options
+    :param chunk_size: documents longer than this number of characters are split, see split_long_documents
+    :param profiler: dict or None, see utils_and_preprocess.profiler
+    :param skip_ids: set of ids (file names without .txt) which are not extracted or None
+    :return: dict
+    """
+    return {"backend": backend, "groups": groups, "similarity": similarity, "chunk_size": chunk_size,
+            "profiler": profiler, "skip_ids": skip_ids}
+
+
+def get_pipeline_components(groups=None):
+    """Returns the pipeline components of the spacy model which are not needed by
+    the feature groups (see constants.FEATURE_GROUP_COMPONENTS) and the disabled
+    components which have to be enabled. The sentence boundaries come from the
+    parser, if it is not needed from the (faster) senter. The tok2vec layer is
+    needed by all trainable components, the ner is never needed.
+
+    :param groups: iterable of feature groups or None (all groups)
+    :return: tuple (list of excluded components, list of enabled components)
+    """
+    needed = set()
+    for group in select_feature_groups(groups):
+        needed.update(FEATURE_GROUP_COMPONENTS[group])
+    enable = []
+    if "sentences" in needed:
+        needed.remove("sentences")
+        if "parser" not in needed:
+            needed.add("senter")
+            enable.append("senter")
+    if needed - {"attribute_ruler"}:
+        needed.add("tok2vec")
+    exclude = [component for component in PIPELINE_COMPONENTS if component not in needed]
+    return exclude, enable
+
+
+def get_parse_components(groups=None):
+    """Returns the pipeline components which parse the documents for the feature
+    groups, i.e. the components of the model without the excluded ones and
+    without the senter if it is not enabled (it is disabled by default).
+
+    :param groups: iterable of feature groups or None (all groups)
+    :return: list of component names
+    """
+    exclude, enable = get_pipeline_components(groups)
+    return [component for component in PIPELINE_COMPONENTS
+            if component not in exclude and (component != "senter" or component in enable)]
+
+
+def check_parse_store_components(store_dir, groups=None):
+    """Checks that the documents of a parse store were parsed with all pipeline
+    components the feature groups need, else their features would be computed
+    from missing annotations. The sentence boundaries of the senter can also come
+    from the parser, the tok2vec layer adds no annotations.
+
+    :param store_dir: str
+    :param groups: iterable of feature groups or None (all groups)
+    :raise ValueError: if a component is missing
+    """
+    needed = set(get_parse_components(groups)) - {"tok2vec"}
+    for components in read_parse_store_components(store_dir):
+        missing = needed - components
+        if "parser" in components:
+            missing.discard("senter")
+        if missing:
+            raise ValueError(f"The parses in {store_dir} were stored without the pipeline components "
+                             f"{', '.join(sorted(missing))}, which the selected feature groups need. "
+                             f"Store them again with these groups (-g).")
+
+
+def load_model_for_feature_groups(groups=None):
+    """Loads the spacy model with only the pipeline components which are needed by
+    the feature groups, see get_pipeline_components.
+
+    :param groups: iterable of feature groups or None (all groups)
+    :return: spacy model
+    """
+    exclude, enable = get_pipeline_components(groups)
+    return get_nlp(SPACY_MODEL, tuple(exclude), tuple(enable))
+
+
+def calculate_features(doc, nlp, log_rank_table, discourse_marker, backend="python", groups=None,
+                       profiler=None, name=None, similarity=None):
+    """Calculates the linguistic features of text complexity of the selected
+    feature groups with the feature registry (see features.registry): the
+    artifacts shared by the features (e.g. the token statistics, which are
+    counted with the given backend, see features.doc_statistics) are computed
+    once and then only the features of the groups. Returns a list of python
+    numbers (vector) in the order of the features in constants.FEATURE_GROUPS. In the
+    mode "sampled" of the similarity the bounds of the confidence intervals
+    follow, see get_output_features. With a profiler the wall times are
+    recorded, see features.registry.evaluate_plan_with_profiler.
 
     :param doc: spacy.tokens.doc.Doc
     :param nlp: spacy model
-    :param tokens_freq: token frequencies dict
+    :param log_rank_table: log-rank table of the token frequencies
     :param discourse_marker: dict of discourse markers and senses
+    :param backend: "python" or "array", the backend for the token statistics
+    :param groups: list of feature groups or None (all groups), see select_feature_groups
+    :param profiler: dict or None, see utils_and_preprocess.profiler
+    :param name: the name of the document in the report of the profiler
+    :param similarity: dict or None (exact), see features.semantic_similarity_features.create_similarity_options
     :return: a list of numbers
     """
-    result = [
-            # surface features
-            get_average_sentence_length_in_token(doc),
-            get_average_characters_per_word(doc),
-            get_average_syllables_per_word(doc),
-            get_text_length_in_token(doc),
-            # syntactic features
-            get_average_number_of_noun_phrases_per_sentence(doc),
-            get_average_heights(doc),
-            get_average_number_of_subordinate_clauses_per_sentence(doc),
-            get_average_count_of_sentences_with_verb_as_root(doc),
-            get_average_count_of_sentences_with_nouns_as_root(doc),
-            # POS tag features
-            get_POS_tag_proportion_for_verbs(doc),
-            get_POS_tag_proportion_for_aux_verbs(doc),
-            get_POS_tag_proportion_for_nouns(doc),
-            get_POS_tag_proportion_for_adjectives(doc),
-            get_POS_tag_proportion_for_punctuations(doc),
-            get_POS_tag_proportion_for_determiners(doc),
-            get_POS_tag_proportion_for_pronouns(doc),
-            get_POS_tag_proportion_for_conjunctions(doc),
-            get_POS_tag_proportion_for_numerales(doc),
-            get_POS_tag_proportion_for_adpositions(doc),
-            # lexical features
-            calculate_ttr(doc),
-            calculate_lexical_complexity_score(doc, tokens_freq),
-            # verb tense
-            get_average_number_of_verbs_in_sentence(doc),
-            # semantic_similarity_features
-            get_average_semantic_similarity_of_all_nouns(doc, nlp),
-            get_average_semantic_similarity_of_all_verbs(doc, nlp),
-            get_average_semantic_similarity_of_all_adjectives(doc, nlp),
-            # discourse features
-            get_average_count_of_pronouns_per_sentence(doc),
-            get_average_count_of_definite_articles_per_sentence(doc),
-            get_average_count_of_discourse_markers_per_sentence(doc, discourse_marker["disc_marker"])
-            ]
-    # this returns a vector
-    dms_vec = get_count_for_discourse_marker_senses(doc, discourse_marker["all_disc_marker_senses"],
-                                                    discourse_marker["discourse_markers_with_sense"])
-    # extend the result vector with the discourse marker senses vector
-    result.extend(dms_vec)
-    return result
-
-
-def extract_features_for_all_docs(directory_path, nlp, tokens_freq, discourse_marker):
-    """Extracts the text complexity features for all documents in the directory
-    and saves this in a dict with file name as keys and feature vector (list of nums)
-    as value.
+    plan = plan_features(tuple(get_selected_features(groups)))
+    arguments = get_feature_arguments(doc, nlp, log_rank_table, discourse_marker, backend, similarity)
+    if profiler is not None:
+        feature_vector = evaluate_plan_with_profiler(plan, arguments, profiler, name)
+    else:
+        feature_vector = evaluate_plan(plan, arguments)
+    if has_similarity_intervals(groups, similarity):
+        feature_vector.extend(get_similarity_intervals(doc))
+    return convert_to_python_numbers(feature_vector)
+
+
+def has_documents(directory_path):
+    """Checks if the directory contains documents (.txt files).
 
     :param directory_path: str
-    :param nlp: spacy model
-    :param tokens_freq: token frequencies dict
-    :param discourse_marker: dict of discourse markers and senses
-    :return: dict
+    :return: bool
+    """
+    if not path.isdir(directory_path):
+        return False
+    with scandir(directory_path) as documents:
+        return any(document.name.endswith(".txt") for document in documents)
+
+
+def get_document_id(name):
+    """Returns the id of a document, its file name without the extension .txt,
+    which is used in the output and for skip_ids.
+    Ex.: "text.txt" -> "text", "tt.txt" -> "tt"
+
+    :param name: str
+    :return: str
+    """
+    return name[:-len(".txt")] if name.endswith(".txt") else name
+
+
+def read_documents(directory_path, skip_ids=None):
+    """Reads all documents (.txt files) in the directory and yields tuples
+    with the text and the file name of each document. Documents whose id (the
+    file name without .txt, like in the output) is in skip_ids are not read.
+
+    :param directory_path: str
+    :param skip_ids: set of ids or None
+    :return: generator of tuples (str, str)
     """
-    results = dict()
     with scandir(directory_path) as documents:
         for document in documents:
+            if skip_ids and get_document_id(document.name) in skip_ids:
+                continue
             if document.name.endswith(".txt"):
                 temp_inputfile = Path(directory_path + document.name)
-                text = temp_inputfile.read_text(encoding="utf-8")
+                yield temp_inputfile.read_text(encoding="utf-8"), document.name
+
 
-                is_valid = validate_doc(text, nlp)
-                if not is_valid:
-                    print(f"The file {document.name} is invalid.")
+def parse_documents(documents, nlp, batch_size=50, n_process=1, profiler=None):
+    """Parses the documents in batches with nlp.pipe and yields tuples with the
+    parsed doc and the file name. Every text is parsed only once, the validation
+    is done before (text) and after (doc) the parsing. Invalid documents are
+    yielded with None instead of the doc, so that the caller can report them
+    and drop what it keeps for them (e.g. the other chunks of a long document
+    or the hash of the text for the feature cache). With a profiler the time
+    spent in nlp.pipe (with the reading of the texts) is recorded as "parse",
+    the documents are parsed in batches, so the time of a batch is recorded
+    with its first document.
+
+    :param documents: iterable of tuples (text, file name)
+    :param nlp: spacy model
+    :param batch_size: number of texts buffered per batch
+    :param n_process: number of processors spacy uses for parsing
+    :param profiler: dict or None, see utils_and_preprocess.profiler
+    :return: generator of tuples (spacy.tokens.doc.Doc or None, name)
+    """
+    invalid_names = []
+
+    def valid_texts():
+        for text, name in documents:
+            if validate_text(text, nlp):
+                yield text, name
+            else:
+                invalid_names.append(name)
+
+    parsed_docs = nlp.pipe(valid_texts(), as_tuples=True, batch_size=batch_size, n_process=n_process)
+    if profiler is not None:
+        parsed_docs = time_iterator(parsed_docs, profiler, "parse")
+    for doc, name in parsed_docs:
+        yield from pop_invalid_names(invalid_names)
+        yield (doc if validate_parsed_doc(doc) else None), name
+    yield from pop_invalid_names(invalid_names)
+
+
+def pop_invalid_names(invalid_names):
+    """Yields and removes the names of the invalid texts, see parse_documents.
+
+    :param invalid_names: list of names
+    :return: generator of tuples (None, name)
+    """
+    while invalid_names:
+        yield None, invalid_names.pop(0)
+
+
+def report_invalid_document(name, text_hashes):
+    """Reports an invalid document (or a long document with an invalid chunk),
+    which has no feature vector, and removes the hash of its text.
+
+    :param name: str
+    :param text_hashes: dict with names as keys and hashes of the texts as values, is changed
+    """
+    print(f"The file {name} is invalid.")
+    text_hashes.pop(name, None)
+
+
+def pop_cached_results(results):
+    """Yields and removes the results of cached documents collected by
+    utils_and_preprocess.feature_cache.filter_cached_documents.
+
+    :param results: dict with names as keys and feature vectors as values
+    :return: generator of tuples (name, feature vector)
+    """
+    while results:
+        yield results.popitem()
+
+
+def split_long_documents(documents, chunk_size=CHUNK_SIZE):
+    """Splits the documents which are longer than chunk_size characters into
+    chunks at paragraph boundaries (see utils_and_preprocess.utils.split_text_into_chunks),
+    so that they can be parsed (spacy can not parse texts longer than its
+    max_length) and in parallel. The name of a chunk is a tuple of the name of
+    the document, the index of the chunk and the number of chunks. The features
+    of the document are calculated from the added aggregates of its chunks, see
+    collect_chunk_aggregates.
+
+    :param documents: iterable of tuples (text, name)
+    :param chunk_size: int, at least 1 and at most the max_length of the spacy model
+    :return: generator of tuples (text, name or tuple (name, index, number of chunks))
+    """
+    for text, name in documents:
+        if len(text) <= chunk_size:
+            yield text, name
+            continue
+        chunks = split_text_into_chunks(text, chunk_size)
+        for index, chunk in enumerate(chunks):
+            yield chunk, (name, index, len(chunks))
+
+
+def count_chunk_aggregates(doc, chunk, nlp, discourse_marker, options):
+    """Counts the aggregates of a chunk of a long document, see
+    features.aggregates.count_doc_aggregates. With a profiler the wall time is
+    recorded as "chunk_aggregates" and the chunk as a document.
+
+    :param doc: spacy.tokens.doc.Doc, the parsed chunk
+    :param chunk: tuple (name, index, number of chunks), see split_long_documents
+    :param nlp: spacy model
+    :param discourse_marker: dict of discourse markers and senses
+    :param options: dict, see create_run_options
+    :return: dict, the aggregates of the chunk
+    """
+    profiler = options["profiler"]
+    if profiler is None:
+        return count_doc_aggregates(doc, nlp, discourse_marker, options["groups"])
+    start = time.perf_counter()
+    aggregates = count_doc_aggregates(doc, nlp, discourse_marker, options["groups"])
+    seconds = time.perf_counter() - start
+    record_time(profiler, "chunk_aggregates", seconds)
+    record_document(profiler, chunk, len(doc), len(doc.text), seconds, dict())
+    return aggregates
+
+
+def collect_chunk_aggregates(chunk_aggregates, chunk, aggregates, log_rank_table, options):
+    """Collects the aggregates of a chunk of a long document (see
+    features.aggregates.count_doc_aggregates). When all chunks of the document
+    are collected, their aggregates are added in the order of the chunks and
+    the features of the document are calculated from them (with a profiler
+    the wall time is recorded as "chunk_features"). If a chunk was invalid, the
+    document has no feature vector, its chunks are dropped. The semantic
+    similarity is computed from the sums of the vectors, so in the mode
+    "sampled" both bounds of its confidence intervals are the exact average.
+
+    :param chunk_aggregates: dict with the names of the documents as keys and
+        dicts of the aggregates of their collected chunks as values, is changed
+    :param chunk: tuple (name, index, number of chunks), see split_long_documents
+    :param aggregates: dict, the aggregates of the chunk, or None if the chunk is invalid
+    :param log_rank_table: log-rank table of the token frequencies
+    :param options: dict, see create_run_options
+    :return: tuple (name, feature vector or None, if a chunk is invalid) or None, if chunks are missing
+    """
+    name, index, number_of_chunks = chunk
+    collected = chunk_aggregates.setdefault(name, dict())
+    collected[index] = aggregates
+    if len(collected) < number_of_chunks:
+        return None
+    del chunk_aggregates[name]
+    if any(aggregates is None for aggregates in collected.values()):
+        return name, None
+    start = time.perf_counter()
+    aggregates = combine_aggregates(collected[index] for index in range(number_of_chunks))
+    feature_vector = calculate_features_from_aggregates(aggregates, log_rank_table, options["groups"])
+    if has_similarity_intervals(options["groups"], options["similarity"]):
+        feature_vector.extend(value for value in calculate_semantic_similarity_features_from_aggregates(
+            aggregates, log_rank_table) for bound in ("low", "high"))
+    if options["profiler"] is not None:
+        record_time(options["profiler"], "chunk_features", time.perf_counter() - start)
+    return name, convert_to_python_numbers(feature_vector)
+
+
+def generate_features(documents, nlp, log_rank_table, discourse_marker, batch_size=50, n_process=1,
+                      feature_cache=None, parse_store=None, options=None):
+    """Extracts the text complexity features for the documents and yields the name
+    and the feature vector (list of nums) of each document as soon as it is
+    extracted. The documents are parsed in batches with nlp.pipe. Documents with a
+    vector in the feature cache are not parsed again. The parsed documents can be
+    stored in a parse store, see generate_features_from_parses. Long documents are
+    parsed in chunks of at most the max_length of the spacy model (see
+    split_long_documents), their chunks are not stored and their semantic
+    similarity is always computed from the sums of the vectors (see
+    features.aggregates) in every mode of similarity. Invalid documents and
+    long documents with an invalid chunk are reported and left out. With a
+    profiler the wall times of the parse and of the features are recorded, see
+    utils_and_preprocess.profiler.
+
+    :param documents: iterable of tuples (text, name)
+    :param nlp: spacy model
+    :param log_rank_table: log-rank table of the token frequencies
+    :param discourse_marker: dict of discourse markers and senses
+    :param batch_size: number of texts buffered per batch
+    :param n_process: number of processors spacy uses for parsing
+    :param feature_cache: dict or None, see utils_and_preprocess.feature_cache
+    :param parse_store: dict or None, see utils_and_preprocess.parse_store
+    :param options: dict or None (the defaults), see create_run_options
+    :return: generator of tuples (name, feature vector)
+    """
+    options = options or create_run_options()
+    cached_results = dict()
+    text_hashes = dict()
+    chunk_aggregates = dict()
+    if feature_cache is not None:
+        documents = filter_cached_documents(documents, feature_cache, cached_results, text_hashes)
+    documents = split_long_documents(documents, min(options["chunk_size"], nlp.max_length))
+    for doc, name in parse_documents(documents, nlp, batch_size, n_process, options["profiler"]):
+        if isinstance(name, tuple):
+            aggregates = None
+            if doc is not None:
+                aggregates = count_chunk_aggregates(doc, name, nlp, discourse_marker, options)
+            document = collect_chunk_aggregates(chunk_aggregates, name, aggregates, log_rank_table, options)
+            if document is None:
+                continue
+            name, feature_vector = document
+            if feature_vector is None:
+                report_invalid_document(name, text_hashes)
+                continue
+        elif doc is None:
+            report_invalid_document(name, text_hashes)
+            continue
+        else:
+            if parse_store is not None:
+                add_parsed_doc(parse_store, doc, name)
+            feature_vector = calculate_features(doc, nlp, log_rank_table, discourse_marker,
+                                                backend=options["backend"], groups=options["groups"],
+                                                profiler=options["profiler"], name=name,
+                                                similarity=options["similarity"])
+        if feature_cache is not None:
+            save_features(feature_cache, text_hashes.pop(name), feature_vector)
+        yield name, feature_vector
+        yield from pop_cached_results(cached_results)
+    yield from pop_cached_results(cached_results)
+
+
+def generate_features_for_all_docs(directory_path, nlp, log_rank_table, discourse_marker, batch_size=50,
+                                   n_process=1, feature_cache=None, parse_store=None, options=None):
+    """Extracts the text complexity features for all documents in the directory
+    (except the ids in the skip_ids of the options), see generate_features.
+
+    :param directory_path: str
+    :param nlp: spacy model
+    :param log_rank_table: log-rank table of the token frequencies
+    :param discourse_marker: dict of discourse markers and senses
+    :param batch_size: number of texts buffered per batch
+    :param n_process: number of processors spacy uses for parsing
+    :param feature_cache: dict or None, see utils_and_preprocess.feature_cache
+    :param parse_store: dict or None, see utils_and_preprocess.parse_store
+    :param options: dict or None (the defaults), see create_run_options
+    :return: generator of tuples (file name without .txt, feature vector)
+    """
+    options = options or create_run_options()
+    for name, feature_vector in generate_features(read_documents(directory_path, options["skip_ids"]), nlp,
+                                                  log_rank_table, discourse_marker, batch_size, n_process,
+                                                  feature_cache=feature_cache, parse_store=parse_store,
+                                                  options=options):
+        yield get_document_id(name), feature_vector
+
+
+def generate_features_from_parses(store_dir, nlp, log_rank_table, discourse_marker, options=None):
+    """Extracts the text complexity features for all documents of a parse store
+    (see utils_and_preprocess.parse_store) without parsing them again and yields
+    the id and the feature vector of each document (except the ids in the
+    skip_ids of the options). The parse store has to contain the pipeline
+    components of the feature groups, see check_parse_store_components. The
+    spacy model is only needed for its vocab, so it can be loaded without the
+    pipeline components, see load_model_without_components. The chunk size of
+    the options is not used.
+
+    :param store_dir: str
+    :param nlp: spacy model
+    :param log_rank_table: log-rank table of the token frequencies
+    :param discourse_marker: dict of discourse markers and senses
+    :param options: dict or None (the defaults), see create_run_options
+    :return: generator of tuples (file name without .txt, feature vector)
+    """
+    options = options or create_run_options()
+    check_parse_store_components(store_dir, options["groups"])
+    parsed_docs = read_parsed_docs(store_dir, nlp.vocab)
+    if options["profiler"] is not None:
+        parsed_docs = time_iterator(parsed_docs, options["profiler"], "read_parses")
+    skip_ids = options["skip_ids"]
+    for doc, name in parsed_docs:
+        if skip_ids and get_document_id(name) in skip_ids:
+            continue
+        yield get_document_id(name), calculate_features(doc, nlp, log_rank_table, discourse_marker,
+                                                        backend=options["backend"], groups=options["groups"],
+                                                        profiler=options["profiler"], name=name,
+                                                        similarity=options["similarity"])
+
+
+def load_model_without_components():
+    """Loads the spacy model without its pipeline components. The vocab (with the
+    vectors) and the tokenizer are loaded, the tagger, parser etc. are not.
+
+    :return: spacy model
+    """
+    return get_nlp(SPACY_MODEL, tuple(PIPELINE_COMPONENTS))
+
+
+# The spacy model and the lookup tables of a worker process. They are loaded
+# once per process in init_worker and used for all shards of the process.
+worker_resources = dict()
+
+
+def init_worker(batch_size=50, store_parses=False, profile=False, options=None):
+    """Loads the spacy model and the lookup tables once per worker process.
+
+    :param batch_size: number of texts buffered per batch
+    :param store_parses: bool, if the parsed documents are returned as DocBin
+    :param profile: bool, if the wall times of each shard are recorded and returned
+    :param options: dict or None (the defaults) without the profiler, see create_run_options
+    """
+    options = options or create_run_options()
+    worker_resources["nlp"] = load_model_for_feature_groups(options["groups"])
+    log_rank_table, discourse_marker = load_lookup_tables(worker_resources["nlp"], options["groups"])
+    worker_resources["log_rank_table"] = log_rank_table
+    worker_resources["discourse_marker"] = discourse_marker
+    worker_resources["batch_size"] = batch_size
+    worker_resources["store_parses"] = store_parses
+    worker_resources["profile"] = profile
+    worker_resources["options"] = options
+
+
+def extract_features_for_shard(shard):
+    """Extracts the text complexity features for a shard of documents in a
+    worker process, which was initialized with init_worker.
+
+    :param shard: list of tuples (text, name), see split_long_documents
+    :return: tuple (list of tuples (name, feature vector or aggregates of a chunk or
+        None for an invalid document or chunk), serialized DocBin of the parsed documents
+        or None, list of tuples (name, text hash), profiler of the shard or None)
+    """
+    nlp = worker_resources["nlp"]
+    profiler = create_profiler() if worker_resources["profile"] else None
+    options = dict(worker_resources["options"], profiler=profiler)
+    results = []
+    doc_bin = create_doc_bin()
+    names = []
+    for doc, name in parse_documents(shard, nlp, worker_resources["batch_size"], profiler=profiler):
+        if doc is None:
+            results.append((name, None))
+            continue
+        if isinstance(name, tuple):
+            results.append((name, count_chunk_aggregates(doc, name, nlp, worker_resources["discourse_marker"],
+                                                         options)))
+            continue
+        if worker_resources["store_parses"]:
+            doc_bin.add(doc)
+            names.append((name, hash_text(doc.text)))
+        results.append((name, calculate_features(doc, nlp, worker_resources["log_rank_table"],
+                                                 worker_resources["discourse_marker"],
+                                                 backend=options["backend"], groups=options["groups"],
+                                                 profiler=profiler, name=name,
+                                                 similarity=options["similarity"])))
+
+    if not worker_resources["store_parses"]:
+        return results, None, names, profiler
+    return results, doc_bin.to_bytes(), names, profiler
+
+
+def get_worker_max_length():
+    """Returns the max_length of the spacy model of a worker process, which was
+    initialized with init_worker.
+
+    :return: int
+    """
+    return worker_resources["nlp"].max_length
+
+
+def create_shards(documents, shard_size):
+    """Splits the documents into lists of at most shard_size documents.
+
+    :param documents: iterable of tuples (text, name)
+    :param shard_size: int
+    :return: generator of lists of tuples (text, name)
+    """
+    shard = []
+    for document in documents:
+        shard.append(document)
+        if len(shard) == shard_size:
+            yield shard
+            shard = []
+    if shard:
+        yield shard
+
+
+def generate_features_in_parallel(documents, workers, batch_size=50, shard_size=20, feature_cache=None,
+                                  parse_store=None, options=None):
+    """Extracts the text complexity features for the documents with a pool of
+    worker processes and yields the name and the feature vector of each document
+    as soon as its shard is finished. Every worker loads the spacy model and the
+    lookup tables once and processes shards of documents. The order in which the
+    shards are finished is not deterministic.
+    The feature cache and the parse store are only used in the main process:
+    cached documents are not sent to the workers, the vectors and parsed
+    documents of the workers are saved. The chunks of long documents (see
+    split_long_documents, at most the max_length of the spacy model of the
+    workers) are spread over the shards, the workers return their aggregates,
+    which are added in the main process. Invalid documents and long documents
+    with an invalid chunk are reported and left out. With a profiler the
+    workers record the wall times of each shard, which are merged into the
+    profiler.
+
+    :param documents: iterable of tuples (text, name)
+    :param workers: number of worker processes
+    :param batch_size: number of texts buffered per batch
+    :param shard_size: number of documents per shard
+    :param feature_cache: dict or None, see utils_and_preprocess.feature_cache
+    :param parse_store: dict or None, see utils_and_preprocess.parse_store
+    :param options: dict or None (the defaults), see create_run_options
+    :return: generator of tuples (name, feature vector)
+    """
+    options = options or create_run_options()
+    profiler = options["profiler"]
+    cached_results = dict()
+    text_hashes = dict()
+    chunk_aggregates = dict()
+    # the lexical complexity score of a chunked document is calculated in the main process
+    log_rank_table = get_log_rank_table() if "lexical" in select_feature_groups(options["groups"]) else None
+    if feature_cache is not None:
+        documents = filter_cached_documents(documents, feature_cache, cached_results, text_hashes)
+    # the workers record their own profilers, the skip_ids are already applied to the documents
+    worker_options = dict(options, profiler=None, skip_ids=None)
+    initargs = (batch_size, parse_store is not None, profiler is not None, worker_options)
+    with Pool(workers, initializer=init_worker, initargs=initargs) as pool:
+        chunk_size = min(options["chunk_size"], pool.apply(get_worker_max_length))
+        shards = create_shards(split_long_documents(documents, chunk_size), shard_size)
+        for shard_results, doc_bin_bytes, names, shard_profiler in pool.imap_unordered(extract_features_for_shard,
+                                                                                       shards):
+            if parse_store is not None:
+                add_doc_bin(parse_store, doc_bin_bytes, names)
+            if shard_profiler is not None:
+                merge_profilers(profiler, shard_profiler)
+            for name, feature_vector in shard_results:
+                if isinstance(name, tuple):
+                    document = collect_chunk_aggregates(chunk_aggregates, name, feature_vector, log_rank_table,
+                                                        options)
+                    if document is None:
+                        continue
+                    name, feature_vector = document
+                if feature_vector is None:
+                    report_invalid_document(name, text_hashes)
                     continue
+                if feature_cache is not None:
+                    save_features(feature_cache, text_hashes.pop(name), feature_vector)
+                yield name, feature_vector
+            yield from pop_cached_results(cached_results)
+    yield from pop_cached_results(cached_results)
+
 
-                doc = nlp(text)
-                feature_vector = calculate_features(doc, nlp, tokens_freq, discourse_marker)
-                results[document.name.strip(".txt")] = feature_vector
+def generate_features_for_all_docs_in_parallel(directory_path, workers, batch_size=50, feature_cache=None,
+                                               parse_store=None, options=None):
+    """Extracts the text complexity features for all documents in the directory
+    (except the ids in the skip_ids of the options) with a pool of worker
+    processes, see generate_features_in_parallel.
 
-    return results
+    :param directory_path: str
+    :param workers: number of worker processes
+    :param batch_size: number of texts buffered per batch
+    :param feature_cache: dict or None, see utils_and_preprocess.feature_cache
+    :param parse_store: dict or None, see utils_and_preprocess.parse_store
+    :param options: dict or None (the defaults), see create_run_options
+    :return: generator of tuples (file name without .txt, feature vector)
+    """
+    options = options or create_run_options()
+    for name, feature_vector in generate_features_in_parallel(read_documents(directory_path, options["skip_ids"]),
+                                                              workers, batch_size, feature_cache=feature_cache,
+                                                              parse_store=parse_store, options=options):
+        yield get_document_id(name), feature_vector
 
 
 def play_demo():
-    nlp = spacy.load("de_core_news_md")
+    nlp = get_nlp(SPACY_MODEL)
     text = "Das ist meine tolle Banane. " \
            "Die Banane ist reif. " \
            "Sie existiert, um gegessen zu werden. " \
@@ -178,18 +747,9 @@ def play_demo():
            "Gurken und Bananen machen mich glücklich, obwohl sie aus Fasern bestehen. "
     doc = nlp(text)
 
-    tokens_freq = get_data_from_json_file(TOKEN_FREQ)
-
-    disc_marker = get_data_from_json_file(DISCOURSE_MARKER)
-    discourse_markers_with_sense = get_data_from_json_file(DISCOURSE_MARKER_WITH_SENSE)
-    all_disc_marker_senses = get_data_from_json_file(ALL_DISCOURSE_MARKER)
-    discourse_marker = {
-        "disc_marker": disc_marker,
-        "discourse_markers_with_sense": discourse_markers_with_sense,
-        "all_disc_marker_senses": all_disc_marker_senses
-    }
+    log_rank_table, discourse_marker = load_lookup_tables(nlp)
 
-    vec = calculate_features(doc, nlp, tokens_freq, discourse_marker)
+    vec = calculate_features(doc, nlp, log_rank_table, discourse_marker)
     feature_to_index = create_feature_to_idx_dict(FEATURES)
     header_features = list(feature_to_index.keys())
     print("#### DEMO TEXT COMPLEXITY FEATURE EXTRACTION #####")
@@ -209,43 +769,165 @@ def play_demo():
 @click.option("-o", "output_path", type=str, default=True, help="The path (str) for the output file "
                                                                 "in which the extracted features are "
                                                                 "saved as a dataframe in csv format.")
-def cli(demo, directory_path, output_path):
+@click.option("-b", "--batch-size", "batch_size", type=int, default=50, help="The number of texts (int) "
+                                                                             "spacy buffers per batch.")
+@click.option("-n", "--n-process", "n_process", type=int, default=1, help="The number of processors (int) "
+                                                                          "spacy uses for parsing (not "
+                                                                          "with -j).")
+@click.option("-j", "--workers", "workers", type=int, default=1, help="The number of worker processes (int) "
+                                                                      "extracting the features in parallel.")
+@click.option("--backend", "backend", type=click.Choice(list(STATISTICS_BACKENDS)), default="python",
+              help="The backend for the token statistics: python (one pass over the tokens) "
+                   "or array (numpy over Doc.to_array).")
+@click.option("-c", "--cache-dir", "cache_dir", type=str, default=None,
+              help="The directory (str) of the feature cache. Documents whose text, the spacy model, "
+                   "the feature set and the tables did not change since the last run are not parsed again.")
+@click.option("--store-parses", "store_parses", type=str, default=None,
+              help="The directory (str) in which the parsed documents are stored as spacy DocBin "
+                   "shards. Documents from the feature cache are not parsed and not stored.")
+@click.option("--from-parses", "from_parses", type=str, default=None,
+              help="The directory (str) of stored parses (see --store-parses). The features are "
+                   "extracted from these parses without loading the tagger and the parser.")
+@click.option("--sort/--no-sort", "sort_rows", default=True,
+              help="If the rows are sorted by id (default). The rows are written while they are "
+                   "extracted and sorted with an external sort at the end, with --no-sort they "
+                   "are written to the output file in the order of the extraction.")
+@click.option("--resume", "resume", is_flag=True, default=False,
+              help="Resumes a killed run with the same output file: the documents which were already "
+                   "written (see the manifest next to the output file) are skipped, the others appended.")
+@click.option("--format", "output_format", type=click.Choice(list(OUTPUT_FORMATS)), default="csv",
+              help="The format of the output file: csv (values rounded to 6 decimal places), parquet "
+                   "or arrow (Arrow IPC, both need pyarrow) or npy (a matrix of the features with "
+                   "the ids in the file <output>.ids.txt).")
+@click.option("--float-type", "float_type", type=click.Choice(FLOAT_TYPES), default="float64",
+              help="The float type of the features in the parquet, arrow and npy formats.")
+@click.option("-g", "--groups", "--features", "groups", type=click.Choice(list(FEATURE_GROUPS)), multiple=True,
+              help="A feature group which is extracted, can be given more than once (default: all groups). "
+                   "The spacy pipeline components the selected groups do not need are not loaded, without "
+                   "the syntactic features the sentences are split by the senter instead of the parser.")
+@click.option("--chunk-size", "chunk_size", type=click.IntRange(min=1), default=CHUNK_SIZE,
+              help="Documents longer than this number of characters (int) are split into chunks at "
+                   "paragraph boundaries, which are parsed (with -j in parallel) and whose "
+                   "aggregates are added up. The default is the max_length of spacy, larger "
+                   "sizes are reduced to it.")
+@click.option("--profile", "profile_path", type=str, default=None,
+              help="The path (str) of a profile report, which is written at the end of the run: the wall "
+                   "time of the parse, of each feature group and each feature function and the slowest "
+                   "documents with their length.")
+@click.option("--profile-format", "profile_format", type=click.Choice(list(PROFILE_REPORT_FORMATS)),
+              default="json", help="The format of the profile report: json, csv or prometheus (text format).")
+@click.option("--similarity", "similarity_mode", type=click.Choice(SIMILARITY_MODES), default="exact",
+              help="The mode of the average semantic similarity: exact (all pairs of lemmas, quadratic "
+                   "time), linear (from the sum of the normalized vectors, linear time, differs from "
+                   "exact in the order of the float32 precision) or sampled (an estimate from a sample "
+                   "of pairs, see --similarity-budget).")
+@click.option("--similarity-budget", "similarity_budget", type=click.IntRange(min=2),
+              default=SIMILARITY_SAMPLE_BUDGET,
+              help="The number of sampled pairs (int) per word class and document with --similarity "
+                   "sampled. Documents with fewer pairs are computed exactly.")
+def cli(demo, directory_path, output_path, batch_size, n_process, workers, backend, cache_dir,
+        store_parses, from_parses, sort_rows, resume, output_format, float_type, groups, chunk_size,
+        profile_path, profile_format, similarity_mode, similarity_budget):
     if demo:
         play_demo()
     else:
         print("#### TEXT COMPLEXITY FEATURE EXTRACTION #####")
         #summaries_dir_path = "data/model_summaries/"
-        tokens_freq = get_data_from_json_file(TOKEN_FREQ)
-        disc_marker = get_data_from_json_file(DISCOURSE_MARKER)
-        discourse_markers_with_sense = get_data_from_json_file(DISCOURSE_MARKER_WITH_SENSE)
-        all_disc_marker_senses = get_data_from_json_file(ALL_DISCOURSE_MARKER)
-        discourse_marker = {
-            "disc_marker": disc_marker,
-            "discourse_markers_with_sense": discourse_markers_with_sense,
-            "all_disc_marker_senses": all_disc_marker_senses
-        }
-
-        nlp = spacy.load("de_core_news_md")
-        text_complexity_features = extract_features_for_all_docs(directory_path, nlp, tokens_freq, discourse_marker)
+        if workers > 1 and n_process > 1:
+            raise click.UsageError("-n/--n-process can not be combined with -j/--workers, "
+                                   "every worker parses its shards with one process.")
+        # check the input before the spacy model and the tables are loaded
+        if not from_parses and not has_documents(directory_path):
+            print(f"There are no documents (.txt files) in {directory_path}.")
+            print("#### END ####")
+            return
+
+        groups = select_feature_groups(groups)
+        similarity = create_similarity_options(similarity_mode, similarity_budget)
+        features = get_output_features(groups, similarity)
+
+        feature_cache = None
+        if cache_dir:
+            # the .npy files of the log-rank table are generated from TOKEN_FREQ
+            fingerprint = create_fingerprint(SPACY_MODEL, get_model_version(SPACY_MODEL),
+                                             features, FEATURES_VERSION,
+                                             [TOKEN_FREQ, DISCOURSE_MARKER, DISCOURSE_MARKER_WITH_SENSE,
+                                              ALL_DISCOURSE_MARKER], similarity, get_parse_components(groups))
+            feature_cache = open_feature_cache(cache_dir, fingerprint)
 
         # create a feature to index dict to keep track of order of elements
-        feature_to_index = create_feature_to_idx_dict(FEATURES)
+        feature_to_index = create_feature_to_idx_dict(features)
 
-        # save results in one csv file
+        # save results in one file, the rows are written while they are extracted
         header = ["#id"]
         header_features = list(feature_to_index.keys())
         header.extend(header_features)
 
-        with open(output_path, "w", encoding="utf-8") as csv_ofile:
-            writer = csv.writer(csv_ofile, delimiter=',')
-            writer.writerow(i for i in header)
-            for key, value in sorted(text_complexity_features.items()):
-                line = [key]
-                vecs = [round(i, 6) for i in value]
-                line.extend(vecs)
-                writer.writerow(line)
+        if from_parses:
+            try:
+                check_parse_store_components(from_parses, groups)
+            except ValueError as error:
+                raise click.UsageError(str(error))
+
+        try:
+            feature_writer = open_feature_writer(output_path, header, sort_rows, resume=resume,
+                                                 output_format=output_format, float_type=float_type)
+        except ValueError as error:
+            raise click.ClickException(str(error))
+        completed_ids = feature_writer["completed_ids"]
+        if completed_ids:
+            print(f"Resuming, {len(completed_ids)} documents were already written.")
+
+        parse_store = None
+        if store_parses:
+            parse_store = open_parse_store(store_parses, get_parse_components(groups))
+
+        profiler = create_profiler() if profile_path else None
+
+        options = create_run_options(backend, groups, similarity, chunk_size, profiler, completed_ids)
+        if from_parses:
+            nlp = load_model_without_components()
+            log_rank_table, discourse_marker = load_lookup_tables(nlp, groups)
+            text_complexity_features = generate_features_from_parses(from_parses, nlp, log_rank_table,
+                                                                      discourse_marker, options=options)
+        elif workers > 1:
+            text_complexity_features = generate_features_for_all_docs_in_parallel(directory_path, workers,
+                                                                                   batch_size,
+                                                                                   feature_cache=feature_cache,
+                                                                                   parse_store=parse_store,
+                                                                                   options=options)
+        else:
+            nlp = load_model_for_feature_groups(groups)
+            log_rank_table, discourse_marker = load_lookup_tables(nlp, groups)
+            text_complexity_features = generate_features_for_all_docs(directory_path, nlp, log_rank_table,
+                                                                       discourse_marker, batch_size, n_process,
+                                                                       feature_cache=feature_cache,
+                                                                       parse_store=parse_store,
+                                                                       options=options)
+
+        for key, value in text_complexity_features:
+            if profiler is None:
+                write_feature_row(feature_writer, create_feature_row(key, value), key)
+                continue
+            start = time.perf_counter()
+            write_feature_row(feature_writer, create_feature_row(key, value), key)
+            record_time(profiler, "write_row", time.perf_counter() - start)
+        start = time.perf_counter()
+        close_feature_writer(feature_writer)
+        if profiler is not None:
+            record_time(profiler, "close_output", time.perf_counter() - start)
+
+        if feature_cache is not None:
+            close_feature_cache(feature_cache)
+        if parse_store is not None:
+            close_parse_store(parse_store)
 
         print("Find the extracted features in ", output_path)
+        if profiler is not None:
+            report = write_profile_report(profiler, profile_path, profile_format)
+            for record in report["slowest_documents"][:3]:
+                print(f"Slow document: {record['name']} ({record['tokens']} tokens, {record['seconds']:.3f} s)")
+            print("Find the profile report in ", profile_path)
         print("#### END ####")
 
 
@@ -7,41 +7,111 @@
 # $ python extract_features_lexica_corpus.py -d True
 # If you want to run the script with the complete lexica-corpus make sure that
 # you have the data stored like in the constants.py declared
-import csv
-import spacy
 import click
 
-from extract_features import calculate_features, create_feature_to_idx_dict
+from extract_features import create_feature_to_idx_dict, load_lookup_tables, generate_features, \
+    generate_features_in_parallel
 
-from constants import MINIKLEXI, KLEXIKON, WIKI, FEATURES, \
+from constants import MINIKLEXI, KLEXIKON, WIKI, FEATURES, SPACY_MODEL, \
     DEMO_MINIKLEXI, DEMO_KLEXIKON, DEMO_WIKI
 from utils_and_preprocess.utils import get_data_from_json_file
-
-
-def get_features_for_lexica_corpus(list_of_dicts, nlp):
+from utils_and_preprocess.resources import get_nlp
+from utils_and_preprocess.feature_writer import open_feature_writer, write_feature_row, \
+    close_feature_writer, create_feature_row
+
+# the labels of the lexica, the rows of the CSV file are ordered by lexicon
+LEXICA_LABELS = {"miniklexi": 0.0, "klexikon": 0.5, "wiki": 1.0}
+
+
+def create_lexica_documents(corpora, ids):
+    """Yields the texts of the lexica as documents (text, name) for the
+    functions of extract_features, which validate the texts and the parsed
+    docs. The names are strings "<corpus>/<position>" (tuples are the names of
+    chunks, see extract_features.split_long_documents), ids maps them to the
+    corpus and the id of the text.
+
+    :param corpora: dict with the corpus names as keys and list of dicts (with the keys id and text) as values
+    :param ids: dict, is filled with the names as keys and tuples (corpus name, id) as values
+    :return: generator of tuples (text, name)
+    """
+    for corpus, list_of_dicts in corpora.items():
+        for position, elem in enumerate(list_of_dicts):
+            name = f"{corpus}/{position}"
+            ids[name] = (corpus, elem["id"])
+            yield elem["text"], name
+
+
+def generate_features_for_lexica_corpus(list_of_dicts, nlp, log_rank_table, discourse_marker):
+    """Extracts the features for the texts of one lexicon and yields the id and
+    the feature vector of each valid text, see extract_features.generate_features.
+
+    :param list_of_dicts: list of dicts with the keys id and text
+    :param nlp: spacy model
+    :param log_rank_table: log-rank table dict of the token frequencies
+    :param discourse_marker: dict of discourse markers and senses
+    :return: generator of tuples (id, feature vector)
+    """
+    ids = dict()
+    documents = create_lexica_documents({"lexicon": list_of_dicts}, ids)
+    for name, vec in generate_features(documents, nlp, log_rank_table, discourse_marker):
+        yield ids[name][1], vec
+
+
+def get_features_for_lexica_corpus(list_of_dicts, nlp, log_rank_table, discourse_marker):
     results = dict()
-    for elem in list_of_dicts:
-        doc = nlp(elem["text"])
-        vec = calculate_features(doc, nlp)
-        results[elem["id"]] = vec
+    for elem_id, vec in generate_features_for_lexica_corpus(list_of_dicts, nlp, log_rank_table,
+                                                            discourse_marker):
+        results[elem_id] = vec
     return results
 
 
-def play_demo():
-    json_miniklexi = get_data_from_json_file(DEMO_MINIKLEXI)
-    json_klexikon = get_data_from_json_file(DEMO_KLEXIKON)
-    json_wiki = get_data_from_json_file(DEMO_WIKI)
-
-    demo_miniklexi = json_miniklexi["einfache"]  # label 0.0
-    demo_klexikon = json_klexikon["klexikon"]  # label 0.5
-    demo_wiki = json_wiki["wiki"]  # label 1.0
+def generate_features_for_lexica_corpora(corpora, workers=1):
+    """Extracts the features for the three lexica of the lexica-corpus and yields
+    the corpus name, the id and the feature vector of each valid text. With more
+    than one worker all texts are distributed over one pool of worker processes,
+    each loading the spacy model and the lookup tables only once. Both paths
+    validate the texts in the same way, see extract_features.parse_documents.
+
+    :param corpora: dict with the corpus names as keys and list of dicts as values
+    :param workers: number of worker processes
+    :return: generator of tuples (corpus name, id, feature vector)
+    """
+    ids = dict()
+    documents = create_lexica_documents(corpora, ids)
+    if workers > 1:
+        features = generate_features_in_parallel(documents, workers)
+    else:
+        nlp = get_nlp(SPACY_MODEL)
+        log_rank_table, discourse_marker = load_lookup_tables(nlp)
+        features = generate_features(documents, nlp, log_rank_table, discourse_marker)
+    for name, vec in features:
+        corpus, elem_id = ids[name]
+        yield corpus, elem_id, vec
+
+
+def get_features_for_lexica_corpora(corpora, workers=1):
+    """Extracts the features for the three lexica of the lexica-corpus, see
+    generate_features_for_lexica_corpora.
+
+    :param corpora: dict with the corpus names as keys and list of dicts as values
+    :param workers: number of worker processes
+    :return: dict with the corpus names as keys and dicts of results as values
+    """
+    results = {corpus: dict() for corpus in corpora}
+    for corpus, elem_id, vec in generate_features_for_lexica_corpora(corpora, workers):
+        results[corpus][elem_id] = vec
+    return results
 
-    nlp = spacy.load("de_core_news_md")
 
-    result_small_miniklexi = get_features_for_lexica_corpus(demo_miniklexi, nlp)
-    result_small_klexikon = get_features_for_lexica_corpus(demo_klexikon, nlp)
-    result_small_wiki = get_features_for_lexica_corpus(demo_wiki, nlp)
+def write_features_for_lexica_corpora(corpora, output_path, workers=1):
+    """Extracts the features for the lexica and writes them to a CSV file while
+    they are extracted. The rows are sorted by lexicon (in the order of
+    LEXICA_LABELS) and id at the end, see utils_and_preprocess.feature_writer.
 
+    :param corpora: dict with the corpus names as keys and list of dicts as values
+    :param output_path: str
+    :param workers: number of worker processes
+    """
     # create a feature to index dict to keep track of order of elements
     feature_to_index = create_feature_to_idx_dict(FEATURES)
 
@@ -50,33 +120,37 @@ def play_demo():
     header_features = list(feature_to_index.keys())
     header.extend(header_features)
 
-    with open("demo_data/demo_result.csv", "w", encoding="utf-8") as csv_ofile:
-        writer = csv.writer(csv_ofile, delimiter=',')
-        writer.writerow(i for i in header)
-        for key, value in sorted(result_small_miniklexi.items()):
-            line = [f"miniklexi_{key}", 0.0]
-            vecs = [round(i, 6) for i in value]
-            line.extend(vecs)
-            writer.writerow(line)
-        for key, value in sorted(result_small_klexikon.items()):
-            line = [f"klexikon_{key}", 0.5]
-            vecs = [round(i, 6) for i in value]
-            line.extend(vecs)
-            writer.writerow(line)
-        for key, value in sorted(result_small_wiki.items()):
-            line = [f"wiki_{key}", 1.0]
-            vecs = [round(i, 6) for i in value]
-            line.extend(vecs)
-            writer.writerow(line)
+    corpus_order = list(LEXICA_LABELS)
+    feature_writer = open_feature_writer(output_path, header)
+    for corpus, elem_id, vec in generate_features_for_lexica_corpora(corpora, workers):
+        row = create_feature_row(f"{corpus}_{elem_id}", vec, [LEXICA_LABELS[corpus]])
+        write_feature_row(feature_writer, row, [corpus_order.index(corpus), elem_id])
+    close_feature_writer(feature_writer)
+
+
+def play_demo(workers=1):
+    json_miniklexi = get_data_from_json_file(DEMO_MINIKLEXI)
+    json_klexikon = get_data_from_json_file(DEMO_KLEXIKON)
+    json_wiki = get_data_from_json_file(DEMO_WIKI)
+
+    demo_miniklexi = json_miniklexi["einfache"]  # label 0.0
+    demo_klexikon = json_klexikon["klexikon"]  # label 0.5
+    demo_wiki = json_wiki["wiki"]  # label 1.0
+
+    write_features_for_lexica_corpora({"miniklexi": demo_miniklexi,
+                                       "klexikon": demo_klexikon,
+                                       "wiki": demo_wiki}, "demo_data/demo_result.csv", workers)
 
     print("Find the extracted demo results in demo_data/demo_result.csv")
 
 
 @click.command()
 @click.option("-d", "demo", type=bool, default=True, help="If you want to see a small demo.")
-def cli(demo):
+@click.option("-j", "--workers", "workers", type=int, default=1, help="The number of worker processes (int) "
+                                                                      "extracting the features in parallel.")
+def cli(demo, workers):
     if demo:
-        play_demo()
+        play_demo(workers)
     else:
         json_miniklexi = get_data_from_json_file(MINIKLEXI)
         json_klexikon = get_data_from_json_file(KLEXIKON)
@@ -86,37 +160,9 @@ def cli(demo):
         klexikon = json_klexikon["klexikon"]  # label 0.5
         wiki = json_wiki["wiki"]  # label 1.0
 
-        nlp = spacy.load("de_core_news_md")
-        result_miniklexi = get_features_for_lexica_corpus(miniklexi, nlp)
-        result_klexikon = get_features_for_lexica_corpus(klexikon, nlp)
-        result_wiki = get_features_for_lexica_corpus(wiki, nlp)
-
-        # create a feature to index dict to keep track of order of elements
-        feature_to_index = create_feature_to_idx_dict(FEATURES)
-
-        # save results in one csv file
-        header = ["#id", "#label"]
-        header_features = list(feature_to_index.keys())
-        header.extend(header_features)
-
-        with open("text_complexity_lexica_corpus.csv", "w", encoding="utf-8") as csv_ofile:
-            writer = csv.writer(csv_ofile, delimiter=',')
-            writer.writerow(i for i in header)
-            for key, value in sorted(result_miniklexi.items()):
-                line = [f"miniklexi_{key}", 0.0]
-                vecs = [round(i, 6) for i in value]
-                line.extend(vecs)
-                writer.writerow(line)
-            for key, value in sorted(result_klexikon.items()):
-                line = [f"klexikon_{key}", 0.5]
-                vecs = [round(i, 6) for i in value]
-                line.extend(vecs)
-                writer.writerow(line)
-            for key, value in sorted(result_wiki.items()):
-                line = [f"wiki_{key}", 1.0]
-                vecs = [round(i, 6) for i in value]
-                line.extend(vecs)
-                writer.writerow(line)
+        write_features_for_lexica_corpora({"miniklexi": miniklexi,
+                                           "klexikon": klexikon,
+                                           "wiki": wiki}, "text_complexity_lexica_corpus.csv", workers)
 
         print("Find the extracted features in text_complexity_lexica_corpus.csv")
 
@@ -0,0 +1,358 @@
+# Computes the features of a text from partial aggregates of its sentences, so
+# that a document can be scored again after an edit without parsing the whole
+# text again. The aggregates of a sentence are its token statistics (see
+# features.doc_statistics), the number of noun phrases and the tree height,
+# the multisets of the lemmas (for the type-token-ratio and the lexical
+# complexity score), the sums of the lemma vectors (for the semantic
+# similarity) and the matched discourse markers with their senses. The
+# aggregates of all sentences are added up and the features are computed from
+# the sums with the same formulas as the functions in features.*.
+# A document state keeps the text and the aggregates of each sentence. When the
+# text changes, only the sentences between the unchanged beginning and end of
+# the text are parsed again (see update_document_state). The aggregates of the
+# chunks of a long document can be counted in parallel and added up, see
+# extract_features.split_long_documents.
+# You can run a demo with: $ python aggregates.py
+import statistics
+import numpy as np
+from collections import Counter
+
+from constants import FEATURE_GROUPS
+from utils_and_preprocess.utils import safe_division, select_feature_groups
+from features.doc_statistics import count_doc_statistics
+from features.surface_features import count_syllables_of_words
+from features.syntactic_features import get_token_depths
+from features.lexical_features import get_log_ranks
+from features.semantic_similarity_features import get_all_lemmatized_nouns, \
+    get_all_lemmatized_verbs, get_all_lemmatized_adjectives, sum_unit_vectors, \
+    calculate_average_semantic_similarity_from_sums
+from features.discourse_features import match_discourse_markers, count_discourse_marker_senses
+
+# the functions which return the lemmas of the word classes of the semantic similarity features
+SIMILARITY_WORD_CLASSES = {
+    "nouns": get_all_lemmatized_nouns,
+    "verbs": get_all_lemmatized_verbs,
+    "adjectives": get_all_lemmatized_adjectives
+}
+# number of unchanged sentences before and after an edit which are parsed again,
+# because the sentence boundaries next to the edit can change
+CONTEXT_SENTENCES = 1
+
+
+def count_sentence_aggregates(doc, nlp, discourse_marker=None, groups=None):
+    """Counts the aggregates of every sentence of the parsed doc which are needed
+    by the feature groups. The token statistics are always counted, the other
+    aggregates only for the groups that use them.
+    :param doc: spacy.tokens.doc.Doc
+    :param nlp: spacy model (for the lemma vectors)
+    :param discourse_marker: dict of discourse markers and senses or None
+    :param groups: iterable of feature groups or None (all groups)
+    :return: list of dicts, one per sentence """
+    groups = select_feature_groups(groups)
+    sentences = list(doc.sents)
+    aggregates = [{"statistics": count_doc_statistics(sent)} for sent in sentences]
+
+    if "syntactic" in groups:
+        sentence_of_token = np.repeat(np.arange(len(sentences)), [len(sent) for sent in sentences])
+        chunk_starts = [chunk.start for chunk in doc.noun_chunks]
+        noun_chunks = np.bincount(sentence_of_token[chunk_starts], minlength=len(sentences))
+        depths = get_token_depths(doc)
+        for sentence_aggregates, sent, count in zip(aggregates, sentences, noun_chunks):
+            sentence_aggregates["noun_chunks"] = int(count)
+            sentence_aggregates["heights"] = [int(depths[sent.start:sent.end].max()) + 1]
+
+    for sentence_aggregates, sent in zip(aggregates, sentences):
+        if "lexical" in groups:
+            sentence_aggregates["lemma_counts"] = Counter(
+                tok.lemma_ for tok in sent if not tok.is_punct and not tok.is_space)
+            sentence_aggregates["lowered_lemma_counts"] = Counter(
+                tok.lemma_.lower() for tok in sent if not tok.is_punct)
+        if "semantic_similarity" in groups:
+            sentence_aggregates["vector_sums"] = {
+                word_class: sum_unit_vectors(get_lemmas(sent), nlp)
+                for word_class, get_lemmas in SIMILARITY_WORD_CLASSES.items()}
+        if "discourse" in groups or "discourse_marker_senses" in groups:
+            matches = match_discourse_markers(sent, discourse_marker["matcher"])
+            sentence_aggregates["discourse_markers"] = sum(entry["count"] for entry in matches)
+            sentence_aggregates["sense_counts"] = count_discourse_marker_senses(matches,
+                                                                                discourse_marker["sense_index"])
+
+    return aggregates
+
+
+def add_aggregates(total, aggregates):
+    """Adds the aggregates of a sentence (or of several sentences) to the total.
+    Counts, vectors and Counters are summed, the lists of tree heights are concatenated.
+    :param total: dict, is changed
+    :param aggregates: dict, see count_sentence_aggregates
+    :return: dict, the total """
+    for key, value in aggregates.items():
+        if key not in total:
+            total[key] = copy_aggregate(value)
+        elif key == "statistics":
+            add_aggregates(total[key], value)
+        elif key == "vector_sums":
+            for word_class, vector_sums in value.items():
+                total[key][word_class] = {part: total[key][word_class][part] + vector_sums[part]
+                                          for part in vector_sums}
+        elif isinstance(value, Counter):
+            total[key].update(value)
+        elif isinstance(value, list):
+            total[key].extend(value)
+        else:
+            total[key] = total[key] + value
+    return total
+
+
+def copy_aggregate(value):
+    """Copies an aggregate, so that adding to the total does not change the
+    aggregates of the sentences.
+    :param value: number, list, numpy array, Counter or dict
+    :return: the copy """
+    if isinstance(value, Counter):
+        return Counter(value)
+    if isinstance(value, dict):
+        return {key: copy_aggregate(part) for key, part in value.items()}
+    if isinstance(value, (list, np.ndarray)):
+        return value.copy()
+    return value
+
+
+def combine_aggregates(aggregates):
+    """Adds up the aggregates of the sentences of a document in their order.
+    :param aggregates: iterable of dicts, see count_sentence_aggregates
+    :return: dict """
+    total = dict()
+    for sentence_aggregates in aggregates:
+        add_aggregates(total, sentence_aggregates)
+    return total
+
+
+def count_doc_aggregates(doc, nlp, discourse_marker=None, groups=None):
+    """Counts the aggregates of the parsed doc (e.g. a chunk of a long document),
+    the sum of the aggregates of its sentences. The aggregates of the chunks of
+    a document can be added (see combine_aggregates) to the aggregates of the
+    whole document.
+    :param doc: spacy.tokens.doc.Doc
+    :param nlp: spacy model (for the lemma vectors)
+    :param discourse_marker: dict of discourse markers and senses or None
+    :param groups: iterable of feature groups or None (all groups)
+    :return: dict """
+    return combine_aggregates(count_sentence_aggregates(doc, nlp, discourse_marker, groups))
+
+
+def calculate_surface_features_from_aggregates(aggregates, log_rank_table):
+    stats = aggregates["statistics"]
+    return [
+            safe_division(stats["words"], stats["sentences"]),
+            safe_division(stats["characters"], stats["words"]),
+            safe_division(count_syllables_of_words(stats["orth_counts"]), stats["words"]),
+            stats["words"]
+            ]
+
+
+def calculate_syntactic_features_from_aggregates(aggregates, log_rank_table):
+    stats = aggregates["statistics"]
+    return [
+            safe_division(aggregates["noun_chunks"], stats["sentences"]),
+            statistics.mean(aggregates["heights"]),
+            safe_division(stats["commas"], stats["sentences"]),
+            safe_division(stats["root_pos_counts"]["VERB"], stats["sentences"]),
+            safe_division(stats["root_pos_counts"]["NOUN"], stats["sentences"])
+            ]
+
+
+def calculate_pos_tag_features_from_aggregates(aggregates, log_rank_table):
+    stats = aggregates["statistics"]
+    pos_counts = stats["pos_counts"]
+    return [
+            safe_division(pos_counts["VERB"] + pos_counts["AUX"], stats["words"]),
+            safe_division(pos_counts["AUX"], stats["words"]),
+            safe_division(pos_counts["NOUN"], stats["words"]),
+            safe_division(stats["tag_counts"]["ADJD"] + stats["tag_counts"]["ADJA"], stats["words"]),
+            safe_division(pos_counts["PUNCT"], stats["tokens"]),
+            safe_division(pos_counts["DET"], stats["words"]),
+            safe_division(pos_counts["PRON"], stats["words"]),
+            safe_division(pos_counts["SCONJ"] + pos_counts["CCONJ"], stats["words"]),
+            safe_division(stats["non_alpha"], stats["words"]),
+            safe_division(pos_counts["ADP"], stats["words"])
+            ]
+
+
+def calculate_lexical_features_from_aggregates(aggregates, log_rank_table):
+    lemma_counts = aggregates["lemma_counts"]
+    return [
+            safe_division(len(lemma_counts), sum(lemma_counts.values())),
+            np.percentile(get_log_ranks(aggregates["lowered_lemma_counts"], log_rank_table), 75)
+            ]
+
+
+def calculate_verb_tense_features_from_aggregates(aggregates, log_rank_table):
+    stats = aggregates["statistics"]
+    return [safe_division(stats["verb_forms"], stats["sentences"])]
+
+
+def calculate_semantic_similarity_features_from_aggregates(aggregates, log_rank_table):
+    return [calculate_average_semantic_similarity_from_sums(aggregates["vector_sums"][word_class])
+            for word_class in SIMILARITY_WORD_CLASSES]
+
+
+def calculate_discourse_features_from_aggregates(aggregates, log_rank_table):
+    stats = aggregates["statistics"]
+    return [
+            safe_division(stats["pos_counts"]["PRON"], stats["sentences"]),
+            safe_division(stats["definite_articles"], stats["sentences"]),
+            safe_division(aggregates["discourse_markers"], stats["sentences"])
+            ]
+
+
+def calculate_discourse_marker_sense_features_from_aggregates(aggregates, log_rank_table):
+    return aggregates["sense_counts"]
+
+
+# The functions which calculate the features of each group from the aggregates,
+# like the features of features.registry.FEATURE_REGISTRY from a doc.
+AGGREGATE_FEATURE_FUNCTIONS = {
+    "surface": calculate_surface_features_from_aggregates,
+    "syntactic": calculate_syntactic_features_from_aggregates,
+    "pos_tags": calculate_pos_tag_features_from_aggregates,
+    "lexical": calculate_lexical_features_from_aggregates,
+    "verb_tense": calculate_verb_tense_features_from_aggregates,
+    "semantic_similarity": calculate_semantic_similarity_features_from_aggregates,
+    "discourse": calculate_discourse_features_from_aggregates,
+    "discourse_marker_senses": calculate_discourse_marker_sense_features_from_aggregates
+}
+
+
+def calculate_features_from_aggregates(aggregates, log_rank_table, groups=None):
+    """Calculates the features of the selected groups from the aggregates of a
+    document, in the order of extract_features.calculate_features.
+    :param aggregates: dict, see combine_aggregates
+    :param log_rank_table: log-rank table of the token frequencies
+    :param groups: iterable of feature groups or None (all groups)
+    :return: a list of numbers """
+    result = []
+    for group in select_feature_groups(groups):
+        result.extend(AGGREGATE_FEATURE_FUNCTIONS[group](aggregates, log_rank_table))
+    return result
+
+
+def parse_sentences(text, nlp, discourse_marker=None, groups=None):
+    """Parses the text and returns the text (with the following whitespace) and
+    the aggregates of each sentence.
+    :param text: str
+    :param nlp: spacy model
+    :param discourse_marker: dict of discourse markers and senses or None
+    :param groups: iterable of feature groups or None (all groups)
+    :return: list of dicts """
+    if not text:
+        return []
+    doc = nlp(text)
+    aggregates = count_sentence_aggregates(doc, nlp, discourse_marker, groups)
+    return [{"text": sent.text_with_ws, "aggregates": sentence_aggregates}
+            for sent, sentence_aggregates in zip(doc.sents, aggregates)]
+
+
+def create_document_state(text, nlp, discourse_marker=None, groups=None):
+    """Parses the text and keeps the aggregates of its sentences, so that the
+    features can be calculated (see calculate_features_from_state) and the
+    state can be updated after an edit (see update_document_state).
+    :param text: str
+    :param nlp: spacy model
+    :param discourse_marker: dict of discourse markers and senses or None
+    :param groups: iterable of feature groups or None (all groups)
+    :return: dict """
+    return {
+        "groups": select_feature_groups(groups),
+        "sentences": parse_sentences(text, nlp, discourse_marker, groups),
+        "parsed_sentences": None
+    }
+
+
+def find_changed_sentences(sentence_texts, text):
+    """Finds the sentences which are not at the unchanged beginning or end of
+    the new text. The texts of the sentences cover the old text.
+    :param sentence_texts: list of strings (with the following whitespace)
+    :param text: str, the new text
+    :return: tuple (number of unchanged sentences at the beginning, number of
+        unchanged sentences at the end, start and end of the changed text) """
+    prefix, start = 0, 0
+    while prefix < len(sentence_texts) and text.startswith(sentence_texts[prefix], start):
+        start += len(sentence_texts[prefix])
+        prefix += 1
+    suffix, end = 0, len(text)
+    while suffix < len(sentence_texts) - prefix and \
+            text.endswith(sentence_texts[-1 - suffix], start, end):
+        end -= len(sentence_texts[-1 - suffix])
+        suffix += 1
+
+    # the sentences next to the change are parsed again
+    context_prefix = max(prefix - CONTEXT_SENTENCES, 0)
+    context_suffix = max(suffix - CONTEXT_SENTENCES, 0)
+    start -= sum(len(sentence) for sentence in sentence_texts[context_prefix:prefix])
+    end += sum(len(sentence) for sentence in sentence_texts[len(sentence_texts) - suffix:
+                                                             len(sentence_texts) - context_suffix])
+    return context_prefix, context_suffix, start, end
+
+
+def update_document_state(state, text, nlp, discourse_marker=None):
+    """Updates the document state to the edited text. Only the sentences between
+    the unchanged beginning and end of the text (and one sentence of context on
+    each side) are parsed again, the aggregates of the other sentences are kept.
+    The changed sentences are parsed without the rest of the text, so their
+    values can differ slightly from a parse of the whole text.
+    :param state: dict, see create_document_state
+    :param text: str, the edited text
+    :param nlp: spacy model
+    :param discourse_marker: dict of discourse markers and senses or None
+    :return: dict, the updated state """
+    sentences = state["sentences"]
+    sentence_texts = [sentence["text"] for sentence in sentences]
+    if "".join(sentence_texts) == text:
+        return dict(state, parsed_sentences=0)
+    prefix, suffix, start, end = find_changed_sentences(sentence_texts, text)
+    changed_sentences = parse_sentences(text[start:end], nlp, discourse_marker, state["groups"])
+    return {
+        "groups": state["groups"],
+        "sentences": sentences[:prefix] + changed_sentences + sentences[len(sentences) - suffix:],
+        "parsed_sentences": len(changed_sentences)
+    }
+
+
+def calculate_features_from_state(state, log_rank_table):
+    """Calculates the features of the document from the aggregates of its sentences.
+    An empty text has no sentences, all its features are 0.
+    :param state: dict, see create_document_state
+    :param log_rank_table: log-rank table of the token frequencies
+    :return: a list of numbers """
+    if not state["sentences"]:
+        return [0] * sum(len(FEATURE_GROUPS[group]) for group in state["groups"])
+    aggregates = combine_aggregates(sentence["aggregates"] for sentence in state["sentences"])
+    return calculate_features_from_aggregates(aggregates, log_rank_table, state["groups"])
+
+
+def demo():
+    import spacy
+    from utils_and_preprocess.resources import get_log_rank_table, get_discourse_marker
+    nlp = spacy.load("de_core_news_md")
+    text = "Das ist meine tolle Banane. " \
+           "Die Banane ist reif. " \
+           "Sie existiert, um gegessen zu werden. " \
+           "Je toller eine Banane ist, desto mehr möchte ich sie essen. " \
+           "Sie kann gegessen werden, weil sie essbar ist. " \
+           "Gurken und Bananen machen mich glücklich, obwohl sie aus Fasern bestehen. "
+    edited_text = text.replace("Die Banane ist reif.", "Die Banane ist noch nicht reif, aber gelb.")
+    log_rank_table = get_log_rank_table()
+    discourse_marker = get_discourse_marker(nlp)
+
+    state = create_document_state(text, nlp, discourse_marker)
+    print(text)
+    print(calculate_features_from_state(state, log_rank_table))
+    state = update_document_state(state, edited_text, nlp, discourse_marker)
+    print(edited_text)
+    print("parsed sentences:", state["parsed_sentences"], "of", len(state["sentences"]))
+    print(calculate_features_from_state(state, log_rank_table))
+
+
+if __name__ == "__main__":
+    demo()
@@ -6,13 +6,16 @@
 # average count of discourse markers per sentence
 # Vector with counts of used discourse markers
 # You can run a demo with: $ python discourse_features.py
-import spacy
-from itertools import repeat
+import numpy as np
 
 from utils_and_preprocess.utils import get_data_from_json_file, safe_division
+from features.doc_statistics import get_doc_statistics
 from constants import DISCOURSE_MARKER, \
     DISCOURSE_MARKER_WITH_SENSE, ALL_DISCOURSE_MARKER
 
+# key under which the matched discourse markers are stored in doc.user_data
+DISCOURSE_MARKER_MATCHES = "discourse_marker_matches"
+
 
 # cohesion features
 def get_average_count_of_pronouns_per_sentence(doc):
@@ -21,8 +24,8 @@ def get_average_count_of_pronouns_per_sentence(doc):
     :param doc: spacy.tokens.doc.Doc
     :return: float
     """
-    pronouns = sum([1 for token in doc if token.pos_ == "PRON"])
-    return safe_division(pronouns, len(list(doc.sents)))
+    doc_stats = get_doc_statistics(doc)
+    return safe_division(doc_stats["pos_counts"]["PRON"], doc_stats["sentences"])
 
 
 def get_average_count_of_definite_articles_per_sentence(doc):
@@ -33,12 +36,134 @@ def get_average_count_of_definite_articles_per_sentence(doc):
     :param doc: spacy.tokens.doc.Doc
     :return: float
     """
-    def_articles_count = sum([1 for token in doc if token.tag_ == "ART" and token.text.startswith(("d", "D"))])
-    return safe_division(def_articles_count, len(list(doc.sents)))
+    doc_stats = get_doc_statistics(doc)
+    return safe_division(doc_stats["definite_articles"], doc_stats["sentences"])
 
 
 # coherence feature
-def get_average_count_of_discourse_markers_per_sentence(doc, discourse_markers):
+def tokenize_discourse_marker(discourse_marker, nlp):
+    """Tokenizes a discourse marker with the tokenizer of the spacy model and
+    returns the lowered tokens, so that multi-word markers like "abgesehen
+    davon, dass" are split like the texts.
+    :param discourse_marker: str
+    :param nlp: spacy model
+    :return: tuple of strings """
+    return tuple(tok.lower_ for tok in nlp.make_doc(discourse_marker) if not tok.is_space)
+
+
+def create_discourse_marker_matcher(nlp, discourse_markers, discourse_markers_with_sense):
+    """Compiles the discourse markers from the DimLex into a matcher, which is
+    built once when the tables are loaded. The matcher maps the lowered tokens
+    of each marker to the number of DimLex entries of the marker and to its
+    senses. Markers with a gap (e.g. "entweder ... oder") are left out, only
+    single-token and contiguous multi-token markers are matched.
+    For more information see:
+    the comment in utils_and_preprocess.discourse_markers.py
+
+    :param nlp: spacy model
+    :param discourse_markers: list of discourse markers
+    :param discourse_markers_with_sense: list of lists
+    :return: dict """
+    markers = dict()
+    for discourse_marker in discourse_markers:
+        if "..." in discourse_marker:
+            continue
+        tokens = tokenize_discourse_marker(discourse_marker, nlp)
+        entry = markers.setdefault(tokens, {"count": 0, "senses": []})
+        entry["count"] += 1
+    for sense, discourse_marker in discourse_markers_with_sense:
+        if "..." in discourse_marker:
+            continue
+        tokens = tokenize_discourse_marker(discourse_marker, nlp)
+        entry = markers.setdefault(tokens, {"count": 0, "senses": []})
+        entry["senses"].append((discourse_marker, sense))
+
+    # the same markers keyed by the hashes of the lowered tokens (the LOWER
+    # attribute of Doc.to_array) for match_discourse_markers_from_array
+    hashed_markers = {tuple(nlp.vocab.strings.add(token) for token in tokens): entry
+                      for tokens, entry in markers.items()}
+    return {"markers": markers, "max_length": max(len(tokens) for tokens in markers),
+            "hashed_markers": hashed_markers,
+            "first_tokens": np.array(sorted({tokens[0] for tokens in hashed_markers}), dtype=np.uint64)}
+
+
+def match_discourse_markers(doc, discourse_marker_matcher):
+    """Finds the discourse markers in the doc in one pass over the tokens. At
+    each token the longest marker is matched first and matches do not overlap,
+    e.g. "als ob" is matched as one marker and not as "als" and "ob".
+
+    :param doc: spacy.tokens.doc.Doc
+    :param discourse_marker_matcher: dict, see create_discourse_marker_matcher
+    :return: list of dicts (the matched marker entries) """
+    markers = discourse_marker_matcher["markers"]
+    max_length = discourse_marker_matcher["max_length"]
+    tokens = [tok.lower_ for tok in doc]
+    matches = []
+    i = 0
+    while i < len(tokens):
+        for length in range(min(max_length, len(tokens) - i), 0, -1):
+            entry = markers.get(tuple(tokens[i:i + length]))
+            if entry:
+                matches.append(entry)
+                i += length
+                break
+        else:
+            i += 1
+
+    return matches
+
+
+def match_discourse_markers_from_array(doc, discourse_marker_matcher):
+    """Finds the same discourse markers as match_discourse_markers, but from the
+    hashes of the lowered tokens (Doc.to_array) without creating Token objects.
+    Only the tokens which start a marker are tried.
+
+    :param doc: spacy.tokens.doc.Doc
+    :param discourse_marker_matcher: dict, see create_discourse_marker_matcher
+    :return: list of dicts (the matched marker entries) """
+    markers = discourse_marker_matcher["hashed_markers"]
+    max_length = discourse_marker_matcher["max_length"]
+    lowers = doc.to_array("LOWER")
+    starts = np.flatnonzero(np.isin(lowers, discourse_marker_matcher["first_tokens"]))
+    tokens = lowers.tolist()
+    matches = []
+    end = 0
+    for i in starts.tolist():
+        if i < end:
+            continue
+        for length in range(min(max_length, len(tokens) - i), 0, -1):
+            entry = markers.get(tuple(tokens[i:i + length]))
+            if entry:
+                matches.append(entry)
+                end = i + length
+                break
+
+    return matches
+
+
+# the functions which match the discourse markers with each backend, see features.doc_statistics
+DISCOURSE_MARKER_BACKENDS = {
+    "python": match_discourse_markers,
+    "array": match_discourse_markers_from_array
+}
+
+
+def get_discourse_markers(doc, discourse_marker_matcher, backend="python"):
+    """Returns the matched discourse markers of the doc. They are matched on the
+    first call with the given backend and stored in doc.user_data, so the count
+    per sentence and the senses share one pass.
+
+    :param doc: spacy.tokens.doc.Doc
+    :param discourse_marker_matcher: dict, see create_discourse_marker_matcher
+    :param backend: "python" or "array", see DISCOURSE_MARKER_BACKENDS
+    :return: list of dicts """
+    if DISCOURSE_MARKER_MATCHES not in doc.user_data:
+        doc.user_data[DISCOURSE_MARKER_MATCHES] = DISCOURSE_MARKER_BACKENDS[backend](doc,
+                                                                                   discourse_marker_matcher)
+    return doc.user_data[DISCOURSE_MARKER_MATCHES]
+
+
+def get_average_count_of_discourse_markers_per_sentence(doc, discourse_marker_matcher):
     """Calculates the average count of discourse markers per sentence.
     Based on the discourse markers from the DimLex, a lexicon of german discourse
     markers.
@@ -46,57 +171,65 @@ def get_average_count_of_discourse_markers_per_sentence(doc, discourse_markers):
     the comment in utils_and_preprocess.discourse_markers.py
 
     :param doc: spacy.tokens.doc.Doc
-    :param discourse_markers: list of discourse markers
+    :param discourse_marker_matcher: dict, see create_discourse_marker_matcher
     :return: float """
-    disc_markers = []
+    disc_markers = sum(entry["count"] for entry in get_discourse_markers(doc, discourse_marker_matcher))
 
-    for token in doc:
-        for discourse_marker in discourse_markers:
-            if token.text.lower() == discourse_marker.lower():
-                disc_markers.append(discourse_marker)
+    return safe_division(disc_markers, get_doc_statistics(doc)["sentences"])
 
-    return safe_division(len(disc_markers), len(list(doc.sents)))
 
-
-def find_discourse_markers(doc, discourse_markers_with_sense):
+def find_discourse_markers(doc, discourse_marker_matcher):
     """ Finds the discourse markers in the text based on the DimLex, a lexicon
     of german discourse markers.
     For more information see:
     the comment in utils_and_preprocess.discourse_markers.py
 
     :param doc: spacy.tokens.doc.Doc
-    :param discourse_markers_with_sense: list of lists
+    :param discourse_marker_matcher: dict, see create_discourse_marker_matcher
     :return: list of tuples """
-    disc_markers = []
+    return [marker_with_sense for entry in get_discourse_markers(doc, discourse_marker_matcher)
+            for marker_with_sense in entry["senses"]]
 
-    for token in doc:
-        for sense, discourse_marker in discourse_markers_with_sense:
-            if token.text.lower() == discourse_marker.lower():
-                disc_markers.append((discourse_marker, sense))
 
-    return disc_markers
+def create_sense_index(all_disc_marker_senses):
+    """Maps each discourse marker sense to its column in the sense vector. The
+    index is built once when the tables are loaded.
 
+    :param all_disc_marker_senses: list of strings
+    :return: dict with senses as keys and columns as values """
+    return {sense: column for column, sense in enumerate(all_disc_marker_senses)}
 
-def get_count_for_discourse_marker_senses(doc, all_disc_marker_senses, discourse_markers_with_sense):
+
+def get_count_for_discourse_marker_senses(doc, sense_index, discourse_marker_matcher):
     """Calculates the counts of the discourse markers in the texts and returns
-    a list of the counts.
+    a vector of the counts with one column per sense.
 
     :param doc: spacy.tokens.doc.Doc
-    :param all_disc_marker_senses: list of strings
-    :param discourse_markers_with_sense: list of lists
-    :return: list of ints """
-    dm_from_doc = find_discourse_markers(doc, discourse_markers_with_sense)
-    # init empty vec
-    counts_vec = list(repeat(0, len(all_disc_marker_senses)))
-    for i in range(len(counts_vec)):
-        for dm in dm_from_doc:
-            if dm[1] == all_disc_marker_senses[i]:
-                counts_vec[i] = counts_vec[i] + 1
+    :param sense_index: dict, see create_sense_index
+    :param discourse_marker_matcher: dict, see create_discourse_marker_matcher
+    :return: numpy array of ints """
+    return count_discourse_marker_senses(get_discourse_markers(doc, discourse_marker_matcher), sense_index)
+
+
+def count_discourse_marker_senses(matches, sense_index):
+    """Counts the senses of the matched discourse markers in a vector with one
+    column per sense.
+
+    :param matches: list of dicts, see match_discourse_markers
+    :param sense_index: dict, see create_sense_index
+    :return: numpy array of ints """
+    counts_vec = np.zeros(len(sense_index), dtype=int)
+    for entry in matches:
+        for discourse_marker, sense in entry["senses"]:
+            column = sense_index.get(sense)
+            if column is not None:
+                counts_vec[column] += 1
 
     return counts_vec
 
 
 def demo():
+    import spacy
     nlp = spacy.load("de_core_news_sm")
     text = "Das ist meine tolle Banane. " \
            "Die Banane ist reif. " \
@@ -109,22 +242,25 @@ def demo():
     discourse_markers = get_data_from_json_file("../" + DISCOURSE_MARKER)
     discourse_markers_with_sense = get_data_from_json_file("../" + DISCOURSE_MARKER_WITH_SENSE)
     all_disc_marker_senses = get_data_from_json_file("../" + ALL_DISCOURSE_MARKER)
+    discourse_marker_matcher = create_discourse_marker_matcher(nlp, discourse_markers,
+                                                               discourse_markers_with_sense)
 
     print(text)
     print("Average count per sentence...")
     print("... of pronouns:", get_average_count_of_pronouns_per_sentence(doc))
     print("... of definite articles:", get_average_count_of_definite_articles_per_sentence(doc))
-    print("... of discourse markers:", get_average_count_of_discourse_markers_per_sentence(doc, discourse_markers))
+    print("... of discourse markers:", get_average_count_of_discourse_markers_per_sentence(doc, discourse_marker_matcher))
     print("Vector with counts of used discourse markers in doc:")
-    print(get_count_for_discourse_marker_senses(doc, all_disc_marker_senses, discourse_markers_with_sense))
+    sense_index = create_sense_index(all_disc_marker_senses)
+    print(get_count_for_discourse_marker_senses(doc, sense_index, discourse_marker_matcher))
 
     # output
     # Average count per sentence...
     # ... of pronouns: 1.6666666666666667
     # ... of definite articles: 0.16666666666666666
-    # ... of discourse markers: 0.5
+    # ... of discourse markers: 0.6666666666666666
     # Vector with counts of used discourse marker senses:
-    # [0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
+    # [1 0 0 0 2 0 0 0 0 1 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,227 @@
+# Counts the token statistics of a text in one pass over its tokens. The
+# statistics are shared by the surface, syntactic, POS tag, verb tense and
+# discourse features, so that a doc is only iterated once for all counts.
+# There are two backends which count the same statistics: "python" iterates
+# once over the tokens, "array" exports the token attributes once with
+# Doc.to_array and counts them with numpy without creating Token objects.
+# Counted statistics:
+# number of tokens, words (tokens without punctuation) and sentences
+# number of characters of all words
+# number of not alphabetic tokens
+# counts of the POS tags, the fine-grained tags and the POS tags of the roots
+# number of definite articles
+# number of commas
+# number of verb forms (see features.verb_tense_feature)
+# counts of the token texts (see features.surface_features.count_syllables)
+# The lemmas of the words, nouns, verbs and adjectives, which are shared by the
+# lexical and the semantic similarity features, are collected in a second pass
+# (see get_lemmas), which is only made by the features that need them.
+# You can run a demo with: $ python doc_statistics.py
+import numpy as np
+from collections import Counter
+
+# key under which the statistics are stored in doc.user_data
+DOC_STATISTICS = "doc_statistics"
+# key under which the lemmas are stored in doc.user_data
+LEMMAS = "lemmas"
+# token attributes (names of spacy.attrs) exported by the array backend, in this column order
+ARRAY_ATTRIBUTES = ["ORTH", "POS", "TAG", "DEP", "MORPH", "LENGTH", "IS_PUNCT", "IS_ALPHA", "SENT_START"]
+
+
+def count_verb_forms(morph):
+    """Counts the verb forms of a token like in features.verb_tense_feature:
+    the tenses of a finite verb or else the infinite verb form.
+    :param morph: spacy.tokens.morphanalysis.MorphAnalysis
+    :return: int """
+    if not morph.get("VerbForm"):
+        return 0
+    if morph.get("Tense"):
+        return len(morph.get("Tense"))
+    return len(morph.get("VerbForm"))
+
+
+def count_doc_statistics(doc):
+    """Counts all token statistics of the doc in one pass over the tokens.
+    The number of sentences is the number of tokens which start a sentence,
+    the first token always starts one (see spacy.tokens.doc.Doc.sents).
+    :param doc: spacy.tokens.doc.Doc or spacy.tokens.span.Span
+    :return: dict """
+    number_of_words = 0
+    number_of_characters = 0
+    number_of_non_alpha = 0
+    number_of_sentences = 0
+    number_of_definite_articles = 0
+    number_of_verb_forms = 0
+    pos_counts = Counter()
+    tag_counts = Counter()
+    root_pos_counts = Counter()
+    orth_counts = Counter()
+
+    for i, tok in enumerate(doc):
+        pos = tok.pos_
+        tag = tok.tag_
+        pos_counts[pos] += 1
+        tag_counts[tag] += 1
+        orth_counts[tok.text] += 1
+        number_of_verb_forms += count_verb_forms(tok.morph)
+        if not tok.is_punct:
+            number_of_words += 1
+            number_of_characters += len(tok.text)
+        if not tok.is_alpha:
+            number_of_non_alpha += 1
+        if i == 0 or tok.is_sent_start:
+            number_of_sentences += 1
+        if tok.dep_ == "ROOT":
+            root_pos_counts[pos] += 1
+        # see get_average_count_of_definite_articles_per_sentence
+        if tag == "ART" and tok.text.startswith(("d", "D")):
+            number_of_definite_articles += 1
+
+    return {
+        "tokens": len(doc),
+        "words": number_of_words,
+        "sentences": number_of_sentences,
+        "characters": number_of_characters,
+        "non_alpha": number_of_non_alpha,
+        "definite_articles": number_of_definite_articles,
+        "commas": doc.text.count(","),
+        "verb_forms": number_of_verb_forms,
+        "pos_counts": pos_counts,
+        "tag_counts": tag_counts,
+        "root_pos_counts": root_pos_counts,
+        "orth_counts": orth_counts
+    }
+
+
+def count_values(values, strings):
+    """Counts the values of an attribute column and maps them to their strings.
+    :param values: numpy array of attribute ids
+    :param strings: spacy.strings.StringStore
+    :return: Counter with strings as keys """
+    unique_values, counts = np.unique(values, return_counts=True)
+    return Counter({strings[int(value)]: int(count) for value, count in zip(unique_values, counts)})
+
+
+def mask_values(values, string, strings):
+    """Returns a boolean mask for all values of an attribute column which are
+    mapped to the string. Compares the strings, because labels can be stored
+    as symbol ids or as hashes.
+    :param values: numpy array of attribute ids
+    :param string: str or a collection of strings (any of them)
+    :param strings: spacy.strings.StringStore
+    :return: numpy array of bools """
+    labels = {string} if isinstance(string, str) else set(string)
+    matching_values = [value for value in np.unique(values) if strings[int(value)] in labels]
+    return np.isin(values, matching_values)
+
+
+def count_doc_statistics_from_array(doc):
+    """Counts the same statistics as count_doc_statistics, but from one array
+    of token attributes (Doc.to_array) with numpy reductions. Only the strings
+    and morphological analyses of the distinct values are looked up.
+    :param doc: spacy.tokens.doc.Doc
+    :return: dict """
+    from spacy.tokens import MorphAnalysis
+
+    strings = doc.vocab.strings
+    array = doc.to_array(ARRAY_ATTRIBUTES)
+    orth, pos, tag, dep, morph, length, is_punct, is_alpha, sent_start = array.T
+    is_word = is_punct == 0
+    # sent_start is 1 for the start of a sentence, the first token always starts one
+    number_of_sentences = int(np.count_nonzero(sent_start[1:] == 1)) + (1 if len(array) else 0)
+
+    root_pos_counts = count_values(pos[mask_values(dep, "ROOT", strings)], strings)
+    # see get_average_count_of_definite_articles_per_sentence
+    articles_counts = count_values(orth[mask_values(tag, "ART", strings)], strings)
+    number_of_definite_articles = sum(count for text, count in articles_counts.items()
+                                      if text.startswith(("d", "D")))
+    morph_values, morph_counts = np.unique(morph, return_counts=True)
+    number_of_verb_forms = sum(count_verb_forms(MorphAnalysis.from_id(doc.vocab, int(value))) * int(count)
+                               for value, count in zip(morph_values, morph_counts) if value)
+
+    return {
+        "tokens": len(array),
+        "words": int(np.count_nonzero(is_word)),
+        "sentences": number_of_sentences,
+        "characters": int(length[is_word].sum()),
+        "non_alpha": int(np.count_nonzero(is_alpha == 0)),
+        "definite_articles": number_of_definite_articles,
+        "commas": doc.text.count(","),
+        "verb_forms": number_of_verb_forms,
+        "pos_counts": count_values(pos, strings),
+        "tag_counts": count_values(tag, strings),
+        "root_pos_counts": root_pos_counts,
+        "orth_counts": count_values(orth, strings)
+    }
+
+
+STATISTICS_BACKENDS = {
+    "python": count_doc_statistics,
+    "array": count_doc_statistics_from_array
+}
+
+
+def get_doc_statistics(doc, backend="python"):
+    """Returns the token statistics of the doc. They are counted on the first
+    call with the given backend and stored in doc.user_data, so all features
+    share one pass.
+    :param doc: spacy.tokens.doc.Doc
+    :param backend: "python" or "array", see STATISTICS_BACKENDS
+    :return: dict """
+    if DOC_STATISTICS not in doc.user_data:
+        doc.user_data[DOC_STATISTICS] = STATISTICS_BACKENDS[backend](doc)
+    return doc.user_data[DOC_STATISTICS]
+
+
+def collect_lemmas(doc):
+    """Collects the lemmas of the doc in one pass over the tokens:
+    "words": the lemmas without punctuation and spaces (type-token-ratio),
+    "lowered_words": the lowered lemmas without punctuation (lexical complexity score),
+    "nouns", "verbs", "adjectives": the lemmas of the nouns, verbs and
+    adjectives (ADJA, ADJD) for the semantic similarity features.
+    :param doc: spacy.tokens.doc.Doc
+    :return: dict of lists of strings """
+    lemmas = {"words": [], "lowered_words": [], "nouns": [], "verbs": [], "adjectives": []}
+    for tok in doc:
+        lemma = tok.lemma_
+        pos = tok.pos_
+        if not tok.is_punct:
+            lemmas["lowered_words"].append(lemma.lower())
+            if not tok.is_space:
+                lemmas["words"].append(lemma)
+        if pos == "NOUN":
+            lemmas["nouns"].append(lemma)
+        elif pos == "VERB":
+            lemmas["verbs"].append(lemma)
+        if tok.tag_ in ("ADJD", "ADJA"):
+            lemmas["adjectives"].append(lemma)
+    return lemmas
+
+
+def get_lemmas(doc):
+    """Returns the lemmas of the doc, see collect_lemmas. They are collected on
+    the first call and stored in doc.user_data, so the lexical and the semantic
+    similarity features share one pass.
+    :param doc: spacy.tokens.doc.Doc
+    :return: dict of lists of strings """
+    if LEMMAS not in doc.user_data:
+        doc.user_data[LEMMAS] = collect_lemmas(doc)
+    return doc.user_data[LEMMAS]
+
+
+def demo():
+    import spacy
+    nlp = spacy.load("de_core_news_sm")
+    text = "Das ist meine tolle Banane. " \
+           "Die Banane ist reif. " \
+           "Sie existiert, um gegessen zu werden. "
+    doc = nlp(text)
+
+    print(text)
+    print(count_doc_statistics(doc))
+    print(count_doc_statistics_from_array(doc))
+    print(collect_lemmas(doc))
+
+
+if __name__ == "__main__":
+    demo()
@@ -3,11 +3,14 @@
 # type-token-ratio
 # lexical-complexity-score
 # You can run a demo with: $ python lexical_features.py
-import spacy
+import os
+import hashlib
 import numpy as np
 
-from constants import TOKEN_FREQ
+from pathlib import Path
+from constants import TOKEN_FREQ, TOKEN_LOG_RANK_KEYS, TOKEN_LOG_RANKS, TOKEN_LOG_RANK_HASH
 from utils_and_preprocess.utils import safe_division, get_data_from_json_file
+from features.doc_statistics import get_lemmas
 
 
 def calculate_ttr(doc):
@@ -27,12 +30,126 @@ def calculate_ttr(doc):
 
     :param doc: spacy.tokens.doc.Doc
     :return: float """
-    lemmatized_words = [tok.lemma_ for tok in doc if not tok.is_punct and not tok.is_space]
+    # the lemmas without punctuation and spaces, see features.doc_statistics.get_lemmas
+    lemmatized_words = get_lemmas(doc)["words"]
     unique_words = set(lemmatized_words)
     return safe_division(len(unique_words), len(lemmatized_words))
 
 
-def calculate_lexical_complexity_score(doc, tokens_freq):
+def create_log_rank_table(tokens_freq):
+    """Creates a table which maps each token of the frequency table directly
+    to its log-rank. The rank of a token is the position of the first token
+    in the frequency table with the same frequency. The tokens are stored
+    sorted as utf-8 bytes of a fixed width in a numpy array, so that they can
+    be looked up with a binary search (see get_log_ranks) and the table can be
+    saved as .npy files and memory-mapped, see load_log_rank_table.
+    Ex.:
+        tokens_freq = {"der": 3, "banane": 2, "sein": 3, "reif": 1}
+        ranks = {"der": 1, "banane": 2, "sein": 1, "reif": 4}
+        log_rank_table = {"keys": array([b'banane', b'der', b'reif', b'sein']),
+                          "log_ranks": array([0.69314718, 0.0, 1.38629436, 0.0])}
+    :param tokens_freq: frequency table (dict: token as keys and freqs as values)
+    :return: dict with the sorted tokens ("keys") and their log-ranks ("log_ranks") """
+    log_ranks = np.log(np.arange(1, len(tokens_freq) + 1))
+    first_index_of_freq = dict()
+    token_log_ranks = np.empty(len(tokens_freq))
+    for index, freq in enumerate(tokens_freq.values()):
+        token_log_ranks[index] = log_ranks[first_index_of_freq.setdefault(freq, index)]
+
+    keys = np.array([token.encode("utf-8") for token in tokens_freq])
+    order = np.argsort(keys, kind="stable")
+    return {"keys": keys[order], "log_ranks": token_log_ranks[order]}
+
+
+def save_log_rank_table(log_rank_table, keys_path, log_ranks_path):
+    """Saves the log-rank table as two .npy files.
+    :param log_rank_table: dict, see create_log_rank_table
+    :param keys_path: str
+    :param log_ranks_path: str
+    """
+    np.save(keys_path, log_rank_table["keys"])
+    np.save(log_ranks_path, log_rank_table["log_ranks"])
+
+
+def hash_token_freq_file(token_freq_path):
+    """Returns the sha256 hash of the json frequency table.
+    :param token_freq_path: str
+    :return: str """
+    return hashlib.sha256(Path(token_freq_path).read_bytes()).hexdigest()
+
+
+def is_log_rank_table_stale(keys_path, log_ranks_path, hash_path, token_freq_hash):
+    """Checks if the .npy files of the log-rank table are missing or were
+    generated from another json frequency table than the current one, whose hash
+    is recorded in the file next to them (hash_path).
+    :param keys_path: str
+    :param log_ranks_path: str
+    :param hash_path: str, path of the recorded hash of the json frequency table
+    :param token_freq_hash: str, hash of the current json frequency table, see hash_token_freq_file
+    :return: bool """
+    if not all(os.path.exists(path) for path in (keys_path, log_ranks_path, hash_path)):
+        return True
+    return Path(hash_path).read_text(encoding="utf-8").strip() != token_freq_hash
+
+
+def generate_log_rank_table(token_freq_path, keys_path, log_ranks_path, hash_path):
+    """Creates the log-rank table from the json frequency table and saves it as
+    .npy files with the hash of the json frequency table next to them. Each file
+    is written to a temporary file first and renamed, so that concurrent readers
+    never see a partial file, the hash is written last.
+    :param token_freq_path: str, path of the json frequency table
+    :param keys_path: str
+    :param log_ranks_path: str
+    :param hash_path: str
+    :return: dict, see create_log_rank_table """
+    token_freq_hash = hash_token_freq_file(token_freq_path)
+    log_rank_table = create_log_rank_table(get_data_from_json_file(token_freq_path))
+    suffix = f".{os.getpid()}.tmp"
+    save_log_rank_table(log_rank_table, keys_path + suffix + ".npy", log_ranks_path + suffix + ".npy")
+    Path(hash_path + suffix).write_text(token_freq_hash, encoding="utf-8")
+    os.replace(keys_path + suffix + ".npy", keys_path)
+    os.replace(log_ranks_path + suffix + ".npy", log_ranks_path)
+    os.replace(hash_path + suffix, hash_path)
+    return log_rank_table
+
+
+def load_log_rank_table(keys_path, log_ranks_path, hash_path, token_freq_path):
+    """Loads the log-rank table from its .npy files (see save_log_rank_table)
+    as memory-mapped arrays, so that processes share the pages of the table. The
+    .npy files are not part of the repository: if they are missing or the hash
+    of the json frequency table differs from the recorded one, they are
+    generated from it (see generate_log_rank_table). If they can not be
+    written, the table is created in memory.
+    :param keys_path: str
+    :param log_ranks_path: str
+    :param hash_path: str, path of the recorded hash of the json frequency table
+    :param token_freq_path: str, path of the json frequency table
+    :return: dict, see create_log_rank_table """
+    if is_log_rank_table_stale(keys_path, log_ranks_path, hash_path, hash_token_freq_file(token_freq_path)):
+        try:
+            generate_log_rank_table(token_freq_path, keys_path, log_ranks_path, hash_path)
+        except OSError:
+            return create_log_rank_table(get_data_from_json_file(token_freq_path))
+    return {"keys": np.load(keys_path, mmap_mode="r"), "log_ranks": np.load(log_ranks_path, mmap_mode="r")}
+
+
+def get_log_ranks(tokens, log_rank_table):
+    """Looks up the log-ranks of all distinct tokens which are in the table with
+    a binary search over the sorted keys. Tokens longer than the keys can not
+    be in the table.
+    :param tokens: iterable of strings
+    :param log_rank_table: dict, see create_log_rank_table
+    :return: numpy array of floats """
+    keys = log_rank_table["keys"]
+    queries = [token.encode("utf-8") for token in dict.fromkeys(tokens)]
+    queries = np.array([query for query in queries if len(query) <= keys.itemsize], dtype=keys.dtype)
+    if not len(queries) or not len(keys):
+        return np.empty(0)
+    positions = np.minimum(np.searchsorted(keys, queries), len(keys) - 1)
+    return log_rank_table["log_ranks"][positions[keys[positions] == queries]]
+
+
+def calculate_lexical_complexity_score(doc, log_rank_table):
     """Computes the lexical complexity with lemmatized lowered words as
     proposed from Alva-Manchego et al. (2019):
         ### "The lexical complexity score of a simplified sentence is
@@ -48,28 +165,18 @@ def calculate_lexical_complexity_score(doc, tokens_freq):
                 }
         text = "Die Bananen sind reif."
         tokens = ['der', 'banane', 'sein', 'reif']
-        tokens_freq_sentence = {'der': 3, 'banane': 2, 'sein': 3, 'reif': 1}
+        log_rank_table = create_log_rank_table(mock_tokens_freq)
         log_ranks_sentence = [0.0, 0.6931471805599453, 0.0, 1.3862943611198906]
         third_quartile = 0.8664339756999316
     :param doc: spacy.tokens.doc.Doc
-    :param tokens_freq: frequency table (dict: token as keys and freqs as values)
+    :param log_rank_table: log-rank table, see create_log_rank_table
     :return: float """
 
-    # tokenize and lemmatize the doc ignoring punctuation
-    tokens = [tok.lemma_.lower() for tok in doc if not tok.is_punct]
-
-    # create a frequency table for the tokens in the doc
-    tokens_freq_sentence = {}
-    for token in tokens:
-        if token in tokens_freq:
-            tokens_freq_sentence[token] = tokens_freq[token]
+    # the lowered lemmas of the doc ignoring punctuation, see features.doc_statistics.get_lemmas
+    tokens = get_lemmas(doc)["lowered_words"]
 
-    # calculate the log-ranks of each word in the frequency table
-    log_ranks = np.log(np.arange(1, len(tokens_freq) + 1))
-    log_ranks_sentence = []
-    for token, freq in tokens_freq_sentence.items():
-        rank = list(tokens_freq.values()).index(freq) + 1
-        log_ranks_sentence.append(log_ranks[rank - 1])
+    # look up the log-ranks of each word in the frequency table
+    log_ranks_sentence = get_log_ranks(tokens, log_rank_table)
 
     # calculate the third quartile of the log-ranks
     third_quartile = np.percentile(log_ranks_sentence, 75)
@@ -78,14 +185,16 @@ def calculate_lexical_complexity_score(doc, tokens_freq):
 
 
 def demo():
+    import spacy
     nlp = spacy.load("de_core_news_sm")
     text = "Die Bananen sind reif. Ich esse gerne eine Banane, weil sie so schön " \
            "gelb ist. Manchmal esse ich auch Gurken, obwohl sie nicht gelb sind."
     doc = nlp(text)
     ttr = calculate_ttr(doc)
-    token_freq = get_data_from_json_file("../" + TOKEN_FREQ)
+    log_rank_table = load_log_rank_table("../" + TOKEN_LOG_RANK_KEYS, "../" + TOKEN_LOG_RANKS,
+                                         "../" + TOKEN_LOG_RANK_HASH, "../" + TOKEN_FREQ)
     print("Type-Token-Ratio:", ttr)
-    print("Lexical-Complexity-Score:", calculate_lexical_complexity_score(doc, token_freq))
+    print("Lexical-Complexity-Score:", calculate_lexical_complexity_score(doc, log_rank_table))
 
 
 if __name__ == "__main__":
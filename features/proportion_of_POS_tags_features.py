@@ -1,9 +1,10 @@
 # Functions to get the proportion of POS tags per text.
 # POS tag counts are normalized by dividing them by the number of tokens per text.
 # Number of tokens is defined without punctuations.
+# All counts are taken from the doc statistics, see features.doc_statistics.
 # You can run a demo with: $ python proportion_of_POS_tags_features.py
-import spacy
 from utils_and_preprocess.utils import safe_division
+from features.doc_statistics import get_doc_statistics
 
 
 def get_POS_tag_proportion_for_verbs(doc):
@@ -11,93 +12,87 @@ def get_POS_tag_proportion_for_verbs(doc):
     and aux verbs no matter if its conjugates or in infinitive.
     :param doc: spacy.tokens.doc.Doc
     :return: float """
-    verb_pos_tags = sum([1 for tok in doc if tok.pos_ in ["VERB", "AUX"]])
-    num_of_token_in_doc = sum([1 for tok in doc if not tok.is_punct])
-    return safe_division(verb_pos_tags, num_of_token_in_doc)
+    doc_stats = get_doc_statistics(doc)
+    verb_pos_tags = doc_stats["pos_counts"]["VERB"] + doc_stats["pos_counts"]["AUX"]
+    return safe_division(verb_pos_tags, doc_stats["words"])
 
 
 def get_POS_tag_proportion_for_aux_verbs(doc):
     """Returns the proportion of verbs in the text.
     :param doc: spacy.tokens.doc.Doc
     :return: float """
-    verb_pos_tags = sum([1 for tok in doc if tok.pos_ == "AUX"])
-    num_of_token_in_doc = sum([1 for tok in doc if not tok.is_punct])
-    return safe_division(verb_pos_tags, num_of_token_in_doc)
+    doc_stats = get_doc_statistics(doc)
+    return safe_division(doc_stats["pos_counts"]["AUX"], doc_stats["words"])
 
 
 def get_POS_tag_proportion_for_nouns(doc):
     """Returns the proportion of nouns in the text.
     :param doc: spacy.tokens.doc.Doc
     :return: float """
-    noun_pos_tags = sum([1 for tok in doc if tok.pos_ == "NOUN"])
-    num_of_token_in_doc = sum([1 for tok in doc if not tok.is_punct])
-    return safe_division(noun_pos_tags, num_of_token_in_doc)
+    doc_stats = get_doc_statistics(doc)
+    return safe_division(doc_stats["pos_counts"]["NOUN"], doc_stats["words"])
 
 
 def get_POS_tag_proportion_for_adjectives(doc):
     """Returns the proportion of adjectives and adverbs in the text.
     :param doc: spacy.tokens.doc.Doc
     :return: float """
-    adj_pos_tags = sum([1 for tok in doc if tok.tag_ in ["ADJD", "ADJA"]])
-    num_of_token_in_doc = sum([1 for tok in doc if not tok.is_punct])
-    return safe_division(adj_pos_tags, num_of_token_in_doc)
+    doc_stats = get_doc_statistics(doc)
+    adj_pos_tags = doc_stats["tag_counts"]["ADJD"] + doc_stats["tag_counts"]["ADJA"]
+    return safe_division(adj_pos_tags, doc_stats["words"])
 
 
 def get_POS_tag_proportion_for_punctuations(doc):
     """Returns the proportion of punctuations in the text.
     :param doc: spacy.tokens.doc.Doc
     :return: float """
-    punctuations_pos_tags = sum([1 for tok in doc if tok.pos_ == "PUNCT"])
-    num_of_token_in_doc = len(doc)
-    return safe_division(punctuations_pos_tags, num_of_token_in_doc)
+    doc_stats = get_doc_statistics(doc)
+    return safe_division(doc_stats["pos_counts"]["PUNCT"], doc_stats["tokens"])
 
 
 def get_POS_tag_proportion_for_determiners(doc):
     """Returns the proportion of determiners in the text.
     :param doc: spacy.tokens.doc.Doc
     :return: float """
-    det_pos_tags = sum([1 for tok in doc if tok.pos_ == "DET"])
-    num_of_token_in_doc = sum([1 for tok in doc if not tok.is_punct])
-    return safe_division(det_pos_tags, num_of_token_in_doc)
+    doc_stats = get_doc_statistics(doc)
+    return safe_division(doc_stats["pos_counts"]["DET"], doc_stats["words"])
 
 
 def get_POS_tag_proportion_for_pronouns(doc):
     """Returns the proportion of pronouns in the text.
     :param doc: spacy.tokens.doc.Doc
     :return: float """
-    pron_pos_tags = sum([1 for tok in doc if tok.pos_ == "PRON"])
-    num_of_token_in_doc = sum([1 for tok in doc if not tok.is_punct])
-    return safe_division(pron_pos_tags, num_of_token_in_doc)
+    doc_stats = get_doc_statistics(doc)
+    return safe_division(doc_stats["pos_counts"]["PRON"], doc_stats["words"])
 
 
 def get_POS_tag_proportion_for_conjunctions(doc):
     """Returns the proportion of subordinating and coordinating conjunction.
     :param doc: spacy.tokens.doc.Doc
     :return: float """
-    junc_pos_tags = sum([1 for tok in doc if tok.pos_ in ["SCONJ", "CCONJ"]])
-    num_of_token_in_doc = sum([1 for tok in doc if not tok.is_punct])
-    return safe_division(junc_pos_tags, num_of_token_in_doc)
+    doc_stats = get_doc_statistics(doc)
+    junc_pos_tags = doc_stats["pos_counts"]["SCONJ"] + doc_stats["pos_counts"]["CCONJ"]
+    return safe_division(junc_pos_tags, doc_stats["words"])
 
 
 def get_POS_tag_proportion_for_numerales(doc):
     """Returns the proportion of numerales or other not alphabetic token.
     :param doc: spacy.tokens.doc.Doc
     :return: float """
-    num_pos_tags = sum([1 for tok in doc if not tok.is_alpha])
-    num_of_token_in_doc = sum([1 for tok in doc if not tok.is_punct])
-    return safe_division(num_pos_tags, num_of_token_in_doc)
+    doc_stats = get_doc_statistics(doc)
+    return safe_division(doc_stats["non_alpha"], doc_stats["words"])
 
 
 def get_POS_tag_proportion_for_adpositions(doc):
     """Returns the proportion of adpositions in the text.
     :param doc: spacy.tokens.doc.Doc
     :return: float """
-    adp_pos_tags = sum([1 for tok in doc if tok.pos_ == "ADP"])
-    num_of_token_in_doc = sum([1 for tok in doc if not tok.is_punct])
-    return safe_division(adp_pos_tags, num_of_token_in_doc)
+    doc_stats = get_doc_statistics(doc)
+    return safe_division(doc_stats["pos_counts"]["ADP"], doc_stats["words"])
 
 
 def demo():
+    import spacy
     nlp = spacy.load("de_core_news_md")
 
     text = "Das ist meine tolle Banane, mit der man gut backen kann. " \
@@ -0,0 +1,287 @@
+# A registry of the text complexity features. Every feature declares its name,
+# its column(s) in the output (constants.FEATURE_GROUPS), its group, the function
+# which calculates it and the artifacts it needs. Artifacts are the intermediate
+# results which are shared by several features and computed once per document:
+# the token statistics (counts of the POS tags, words, sentences etc., see
+# features.doc_statistics), the lemmas, the depths of the tokens in the parse
+# tree and the matched discourse markers. Each artifact is stored in doc.user_data
+# by its function, so the features find it there.
+# A plan (see plan_features) lists the features of the requested columns and the
+# artifacts they need. evaluate_plan computes the artifacts first and then only
+# the planned features.
+# The arguments of the functions are passed by their parameter names, see
+# get_feature_arguments.
+# The feature modules are imported with the registry, so that it is checked
+# on import. They only need numpy and features.doc_statistics, third-party
+# libraries which are only needed by some features are imported in the functions
+# which need them (e.g. pyphen in features.surface_features).
+# You can run a demo with: $ python registry.py
+import time
+from inspect import signature
+from functools import lru_cache
+
+from constants import FEATURE_GROUPS, DISCOURSE_MARKER_SENSE_FEATURES
+from utils_and_preprocess.profiler import record_time, record_document
+from features.doc_statistics import get_doc_statistics, get_lemmas, DOC_STATISTICS, LEMMAS
+from features.surface_features import get_average_sentence_length_in_token, \
+    get_average_characters_per_word, get_average_syllables_per_word, get_text_length_in_token
+from features.syntactic_features import get_average_number_of_noun_phrases_per_sentence, \
+    get_average_heights, get_average_number_of_subordinate_clauses_per_sentence, \
+    get_average_count_of_sentences_with_verb_as_root, get_average_count_of_sentences_with_nouns_as_root, \
+    get_token_depths, TOKEN_DEPTHS
+from features.proportion_of_POS_tags_features import get_POS_tag_proportion_for_verbs, \
+    get_POS_tag_proportion_for_aux_verbs, get_POS_tag_proportion_for_nouns, \
+    get_POS_tag_proportion_for_adjectives, get_POS_tag_proportion_for_punctuations, \
+    get_POS_tag_proportion_for_determiners, get_POS_tag_proportion_for_pronouns, \
+    get_POS_tag_proportion_for_conjunctions, get_POS_tag_proportion_for_numerales, \
+    get_POS_tag_proportion_for_adpositions
+from features.lexical_features import calculate_ttr, calculate_lexical_complexity_score
+from features.verb_tense_feature import get_average_number_of_verbs_in_sentence
+from features.semantic_similarity_features import get_average_semantic_similarity_of_all_nouns, \
+    get_average_semantic_similarity_of_all_verbs, get_average_semantic_similarity_of_all_adjectives
+from features.discourse_features import get_average_count_of_pronouns_per_sentence, \
+    get_average_count_of_definite_articles_per_sentence, get_average_count_of_discourse_markers_per_sentence, \
+    get_count_for_discourse_marker_senses, get_discourse_markers, DISCOURSE_MARKER_MATCHES
+
+
+def register_artifact(function, key):
+    """Creates the entry of an artifact.
+    :param function: function which computes the artifact and stores it in doc.user_data
+    :param key: the key of the artifact in doc.user_data
+    :return: dict """
+    return {"function": function, "parameters": list(signature(function).parameters), "key": key}
+
+
+# The artifacts in the order in which they are computed.
+ARTIFACTS = {
+    "doc_statistics": register_artifact(get_doc_statistics, DOC_STATISTICS),
+    "lemmas": register_artifact(get_lemmas, LEMMAS),
+    "depths": register_artifact(get_token_depths, TOKEN_DEPTHS),
+    "discourse_marker_matches": register_artifact(get_discourse_markers, DISCOURSE_MARKER_MATCHES)
+}
+
+
+def register_feature(name, group, function, artifacts=(), columns=None):
+    """Creates the entry of a feature in the registry.
+    :param name: str, the name of the feature
+    :param group: str, the feature group (see constants.FEATURE_GROUPS)
+    :param function: function which calculates the feature (a number or a
+        vector with one value per column)
+    :param artifacts: tuple of the names of the artifacts the feature needs, see ARTIFACTS
+    :param columns: list of the columns of a vector feature or None (the column is the name)
+    :return: dict """
+    return {
+        "name": name,
+        "group": group,
+        "function": function,
+        "parameters": list(signature(function).parameters),
+        "artifacts": tuple(artifacts),
+        "columns": [name] if columns is None else list(columns),
+        "vector": columns is not None
+    }
+
+
+# The features in the order of their columns (constants.FEATURE_GROUPS).
+FEATURE_REGISTRY = [
+    # surface features
+    register_feature("sentence_length", "surface", get_average_sentence_length_in_token, ["doc_statistics"]),
+    register_feature("characters_per_word", "surface", get_average_characters_per_word, ["doc_statistics"]),
+    register_feature("syllables_per_word", "surface", get_average_syllables_per_word, ["doc_statistics"]),
+    register_feature("text_length", "surface", get_text_length_in_token, ["doc_statistics"]),
+    # syntactic features
+    register_feature("noun_phrases_per_sent", "syntactic", get_average_number_of_noun_phrases_per_sentence,
+                     ["doc_statistics"]),
+    register_feature("tree_height", "syntactic", get_average_heights, ["depths"]),
+    register_feature("sub_clauses_per_sent", "syntactic", get_average_number_of_subordinate_clauses_per_sentence,
+                     ["doc_statistics"]),
+    register_feature("sents_with_verb_as_root", "syntactic", get_average_count_of_sentences_with_verb_as_root,
+                     ["doc_statistics"]),
+    register_feature("sents_with_nouns_as_root", "syntactic", get_average_count_of_sentences_with_nouns_as_root,
+                     ["doc_statistics"]),
+    # POS tag features
+    register_feature("POS_verbs", "pos_tags", get_POS_tag_proportion_for_verbs, ["doc_statistics"]),
+    register_feature("POS_aux_verbs", "pos_tags", get_POS_tag_proportion_for_aux_verbs, ["doc_statistics"]),
+    register_feature("POS_nouns", "pos_tags", get_POS_tag_proportion_for_nouns, ["doc_statistics"]),
+    register_feature("POS_adjectives", "pos_tags", get_POS_tag_proportion_for_adjectives, ["doc_statistics"]),
+    register_feature("POS_punctuations", "pos_tags", get_POS_tag_proportion_for_punctuations, ["doc_statistics"]),
+    register_feature("POS_determiners", "pos_tags", get_POS_tag_proportion_for_determiners, ["doc_statistics"]),
+    register_feature("POS_pronouns", "pos_tags", get_POS_tag_proportion_for_pronouns, ["doc_statistics"]),
+    register_feature("POS_conjunctions", "pos_tags", get_POS_tag_proportion_for_conjunctions, ["doc_statistics"]),
+    register_feature("POS_numerales", "pos_tags", get_POS_tag_proportion_for_numerales, ["doc_statistics"]),
+    register_feature("POS_adpositions", "pos_tags", get_POS_tag_proportion_for_adpositions, ["doc_statistics"]),
+    # lexical features
+    register_feature("ttr", "lexical", calculate_ttr, ["lemmas"]),
+    register_feature("lexical_complexity_score", "lexical", calculate_lexical_complexity_score, ["lemmas"]),
+    # verb tense features
+    register_feature("verbs_in_sentence", "verb_tense", get_average_number_of_verbs_in_sentence,
+                     ["doc_statistics"]),
+    # semantic similarity features
+    register_feature("semantic_similarity_nouns", "semantic_similarity",
+                     get_average_semantic_similarity_of_all_nouns, ["lemmas"]),
+    register_feature("semantic_similarity_verbs", "semantic_similarity",
+                     get_average_semantic_similarity_of_all_verbs, ["lemmas"]),
+    register_feature("semantic_similarity_adjectives", "semantic_similarity",
+                     get_average_semantic_similarity_of_all_adjectives, ["lemmas"]),
+    # discourse features
+    register_feature("pronouns_per_sentence", "discourse", get_average_count_of_pronouns_per_sentence,
+                     ["doc_statistics"]),
+    register_feature("articles_per_sentence", "discourse", get_average_count_of_definite_articles_per_sentence,
+                     ["doc_statistics"]),
+    register_feature("count_of_discourse_markers", "discourse", get_average_count_of_discourse_markers_per_sentence,
+                     ["doc_statistics", "discourse_marker_matches"]),
+    # discourse marker senses, a vector with one column per sense
+    register_feature("discourse_marker_senses", "discourse_marker_senses", get_count_for_discourse_marker_senses,
+                     ["discourse_marker_matches"], DISCOURSE_MARKER_SENSE_FEATURES)
+]
+
+
+def check_feature_registry(registry=FEATURE_REGISTRY, feature_groups=FEATURE_GROUPS):
+    """Checks that the columns of the features of each group in the registry
+    are the features of the group in constants.FEATURE_GROUPS in the same order.
+    :param registry: list of dicts, see register_feature
+    :param feature_groups: dict with the groups as keys and lists of features as values
+    """
+    for group, group_features in feature_groups.items():
+        columns = [column for feature in registry if feature["group"] == group for column in feature["columns"]]
+        if columns != group_features:
+            raise ValueError(f"The columns of the feature group {group} in the registry {columns} "
+                             f"are not the features of the group in constants.FEATURE_GROUPS {group_features}.")
+    for feature in registry:
+        if feature["group"] not in feature_groups:
+            raise ValueError(f"The group {feature['group']} of the feature {feature['name']} is unknown.")
+
+
+check_feature_registry()
+
+
+@lru_cache(maxsize=None)
+def plan_features(columns):
+    """Plans the calculation of the columns: the features of the registry which
+    calculate them and the artifacts these features need, both in the order of
+    their computation. The columns are calculated in the order of the registry.
+    A vector feature can be planned with a part of its columns, the indices of
+    these columns are its selection (None for all columns). The plan is cached,
+    so it must not be changed.
+    :param columns: tuple of column names (see constants.FEATURES)
+    :return: dict """
+    registered_columns = {column for feature in FEATURE_REGISTRY for column in feature["columns"]}
+    unknown_columns = [column for column in columns if column not in registered_columns]
+    if unknown_columns:
+        raise ValueError(f"The features {unknown_columns} are not in the feature registry.")
+    features = []
+    selections = []
+    for feature in FEATURE_REGISTRY:
+        selection = [index for index, column in enumerate(feature["columns"]) if column in columns]
+        if selection:
+            features.append(feature)
+            selections.append(None if len(selection) == len(feature["columns"]) else selection)
+    needed_artifacts = {artifact for feature in features for artifact in feature["artifacts"]}
+    return {
+        "columns": [column for feature in features for column in feature["columns"] if column in columns],
+        "features": features,
+        "selections": selections,
+        "artifacts": [artifact for artifact in ARTIFACTS if artifact in needed_artifacts]
+    }
+
+
+def get_feature_arguments(doc, nlp, log_rank_table, discourse_marker, backend="python", similarity=None):
+    """Returns the arguments of the features and the artifacts by their parameter names.
+    :param doc: spacy.tokens.doc.Doc
+    :param nlp: spacy model
+    :param log_rank_table: log-rank table of the token frequencies
+    :param discourse_marker: dict of discourse markers and senses or None
+    :param backend: "python" or "array", the backend for the token statistics
+    :param similarity: dict or None, the options of the semantic similarity, see
+        features.semantic_similarity_features.create_similarity_options
+    :return: dict """
+    arguments = {"doc": doc, "nlp": nlp, "log_rank_table": log_rank_table, "backend": backend,
+                 "similarity": similarity}
+    if discourse_marker is not None:
+        arguments["discourse_marker_matcher"] = discourse_marker["matcher"]
+        arguments["sense_index"] = discourse_marker["sense_index"]
+    return arguments
+
+
+def compute_artifact(artifact, arguments):
+    """Computes an artifact and stores it in doc.user_data, an artifact which is
+    already stored is not computed again.
+    :param artifact: str, see ARTIFACTS
+    :param arguments: dict, see get_feature_arguments
+    """
+    entry = ARTIFACTS[artifact]
+    entry["function"](*[arguments[name] for name in entry["parameters"]])
+
+
+def compute_feature(feature, arguments, selection=None):
+    """Calculates a feature of the registry.
+    :param feature: dict, see register_feature
+    :param arguments: dict, see get_feature_arguments
+    :param selection: list of the indices of the columns of a vector feature or None (all columns)
+    :return: list of the values of the columns of the feature """
+    value = feature["function"](*[arguments[name] for name in feature["parameters"]])
+    if not feature["vector"]:
+        return [value]
+    if selection is None:
+        return list(value)
+    return [value[index] for index in selection]
+
+
+def evaluate_plan(plan, arguments):
+    """Computes the artifacts and then the features of the plan.
+    :param plan: dict, see plan_features
+    :param arguments: dict, see get_feature_arguments
+    :return: list of the values of the planned columns """
+    for artifact in plan["artifacts"]:
+        compute_artifact(artifact, arguments)
+    result = []
+    for feature, selection in zip(plan["features"], plan["selections"]):
+        result.extend(compute_feature(feature, arguments, selection))
+    return result
+
+
+def evaluate_plan_with_profiler(plan, arguments, profiler, name=None):
+    """Computes the artifacts and the features of the plan like evaluate_plan
+    and records the wall time of each artifact ("artifact.<name>"), each feature
+    group and each feature ("<group>.<function>") and the document in the
+    profiler (see utils_and_preprocess.profiler).
+    :param plan: dict, see plan_features
+    :param arguments: dict, see get_feature_arguments
+    :param profiler: dict, see utils_and_preprocess.profiler.create_profiler
+    :param name: the name of the document in the report of the profiler
+    :return: list of the values of the planned columns """
+    doc_start = time.perf_counter()
+    for artifact in plan["artifacts"]:
+        start = time.perf_counter()
+        compute_artifact(artifact, arguments)
+        record_time(profiler, f"artifact.{artifact}", time.perf_counter() - start)
+    group_seconds = dict()
+    result = []
+    for feature, selection in zip(plan["features"], plan["selections"]):
+        start = time.perf_counter()
+        result.extend(compute_feature(feature, arguments, selection))
+        seconds = time.perf_counter() - start
+        record_time(profiler, f"{feature['group']}.{feature['function'].__name__}", seconds)
+        group_seconds[feature["group"]] = group_seconds.get(feature["group"], 0.0) + seconds
+    for group, seconds in group_seconds.items():
+        record_time(profiler, group, seconds)
+    doc = arguments["doc"]
+    record_document(profiler, name, len(doc), len(doc.text), time.perf_counter() - doc_start, group_seconds)
+    return result
+
+
+def demo():
+    import spacy
+    nlp = spacy.load("de_core_news_sm")
+    text = "Das ist meine tolle Banane. " \
+           "Die Banane ist reif. " \
+           "Sie existiert, um gegessen zu werden. "
+    doc = nlp(text)
+
+    plan = plan_features(("sentence_length", "ttr", "POS_nouns"))
+    print("Features:", [feature["name"] for feature in plan["features"]])
+    print("Artifacts:", plan["artifacts"])
+    print(dict(zip(plan["columns"], evaluate_plan(plan, get_feature_arguments(doc, nlp, None, None)))))
+
+
+if __name__ == "__main__":
+    demo()
@@ -3,10 +3,44 @@
 # average semantic similarity of all nouns
 # average semantic similarity of all verbs
 # average semantic similarity of all adjectives
+# The normalized vectors of the lemmas are cached per process in one contiguous
+# float32 matrix with an index of the rows of the lemmas and a flag per row if
+# the lemma has a vector (see get_lemma_rows). The cache is shared by all
+# documents and the nouns, verbs and adjectives, so the vector of a lemma is
+# only looked up and normalized once.
+# The average over all pairs is quadratic in the number of lemmas. For long
+# texts (e.g. book chapters with thousands of nouns) there are two opt-in modes
+# (see SIMILARITY_MODES and create_similarity_options): "linear" computes the
+# same average from the sum of the normalized vectors in linear time, "sampled"
+# estimates it from a sample of pairs with a confidence interval, which is
+# stored in doc.user_data (see SEMANTIC_SIMILARITY_ESTIMATES) and written as
+# extra columns of the output (see get_similarity_intervals).
 # You can run a demo with: $ python semantic_similarity_features.py
-import spacy
 import itertools
+import numpy as np
+from functools import lru_cache
 from utils_and_preprocess.utils import safe_division
+from features.doc_statistics import get_lemmas
+
+# number of lemmas whose vectors are cached per process, the cache is cleared
+# when it is full (about 1.2 KB per lemma with 300-dimensional vectors)
+LEMMA_VECTOR_CACHE_SIZE = 100000
+# number of rows allocated for the cache at first, the matrix is doubled when it is full
+LEMMA_VECTOR_CACHE_ROWS = 1024
+
+# the modes of the average semantic similarity: all pairs, the sum of the
+# vectors (linear time) or a sample of the pairs
+SIMILARITY_MODES = ("exact", "linear", "sampled")
+# number of sampled pairs per word class and text in the mode "sampled"
+SIMILARITY_SAMPLE_BUDGET = 10000
+# number of sampled pairs whose vectors are multiplied at once
+SIMILARITY_SAMPLE_BLOCK = 4096
+# seed of the sample, the same text gets the same estimate in every run and process
+SIMILARITY_SEED = 0
+# quantile of the normal distribution for the 95% confidence interval of the sample mean
+SIMILARITY_CONFIDENCE_Z = 1.959963984540054
+# key of the estimates of the mode "sampled" in doc.user_data
+SEMANTIC_SIMILARITY_ESTIMATES = "semantic_similarity_estimates"
 
 
 def get_all_lemmatized_nouns(doc):
@@ -40,55 +74,275 @@ def create_combinations_of_elements(list_of_lemmas):
     return [' '.join(x) for x in combinations]
 
 
-def calculate_average_semantic_similarity(list_of_strings, nlp):
+@lru_cache(maxsize=None)
+def get_lemma_vector_cache(vocab):
+    """Returns the cache of the normalized lemma vectors of the vocab of a spacy
+    model, it is created on the first call and shared for the rest of the process.
+    :param vocab: spacy.vocab.Vocab
+    :return: dict with the matrix of the vectors ("vectors", float32), the flags
+        if a lemma has a vector ("has_vector"), the row of each lemma ("index")
+        and the number of used rows ("size") """
+    return {
+        "vectors": np.zeros((LEMMA_VECTOR_CACHE_ROWS, vocab.vectors_length), dtype=np.float32),
+        "has_vector": np.zeros(LEMMA_VECTOR_CACHE_ROWS, dtype=bool),
+        "index": dict(),
+        "size": 0
+    }
+
+
+def add_lemma_vectors(cache, lemmas, vocab):
+    """Looks up the vectors of the lemmas in the vector table of the model,
+    normalizes them to unit length and adds them to the cache. Lemmas without
+    a vector (or with a zero vector) get a zero vector and no flag.
+    :param cache: dict, see get_lemma_vector_cache
+    :param lemmas: list of distinct lemmas which are not in the cache
+    :param vocab: spacy.vocab.Vocab
+    """
+    size = cache["size"]
+    if size + len(lemmas) > len(cache["vectors"]):
+        rows = max(size + len(lemmas), 2 * len(cache["vectors"]))
+        vectors = np.zeros((rows, cache["vectors"].shape[1]), dtype=np.float32)
+        vectors[:size] = cache["vectors"][:size]
+        has_vector = np.zeros(rows, dtype=bool)
+        has_vector[:size] = cache["has_vector"][:size]
+        cache["vectors"], cache["has_vector"] = vectors, has_vector
+
+    for row, lemma in enumerate(lemmas, size):
+        cache["index"][lemma] = row
+        cache["vectors"][row] = 0.0
+        cache["has_vector"][row] = False
+        if vocab.has_vector(lemma):
+            vector = vocab.get_vector(lemma)
+            norm = np.linalg.norm(vector)
+            if norm:
+                cache["vectors"][row] = vector / norm
+                cache["has_vector"][row] = True
+    cache["size"] = size + len(lemmas)
+
+
+def get_lemma_rows(list_of_lemmas, vocab):
+    """Returns the cache of the lemma vectors with the row of each lemma. The
+    vectors of lemmas which are not cached are added, if the cache would
+    exceed LEMMA_VECTOR_CACHE_SIZE, it is cleared first.
+    :param list_of_lemmas: list of strings
+    :param vocab: spacy.vocab.Vocab
+    :return: tuple (dict, see get_lemma_vector_cache, numpy array with the row
+        of each lemma in list_of_lemmas) """
+    cache = get_lemma_vector_cache(vocab)
+    index = cache["index"]
+    missing_lemmas = [lemma for lemma in dict.fromkeys(list_of_lemmas) if lemma not in index]
+    if missing_lemmas:
+        if cache["size"] + len(missing_lemmas) > LEMMA_VECTOR_CACHE_SIZE:
+            index.clear()
+            cache["size"] = 0
+            missing_lemmas = list(dict.fromkeys(list_of_lemmas))
+        add_lemma_vectors(cache, missing_lemmas, vocab)
+    rows = np.fromiter((index[lemma] for lemma in list_of_lemmas), dtype=np.int64, count=len(list_of_lemmas))
+    return cache, rows
+
+
+def get_unit_vectors(list_of_lemmas, nlp):
+    """Returns the normalized vectors of the distinct lemmas from the cache of
+    the lemma vectors (see get_lemma_rows), lemmas without a vector have a zero
+    vector. The vectors are converted to float64 for the products.
+    :param list_of_lemmas: list of strings
+    :param nlp: spacy model
+    :return: tuple (numpy matrix with one row per distinct lemma,
+        numpy array with the row index of each lemma in list_of_lemmas,
+        numpy array with a flag per distinct lemma if it has a vector) """
+    cache, rows = get_lemma_rows(list_of_lemmas, nlp.vocab)
+    distinct_rows, lemma_rows = np.unique(rows, return_inverse=True)
+    unit_vectors = cache["vectors"][distinct_rows].astype(np.float64)
+    return unit_vectors, lemma_rows, cache["has_vector"][distinct_rows]
+
+
+def calculate_average_semantic_similarity(list_of_lemmas, nlp):
     """Compute a semantic similarity estimate. Defaults to cosine over vectors.
+    The average is taken over all combinations of two lemmas (see
+    create_combinations_of_elements), pairs with a lemma without vector count
+    as 0. The cosines of the distinct lemmas are computed with one matrix
+    product of their normalized vectors and weighted by the counts c of the
+    lemmas: the sum over all pairs is (c S c - c diag(S)) / 2, so the memory
+    is quadratic in the number of distinct lemmas, not of all lemmas.
     :param list_of_lemmas: list of strings
+    :param nlp: spacy model
     :return: float """
-    if len(list_of_strings) == 0:
+    number_of_pairs = len(list_of_lemmas) * (len(list_of_lemmas) - 1) // 2
+    if number_of_pairs == 0:
         return 0.0
-    sem_sim = 0.0
-    for words in list_of_strings:
-        tokens = nlp(words)
-        token1, token2 = tokens[0], tokens[1]
-        #print(f"Similarity for {token1} and {token2}:", token1.similarity(token2))
-        if token1.has_vector and token2.has_vector:
-            sem_sim += token1.similarity(token2)
-
-    average_semantic_similarity = safe_division(sem_sim, len(list_of_strings))
+    unit_vectors, lemma_rows, has_vector = get_unit_vectors(list_of_lemmas, nlp)
+    distinct_similarities = unit_vectors @ unit_vectors.T
+    # the similarity of a lemma with a vector to itself is exactly 1.0
+    np.fill_diagonal(distinct_similarities, has_vector)
+    lemma_counts = np.bincount(lemma_rows, minlength=len(unit_vectors)).astype(np.float64)
+    sem_sim = (lemma_counts @ distinct_similarities @ lemma_counts
+               - lemma_counts @ distinct_similarities.diagonal()) / 2
+
+    average_semantic_similarity = safe_division(float(sem_sim), number_of_pairs)
     return average_semantic_similarity
 
 
-def get_average_semantic_similarity_of_all_nouns(doc, nlp):
+def sum_unit_vectors(list_of_lemmas, nlp):
+    """Sums the normalized vectors of the lemmas (see get_unit_vectors), so that
+    the similarities of all pairs can be computed from the sums, see
+    calculate_average_semantic_similarity_from_sums. The sums of several texts
+    can be added.
+    :param list_of_lemmas: list of strings
+    :param nlp: spacy model
+    :return: dict with the vector sum, the sum of the squared norms and the
+        number of lemmas """
+    if not list_of_lemmas:
+        return {"vector_sum": np.zeros(nlp.vocab.vectors_length), "squared_norms": 0.0, "n": 0}
+    unit_vectors, lemma_rows, has_vector = get_unit_vectors(list_of_lemmas, nlp)
+    lemma_counts = np.bincount(lemma_rows, minlength=len(unit_vectors))
+    return {
+        "vector_sum": lemma_counts @ unit_vectors,
+        "squared_norms": float(lemma_counts @ np.einsum("ij,ij->i", unit_vectors, unit_vectors)),
+        "n": len(list_of_lemmas)
+    }
+
+
+def calculate_average_semantic_similarity_from_sums(vector_sums):
+    """Computes the average semantic similarity of all pairs of lemmas like
+    calculate_average_semantic_similarity, but from the sums of their unit
+    vectors (see sum_unit_vectors): the squared norm of the sum s of the vectors
+    u is the sum of their squared norms and twice the sum of the cosines of all
+    pairs, so the sum of the cosines is (||s||² - sum(||u||²)) / 2. The result
+    can differ from calculate_average_semantic_similarity in the order of the
+    float32 precision of the vectors.
+    :param vector_sums: dict, see sum_unit_vectors
+    :return: float """
+    number_of_pairs = vector_sums["n"] * (vector_sums["n"] - 1) // 2
+    if number_of_pairs == 0:
+        return 0.0
+    vector_sum = vector_sums["vector_sum"]
+    sem_sim = (vector_sum @ vector_sum - vector_sums["squared_norms"]) / 2
+    return safe_division(float(sem_sim), number_of_pairs)
+
+
+def calculate_linear_average_semantic_similarity(list_of_lemmas, nlp):
+    """Computes the average semantic similarity of all pairs of lemmas in
+    linear time from the sum of their normalized vectors, see
+    calculate_average_semantic_similarity_from_sums.
+    :param list_of_lemmas: list of strings
+    :param nlp: spacy model
+    :return: float """
+    return calculate_average_semantic_similarity_from_sums(sum_unit_vectors(list_of_lemmas, nlp))
+
+
+def sample_average_semantic_similarity(list_of_lemmas, nlp, budget=SIMILARITY_SAMPLE_BUDGET, seed=SIMILARITY_SEED):
+    """Estimates the average semantic similarity of all pairs of lemmas (see
+    calculate_average_semantic_similarity) from budget pairs, which are drawn
+    uniformly with replacement, with the 95% confidence interval of the sample
+    mean. Texts with at most budget pairs are computed exactly (the interval is
+    the average itself).
+    :param list_of_lemmas: list of strings
+    :param nlp: spacy model
+    :param budget: number of sampled pairs
+    :param seed: seed of the random generator
+    :return: dict with the estimate ("mean"), the bounds of the confidence
+        interval ("low", "high"), the number of used pairs ("pairs") and if
+        they were sampled ("sampled") """
+    number_of_lemmas = len(list_of_lemmas)
+    number_of_pairs = number_of_lemmas * (number_of_lemmas - 1) // 2
+    if number_of_pairs <= budget:
+        mean = calculate_average_semantic_similarity(list_of_lemmas, nlp)
+        return {"mean": mean, "low": mean, "high": mean, "pairs": number_of_pairs, "sampled": False}
+
+    unit_vectors, lemma_rows, has_vector = get_unit_vectors(list_of_lemmas, nlp)
+    rng = np.random.default_rng(seed)
+    # two different positions, so each pair of create_combinations_of_elements is equally likely
+    first = rng.integers(0, number_of_lemmas, budget)
+    second = rng.integers(0, number_of_lemmas - 1, budget)
+    second += second >= first
+    first_rows, second_rows = lemma_rows[first], lemma_rows[second]
+    similarities = np.empty(budget)
+    for start in range(0, budget, SIMILARITY_SAMPLE_BLOCK):
+        block = slice(start, start + SIMILARITY_SAMPLE_BLOCK)
+        similarities[block] = np.einsum("ij,ij->i", unit_vectors[first_rows[block]],
+                                        unit_vectors[second_rows[block]])
+    # the similarity of a lemma with a vector to itself is exactly 1.0
+    same_lemma = first_rows == second_rows
+    similarities[same_lemma] = has_vector[first_rows[same_lemma]]
+
+    mean = float(similarities.mean())
+    half_width = SIMILARITY_CONFIDENCE_Z * float(similarities.std(ddof=1)) / budget ** 0.5
+    return {"mean": mean, "low": max(mean - half_width, -1.0), "high": min(mean + half_width, 1.0),
+            "pairs": budget, "sampled": True}
+
+
+def create_similarity_options(mode="exact", budget=SIMILARITY_SAMPLE_BUDGET, seed=SIMILARITY_SEED):
+    """Creates the options of the average semantic similarity for a run.
+    :param mode: "exact", "linear" or "sampled", see SIMILARITY_MODES
+    :param budget: number of sampled pairs per word class and text (mode "sampled")
+    :param seed: seed of the sample (mode "sampled")
+    :return: dict """
+    if mode not in SIMILARITY_MODES:
+        raise ValueError(f"Unknown similarity mode {mode}, the modes are {', '.join(SIMILARITY_MODES)}.")
+    if budget < 2:
+        raise ValueError(f"The sample budget has to be at least 2 pairs, not {budget}.")
+    return {"mode": mode, "budget": budget, "seed": seed}
+
+
+def get_average_semantic_similarity(doc, nlp, word_class, similarity=None):
+    """Calculates the average semantic similarity of the lemmas of a word class
+    of the text in the mode of the options. The estimate of the mode "sampled"
+    with its confidence interval is stored in doc.user_data[SEMANTIC_SIMILARITY_ESTIMATES].
+    :param doc: spacy.tokens.doc.Doc
+    :param nlp: spacy model
+    :param word_class: "nouns", "verbs" or "adjectives", see features.doc_statistics.collect_lemmas
+    :param similarity: dict, see create_similarity_options, or None (mode "exact")
+    :return: float """
+    lemmas = get_lemmas(doc)[word_class]
+    if similarity is None or similarity["mode"] == "exact":
+        return calculate_average_semantic_similarity(lemmas, nlp)
+    if similarity["mode"] == "linear":
+        return calculate_linear_average_semantic_similarity(lemmas, nlp)
+    estimate = sample_average_semantic_similarity(lemmas, nlp, similarity["budget"], similarity["seed"])
+    doc.user_data.setdefault(SEMANTIC_SIMILARITY_ESTIMATES, dict())[word_class] = estimate
+    return estimate["mean"]
+
+
+def get_similarity_intervals(doc):
+    """Returns the bounds of the confidence intervals of the mode "sampled"
+    which are stored in doc.user_data (see get_average_semantic_similarity), in
+    the order of constants.SEMANTIC_SIMILARITY_INTERVAL_FEATURES.
+    :param doc: spacy.tokens.doc.Doc
+    :return: list of floats (low and high bound of each word class) """
+    estimates = doc.user_data[SEMANTIC_SIMILARITY_ESTIMATES]
+    return [estimates[word_class][bound] for word_class in ("nouns", "verbs", "adjectives")
+            for bound in ("low", "high")]
+
+
+def get_average_semantic_similarity_of_all_nouns(doc, nlp, similarity=None):
     """Calculates the average semantic similarity of all nouns in the text.
     :param doc: spacy.tokens.doc.Doc
     :param nlp: spacy model
+    :param similarity: dict, see create_similarity_options, or None (mode "exact")
     :return: float """
-    all_nouns = get_all_lemmatized_nouns(doc)
-    combinations = create_combinations_of_elements(all_nouns)
-    return calculate_average_semantic_similarity(combinations, nlp)
+    return get_average_semantic_similarity(doc, nlp, "nouns", similarity)
 
 
-def get_average_semantic_similarity_of_all_verbs(doc, nlp):
+def get_average_semantic_similarity_of_all_verbs(doc, nlp, similarity=None):
     """Calculates the average semantic similarity of all verbs in the text.
     :param doc: spacy.tokens.doc.Doc
     :param nlp: spacy model
+    :param similarity: dict, see create_similarity_options, or None (mode "exact")
     :return: float """
-    all_verbs = get_all_lemmatized_verbs(doc)
-    combinations = create_combinations_of_elements(all_verbs)
-    return calculate_average_semantic_similarity(combinations, nlp)
+    return get_average_semantic_similarity(doc, nlp, "verbs", similarity)
 
 
-def get_average_semantic_similarity_of_all_adjectives(doc, nlp):
+def get_average_semantic_similarity_of_all_adjectives(doc, nlp, similarity=None):
     """Calculates the average semantic similarity of all adjectives and adverbs.
     :param doc: spacy.tokens.doc.Doc
     :param nlp: spacy model
+    :param similarity: dict, see create_similarity_options, or None (mode "exact")
     :return: float """
-    all_adjectives = get_all_lemmatized_adjectives(doc)
-    combinations = create_combinations_of_elements(all_adjectives)
-    return calculate_average_semantic_similarity(combinations, nlp)
+    return get_average_semantic_similarity(doc, nlp, "adjectives", similarity)
 
 
 def demo():
+    import spacy
     nlp = spacy.load("de_core_news_md")
 
     text = "Das ist meine tolle Banane. " \
@@ -128,6 +382,17 @@ def demo():
     # of all verbs: 0.43449820578098297
     # of all adjectives: 0.8819387356440226
 
+    print("### modes of the average_semantic_similarity for a long text ###")
+    long_doc = nlp(" ".join([text, text2] * 100))
+    exact = get_average_semantic_similarity_of_all_nouns(long_doc, nlp)
+    for mode in SIMILARITY_MODES:
+        similarity = create_similarity_options(mode, budget=2000)
+        estimate = get_average_semantic_similarity_of_all_nouns(long_doc, nlp, similarity)
+        print(f"of all nouns ({mode}):", estimate, "error:", abs(estimate - exact))
+    interval = long_doc.user_data[SEMANTIC_SIMILARITY_ESTIMATES]["nouns"]
+    print("95% confidence interval of the sample:", interval["low"], interval["high"],
+          "contains the exact average:", interval["low"] <= exact <= interval["high"])
+
 
 if __name__ == "__main__":
     demo()
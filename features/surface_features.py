@@ -5,24 +5,57 @@
 # average characters per word
 # average syllables per word
 # You can run a demo with: $ python surface_features.py
-import spacy
-import pyphen
+from functools import lru_cache
 from utils_and_preprocess.utils import safe_division
+from features.doc_statistics import get_doc_statistics
 
 
 def get_token(doc):
     """Get token count in a doc without punctuation."""
-    return len([tok.text for tok in doc if not tok.is_punct])
+    return get_doc_statistics(doc)["words"]
+
+
+# number of distinct words for which the syllable count is cached per process
+SYLLABLE_CACHE_SIZE = 100000
+
+
+@lru_cache(maxsize=None)
+def get_hyphenation_dictionary():
+    """Returns the german hyphenation dictionary of Pyphen, which is imported
+    and loaded only once per process, when the first syllables are counted.
+    :return: pyphen.Pyphen """
+    import pyphen
+    return pyphen.Pyphen(lang="de_DE")
+
+
+@lru_cache(maxsize=SYLLABLE_CACHE_SIZE)
+def count_syllables_of_word(word):
+    """Counts the syllables of a lowercased word with Pyphen. The counts are
+    cached, because a few frequent words make up most tokens of a text
+    (Zipf's law). Pyphen hyphenates the lowercased word, so the count does
+    not depend on the case.
+    :param word: str (lowercased)
+    :return: int """
+    return len(get_hyphenation_dictionary().inserted(word).split("-"))
+
+
+def count_syllables_of_words(word_counts):
+    """Computes the sum of the syllables of all words, each distinct word is
+    hyphenated once and weighted with its count.
+    :param word_counts: dict with words as keys and counts as values
+    :return: int """
+    return sum([count_syllables_of_word(word.lower()) * count for word, count in word_counts.items()])
 
 
 def count_syllables(doc):
     """Computes the sum of all syllables per word, using the Pyphen moduls which is
     module to hyphenate text using existing Hunspell hyphenation dictionaries.
     See here https://github.com/Kozea/Pyphen
+    The distinct token texts are taken from the doc statistics and hyphenated
+    with count_syllables_of_words.
     :param doc: spacy.tokens.doc.Doc
     :return: float """
-    dictionary = pyphen.Pyphen(lang="de_DE")
-    return sum([len(dictionary.inserted(token.text).split("-")) for token in doc])
+    return count_syllables_of_words(get_doc_statistics(doc)["orth_counts"])
 
 
 def get_text_length_in_token(doc):
@@ -36,14 +69,14 @@ def get_average_sentence_length_in_token(doc):
     """Computes the average sentence lenght in token (words).
     :param doc: spacy.tokens.doc.Doc
     :return: float """
-    return safe_division(get_token(doc), len(list(doc.sents)))
+    return safe_division(get_token(doc), get_doc_statistics(doc)["sentences"])
 
 
 def get_average_characters_per_word(doc):
     """Computes the average character per word.
     :param doc: spacy.tokens.doc.Doc
     :return: float """
-    char = sum([len(tok.text) for tok in doc if not tok.is_punct])
+    char = get_doc_statistics(doc)["characters"]
     return safe_division(char, get_token(doc))
 
 
@@ -56,6 +89,7 @@ def get_average_syllables_per_word(doc):
 
 
 def demo():
+    import spacy
     nlp = spacy.load("de_core_news_sm")
     text = "Das ist meine tolle Banane. " \
            "Die Banane ist reif. " \
@@ -6,37 +6,143 @@
 # average count of sentences with verb as root,
 # average count of sentences with nouns as root
 # You can run a demo with: $ python syntactic_features.py
-import spacy
 import statistics
+import numpy as np
 from utils_and_preprocess.utils import safe_division
+from features.doc_statistics import get_doc_statistics, mask_values
 
+# key under which the depths of the tokens are stored in doc.user_data
+TOKEN_DEPTHS = "token_depths"
+# dependency labels of the heads of noun phrases in the noun chunks of the
+# german model (spacy.lang.de.syntax_iterators)
+NOUN_PHRASE_LABELS = ["sb", "oa", "da", "nk", "mo", "ag", "ROOT", "root", "cj", "pd", "og", "app"]
 
-def get_average_number_of_noun_phrases_per_sentence(doc):
+
+def count_noun_phrases(doc):
+    """Counts the noun phrases of the doc (Doc.noun_chunks).
+    :param doc: spacy.tokens.doc.Doc
+    :return: int """
+    return sum(1 for _ in doc.noun_chunks)
+
+
+def count_left_edges(doc):
+    """Computes the left edge of every token (the first token of its subtree)
+    from the head array of the doc (Doc.to_array): the tokens pass their left
+    edge to their heads level by level, from the deepest tokens to the roots
+    (see get_token_depths).
+    :param doc: spacy.tokens.doc.Doc
+    :return: tuple (numpy array of the heads, numpy array of the left edges) """
+    positions = np.arange(len(doc))
+    heads = positions + doc.to_array("HEAD").astype(np.int64)
+    left_edges = positions.copy()
+    depths = get_token_depths(doc)
+    order = np.argsort(depths, kind="stable")[::-1]
+    for level in np.split(order, np.flatnonzero(np.diff(depths[order])) + 1):
+        np.minimum.at(left_edges, heads[level], left_edges[level])
+    return heads, left_edges
+
+
+def count_noun_phrases_from_array(doc):
+    """Counts the same noun phrases as Doc.noun_chunks of the german model
+    (spacy.lang.de.syntax_iterators) from the head, dependency and POS arrays
+    without creating Token objects: a noun or pronoun with one of the
+    NOUN_PHRASE_LABELS starts a noun phrase at its left edge, if the edge is
+    behind the end of the previous noun phrase, which ends at the noun or at
+    its last right child which is a noun with the label "nk".
+    :param doc: spacy.tokens.doc.Doc
+    :return: int """
+    if not doc.has_annotation("DEP"):
+        return count_noun_phrases(doc)
+    strings = doc.vocab.strings
+    pos, dep = doc.to_array(["POS", "DEP"]).T
+    heads, left_edges = count_left_edges(doc)
+    positions = np.arange(len(doc))
+    ends = positions.copy()
+    close_apposition = np.flatnonzero(mask_values(pos, ("NOUN", "PROPN"), strings)
+                                      & mask_values(dep, "nk", strings) & (heads < positions))
+    np.maximum.at(ends, heads[close_apposition], close_apposition)
+    phrase_heads = np.flatnonzero(mask_values(pos, ("NOUN", "PROPN", "PRON"), strings)
+                                  & mask_values(dep, NOUN_PHRASE_LABELS, strings))
+    number_of_noun_phrases = 0
+    previous_end = -1
+    for left_edge, end in zip(left_edges[phrase_heads].tolist(), ends[phrase_heads].tolist()):
+        if left_edge > previous_end:
+            number_of_noun_phrases += 1
+            previous_end = end
+    return number_of_noun_phrases
+
+
+# the functions which count the noun phrases with each backend, see features.doc_statistics
+NOUN_PHRASE_BACKENDS = {
+    "python": count_noun_phrases,
+    "array": count_noun_phrases_from_array
+}
+
+
+def get_average_number_of_noun_phrases_per_sentence(doc, backend="python"):
     """ Computes the average number of noun phrases per sentence.
     :param doc: spacy.tokens.doc.Doc
+    :param backend: "python" or "array", see NOUN_PHRASE_BACKENDS
     :return: float """
-    noun_chunks = [chunk.text for chunk in doc.noun_chunks]
-    return safe_division(len(noun_chunks), len(list(doc.sents)))
+    noun_chunks = NOUN_PHRASE_BACKENDS[backend](doc)
+    return safe_division(noun_chunks, get_doc_statistics(doc)["sentences"])
 
 
 def get_average_number_of_subordinate_clauses_per_sentence(doc):
     """Computes the average number of subordinate clauses per sentence, based on
     the assumption that in german a subordinate clause is always separated
-    by a comma.
+    by a comma. The sentences cover the whole doc, so the commas are counted
+    once in the text of the doc (see features.doc_statistics).
     :param doc: spacy.tokens.doc.Doc
     :return: float """
-    comma_count = sum([sent.text.count(",") for sent in doc.sents])
-    return safe_division(comma_count, len(list(doc.sents)))
+    doc_stats = get_doc_statistics(doc)
+    return safe_division(doc_stats["commas"], doc_stats["sentences"])
 
 
-def tree_height(root):
-    """Computes maximum height of sentence's dependency parse tree.
-    :param root: spacy.tokens.token.Token
-    :return: int """
-    if not list(root.children):
-        return 1
-    else:
-        return 1 + max(tree_height(x) for x in root.children)
+def count_token_depths(doc):
+    """Computes the depth of every token in its dependency tree (0 for a root)
+    from the head array of the doc (Doc.to_array). Every token points to its
+    head, the pointers are doubled until they all point to a root, so the
+    depths are summed up in log2(tree height) numpy steps.
+    :param doc: spacy.tokens.doc.Doc
+    :return: numpy array of ints """
+    positions = np.arange(len(doc))
+    # the heads are stored as offsets to the token (negative offsets as unsigned ints)
+    pointers = positions + doc.to_array("HEAD").astype(np.int64)
+    depths = (pointers != positions).astype(np.int64)
+    # after k steps every pointer skips 2**k heads, a path has less than len(doc) heads
+    for _ in range(len(doc).bit_length()):
+        next_pointers = pointers[pointers]
+        if np.array_equal(next_pointers, pointers):
+            break
+        depths += depths[pointers]
+        pointers = next_pointers
+    return depths
+
+
+def get_token_depths(doc):
+    """Returns the depths of the tokens, see count_token_depths. They are computed
+    on the first call and stored in doc.user_data, so all syntactic features
+    share them.
+    :param doc: spacy.tokens.doc.Doc
+    :return: numpy array of ints """
+    if TOKEN_DEPTHS not in doc.user_data:
+        doc.user_data[TOKEN_DEPTHS] = count_token_depths(doc)
+    return doc.user_data[TOKEN_DEPTHS]
+
+
+def get_sentence_heights(doc):
+    """Computes the height of the parse tree of each sentence in doc: one more
+    than the maximum depth of its tokens (see get_token_depths).
+    :param doc: spacy.tokens.doc.Doc
+    :return: list of ints """
+    if not len(doc):
+        return []
+    sent_start = doc.to_array("SENT_START")
+    # the first token always starts a sentence (see spacy.tokens.doc.Doc.sents)
+    sentence_starts = np.flatnonzero(sent_start[1:] == 1) + 1
+    sentence_starts = np.concatenate(([0], sentence_starts))
+    return (np.maximum.reduceat(get_token_depths(doc), sentence_starts) + 1).tolist()
 
 
 def get_average_heights(doc):
@@ -46,28 +152,27 @@ def get_average_heights(doc):
         text = "Das ist eine tolle Banane."
         tree_height = 3
     :return: float """
-    roots = [sent.root for sent in doc.sents]
-    tree_heights = [tree_height(root) for root in roots]
-    return statistics.mean(tree_heights)
+    return statistics.mean(get_sentence_heights(doc))
 
 
 def get_average_count_of_sentences_with_verb_as_root(doc):
     """Computes average sentence in doc with a verb as root.
     :param doc: spacy.tokens.doc.Doc
     :return: float """
-    verb_as_root = [1 for tok in doc if tok.dep_ == "ROOT" and tok.pos_ == "VERB"]
-    return safe_division(sum(verb_as_root), len(list(doc.sents)))
+    doc_stats = get_doc_statistics(doc)
+    return safe_division(doc_stats["root_pos_counts"]["VERB"], doc_stats["sentences"])
 
 
 def get_average_count_of_sentences_with_nouns_as_root(doc):
     """Computes average sentence in doc with a noun as root.
     :param doc: spacy.tokens.doc.Doc
     :return: float """
-    noun_as_root = [1 for tok in doc if tok.dep_ == "ROOT" and tok.pos_ == "NOUN"]
-    return safe_division(sum(noun_as_root), len(list(doc.sents)))
+    doc_stats = get_doc_statistics(doc)
+    return safe_division(doc_stats["root_pos_counts"]["NOUN"], doc_stats["sentences"])
 
 
 def demo():
+    import spacy
     nlp = spacy.load("de_core_news_sm")
     text = "Das ist meine tolle Banane. " \
            "Die Banane ist reif. " \
@@ -2,8 +2,8 @@
 # Extracted features:
 # average number of verbs in sentence
 # You can run a demo with: $ python verb_tense_features.py
-import spacy
 from utils_and_preprocess.utils import safe_division
+from features.doc_statistics import get_doc_statistics
 
 
 def get_verb_forms(doc):
@@ -39,15 +39,15 @@ def get_average_number_of_verbs_in_sentence(doc):
            "Der Bananensalat wird morgen gemacht werden."
         verb_forms = [['Pres'], ['Past'], ['Pres', 'Part'], ['Pres', 'Part', 'Inf']]
         average number of verbs in sentence = 1.75
+    The verb forms are counted in the doc statistics like in get_verb_forms.
     :param doc: spacy.tokens.doc.Doc
     :return: float """
-    verb_forms = get_verb_forms(doc)
-    # make a flat list
-    num_of_verbs = len([verb for sent in verb_forms for verb in sent])
-    return safe_division(num_of_verbs, len(list(doc.sents)))
+    doc_stats = get_doc_statistics(doc)
+    return safe_division(doc_stats["verb_forms"], doc_stats["sentences"])
 
 
 def demo():
+    import spacy
     nlp = spacy.load("de_core_news_sm")
     text = "Die Bananen sind reif. " \
            "Die Gurke war reif." \
@@ -0,0 +1,81 @@
+# Fixtures of the tests: a small German spacy pipeline which needs no trained
+# model. The sentences are split by the sentencizer and the tokens are annotated
+# by a rule-based component from the LEXICON (pos, tag, lemma, morph and a flat
+# dependency tree per sentence), so the features of a sentence do not depend on
+# the rest of the text. The lemmas get random (seeded) vectors.
+# Run the tests from the root of the repository with: $ python -m pytest
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import spacy
+from spacy.language import Language
+
+from features.lexical_features import create_log_rank_table
+from utils_and_preprocess.resources import get_discourse_marker
+
+# word: (pos, tag, lemma)
+LEXICON = {
+    "Banane": ("NOUN", "NN", "Banane"), "Bananen": ("NOUN", "NN", "Banane"),
+    "Gurke": ("NOUN", "NN", "Gurke"), "Mann": ("NOUN", "NN", "Mann"), "Jahr": ("NOUN", "NN", "Jahr"),
+    "ist": ("AUX", "VAFIN", "sein"), "sind": ("AUX", "VAFIN", "sein"),
+    "essen": ("VERB", "VVINF", "essen"), "macht": ("VERB", "VVFIN", "machen"),
+    "gegessen": ("VERB", "VVPP", "essen"), "geht": ("VERB", "VVFIN", "gehen"),
+    "reif": ("ADJ", "ADJD", "reif"), "tolle": ("ADJ", "ADJA", "toll"), "große": ("ADJ", "ADJA", "groß"),
+    "Die": ("DET", "ART", "der"), "die": ("DET", "ART", "der"), "der": ("DET", "ART", "der"),
+    "eine": ("DET", "ART", "ein"), "sie": ("PRON", "PPER", "sie"), "Sie": ("PRON", "PPER", "sie"),
+    "ich": ("PRON", "PPER", "ich"), "Ich": ("PRON", "PPER", "ich"),
+    "und": ("CCONJ", "KON", "und"), "aber": ("CCONJ", "KON", "aber"), "weil": ("SCONJ", "KOUS", "weil"),
+    "obwohl": ("SCONJ", "KOUS", "obwohl"), "mit": ("ADP", "APPR", "mit"), "in": ("ADP", "APPR", "in"),
+    "2023": ("NUM", "CARD", "2023"), ",": ("PUNCT", "$,", ","), ".": ("PUNCT", "$.", ".")
+}
+MORPHS = {"VVFIN": "Mood=Ind|Tense=Pres|VerbForm=Fin", "VAFIN": "Mood=Ind|Tense=Pres|VerbForm=Fin",
+          "VVINF": "VerbForm=Inf", "VVPP": "VerbForm=Part"}
+VECTOR_WIDTH = 20
+
+
+@Language.component("lexicon_annotator")
+def annotate_tokens(doc):
+    """Annotates the tokens from the LEXICON, the first verb (or the first token)
+    of a sentence is its root and the head of all other tokens."""
+    for sent in list(doc.sents):
+        verbs = [token for token in sent if token.pos_ in ("VERB", "AUX")]
+        for token in sent:
+            pos, tag, lemma = LEXICON.get(token.text, ("X", "XY", token.text))
+            token.pos_, token.tag_, token.lemma_ = pos, tag, lemma
+            token.set_morph(MORPHS.get(tag))
+        root = verbs[0] if verbs else sent[0]
+        for token in sent:
+            token.head = root
+            if token == root:
+                token.dep_ = "ROOT"
+            elif token.pos_ in ("NOUN", "PROPN", "PRON"):
+                token.dep_ = "sb"
+            else:
+                token.dep_ = "punct" if token.is_punct else "mo"
+    return doc
+
+
+@pytest.fixture(scope="session")
+def nlp():
+    nlp = spacy.blank("de")
+    nlp.add_pipe("sentencizer")
+    nlp.add_pipe("lexicon_annotator")
+    random_state = np.random.RandomState(0)
+    for lemma in sorted(set(lemma for pos, tag, lemma in LEXICON.values())):
+        nlp.vocab.set_vector(lemma, random_state.rand(VECTOR_WIDTH).astype(np.float32) - 0.3)
+    return nlp
+
+
+@pytest.fixture(scope="session")
+def log_rank_table():
+    return create_log_rank_table({"der": 9, "sein": 8, "banane": 5, "essen": 5, "mann": 3, "reif": 1})
+
+
+@pytest.fixture(scope="session")
+def discourse_marker(nlp):
+    return get_discourse_marker(nlp)
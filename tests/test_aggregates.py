@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from constants import FEATURES
+from extract_features import calculate_features
+from features.aggregates import create_document_state, update_document_state, calculate_features_from_state
+
+TEXT = "Die Banane ist reif. " \
+       "Der Mann macht eine große Gurke, weil sie reif ist. " \
+       "Ich geht mit der Banane in die Gurke. " \
+       "Sie sind tolle Bananen, aber der Mann ist reif. " \
+       "Die Gurke ist 2023 gegessen. "
+
+EDITS = {
+    "middle": TEXT.replace("Ich geht mit der Banane", "Der Mann geht mit einer tollen Banane"),
+    "first": TEXT.replace("Die Banane ist reif. ", "Die Gurke ist nicht reif. "),
+    "insert": TEXT.replace("Die Gurke ist", "Ich macht eine Banane. Die Gurke ist"),
+    "delete": TEXT.replace("Sie sind tolle Bananen, aber der Mann ist reif. ", ""),
+    "append": TEXT + "Der Mann ist reif und die Banane ist gegessen. ",
+    "merge": TEXT.replace("Die Banane ist reif. ", "Die Banane ist reif und "),
+    "empty": ""
+}
+
+
+def features_of_state(state, log_rank_table):
+    return np.array(calculate_features_from_state(state, log_rank_table), dtype=float)
+
+
+@pytest.mark.parametrize("edit", sorted(EDITS))
+def test_update_equals_full_parse(nlp, log_rank_table, discourse_marker, edit):
+    state = create_document_state(TEXT, nlp, discourse_marker)
+    updated = update_document_state(state, EDITS[edit], nlp, discourse_marker)
+    parsed = create_document_state(EDITS[edit], nlp, discourse_marker)
+
+    assert [sentence["text"] for sentence in updated["sentences"]] == \
+        [sentence["text"] for sentence in parsed["sentences"]]
+    np.testing.assert_allclose(features_of_state(updated, log_rank_table),
+                               features_of_state(parsed, log_rank_table), rtol=1e-6, atol=1e-9)
+
+
+def test_update_parses_only_the_changed_sentences(nlp, discourse_marker):
+    state = create_document_state(TEXT, nlp, discourse_marker)
+    updated = update_document_state(state, EDITS["middle"], nlp, discourse_marker)
+    assert updated["parsed_sentences"] < len(updated["sentences"])
+    assert update_document_state(updated, EDITS["middle"], nlp, discourse_marker)["parsed_sentences"] == 0
+
+
+def test_update_from_an_empty_text(nlp, log_rank_table, discourse_marker):
+    state = create_document_state("", nlp, discourse_marker)
+    updated = update_document_state(state, TEXT, nlp, discourse_marker)
+    parsed = create_document_state(TEXT, nlp, discourse_marker)
+    np.testing.assert_allclose(features_of_state(updated, log_rank_table),
+                               features_of_state(parsed, log_rank_table), rtol=1e-6, atol=1e-9)
+
+
+def test_empty_text_has_zero_features(nlp, log_rank_table, discourse_marker):
+    state = create_document_state("", nlp, discourse_marker, groups=["surface", "lexical"])
+    assert calculate_features_from_state(state, log_rank_table) == [0] * 6
+    state = create_document_state("", nlp, discourse_marker)
+    assert calculate_features_from_state(state, log_rank_table) == [0] * len(FEATURES)
+
+
+def test_state_equals_features_of_the_doc(nlp, log_rank_table, discourse_marker):
+    state = create_document_state(TEXT, nlp, discourse_marker)
+    doc_features = calculate_features(nlp(TEXT), nlp, log_rank_table, discourse_marker)
+    np.testing.assert_allclose(features_of_state(state, log_rank_table),
+                               np.array(doc_features, dtype=float), rtol=1e-6, atol=1e-9)
@@ -0,0 +1,133 @@
+import random
+
+import pytest
+from spacy.tokens import Doc
+
+from extract_features import calculate_features
+from features.doc_statistics import count_doc_statistics, count_doc_statistics_from_array
+from features.syntactic_features import count_noun_phrases, count_noun_phrases_from_array
+from features.discourse_features import match_discourse_markers, match_discourse_markers_from_array
+
+# word, pos, tag, lemma
+WORDS = [
+    ("Banane", "NOUN", "NN", "Banane"), ("Gurke", "NOUN", "NN", "Gurke"), ("Mann", "NOUN", "NN", "Mann"),
+    ("Xyzzyq", "PROPN", "NE", "Xyzzyq"), ("sie", "PRON", "PPER", "sie"), ("ich", "PRON", "PPER", "ich"),
+    ("ist", "AUX", "VAFIN", "sein"), ("macht", "VERB", "VVFIN", "machen"), ("gegessen", "VERB", "VVPP", "essen"),
+    ("reif", "ADJ", "ADJD", "reif"), ("tolle", "ADJ", "ADJA", "toll"), ("die", "DET", "ART", "der"),
+    ("eine", "DET", "ART", "ein"), ("und", "CCONJ", "KON", "und"), ("aber", "CCONJ", "KON", "aber"),
+    ("weil", "SCONJ", "KOUS", "weil"), ("als", "SCONJ", "KOKOM", "als"), ("ob", "SCONJ", "KOUS", "ob"),
+    ("entweder", "CCONJ", "KON", "entweder"), ("oder", "CCONJ", "KON", "oder"),
+    ("abgesehen", "ADV", "ADV", "abgesehen"), ("davon", "ADV", "PAV", "davon"), ("2023", "NUM", "CARD", "2023"),
+    (",", "PUNCT", "$,", ",")
+]
+MORPHS = {"VVFIN": "Mood=Ind|Tense=Pres|VerbForm=Fin", "VAFIN": "Mood=Ind|Tense=Pres|VerbForm=Fin",
+          "VVPP": "VerbForm=Part"}
+LABELS = ["nk", "sb", "oa", "mo", "cj", "cd", "da", "app", "pd"]
+
+
+def create_random_doc(vocab, number_of_sentences, seed):
+    """Creates a parsed doc with random words and a random (also non-projective) tree per sentence."""
+    rng = random.Random(seed)
+    words, pos, tags, deps, heads, lemmas, morphs = [], [], [], [], [], [], []
+    for _ in range(number_of_sentences):
+        start = len(words)
+        length = rng.randint(1, 12)
+        root = start + rng.randrange(length)
+        for position in range(start, start + length):
+            word = rng.choice(WORDS)
+            words.append(word[0])
+            pos.append(word[1])
+            tags.append(word[2])
+            lemmas.append(word[3])
+            morphs.append(MORPHS.get(word[2], ""))
+            if position == root:
+                heads.append(position)
+                deps.append("ROOT")
+            else:
+                # an earlier token on the way to the root, so the tree has no cycles
+                heads.append(rng.randint(position + 1, root) if position < root else rng.randint(root, position - 1))
+                deps.append(rng.choice(LABELS))
+        words.append(".")
+        pos.append("PUNCT")
+        tags.append("$.")
+        lemmas.append(".")
+        morphs.append("")
+        heads.append(root)
+        deps.append("punct")
+    return Doc(vocab, words=words, pos=pos, tags=tags, deps=deps, heads=heads, lemmas=lemmas, morphs=morphs)
+
+
+def create_non_projective_doc(vocab):
+    """"Ich habe eine Banane gegessen, die reif ist." with the relative clause
+    attached to "Banane", its arc crosses the arc from "habe" to "gegessen"."""
+    words = ["Ich", "habe", "eine", "Banane", "gegessen", ",", "die", "reif", "ist", "."]
+    pos = ["PRON", "AUX", "DET", "NOUN", "VERB", "PUNCT", "PRON", "ADJ", "AUX", "PUNCT"]
+    tags = ["PPER", "VAFIN", "ART", "NN", "VVPP", "$,", "PRELS", "ADJD", "VAFIN", "$."]
+    heads = [1, 1, 3, 4, 1, 8, 8, 8, 3, 1]
+    deps = ["sb", "ROOT", "nk", "oa", "oc", "punct", "sb", "pd", "rc", "punct"]
+    morphs = ["", "Mood=Ind|Tense=Pres|VerbForm=Fin", "", "", "VerbForm=Part", "", "", "",
+              "Mood=Ind|Tense=Pres|VerbForm=Fin", ""]
+    return Doc(vocab, words=words, pos=pos, tags=tags, deps=deps, heads=heads, morphs=morphs,
+               lemmas=[word.lower() for word in words])
+
+
+def create_doc_without_parse(vocab, sentence_boundaries):
+    """A tagged doc without a dependency parse, with or without sentence boundaries."""
+    words = ["Die", "Banane", "ist", "reif", ",", "als", "ob", "sie", "gegessen", "ist", ".",
+             "Entweder", "ich", "oder", "sie", "."]
+    pos = ["DET", "NOUN", "AUX", "ADJ", "PUNCT", "SCONJ", "SCONJ", "PRON", "VERB", "AUX", "PUNCT",
+           "CCONJ", "PRON", "CCONJ", "PRON", "PUNCT"]
+    tags = ["ART", "NN", "VAFIN", "ADJD", "$,", "KOKOM", "KOUS", "PPER", "VVPP", "VAFIN", "$.",
+            "KON", "PPER", "KON", "PPER", "$."]
+    sent_starts = [word in ("Die", "Entweder") for word in words] if sentence_boundaries else None
+    return Doc(vocab, words=words, pos=pos, tags=tags, sent_starts=sent_starts,
+               lemmas=[word.lower() for word in words])
+
+
+DOCS = ["random_" + str(seed) for seed in range(40)] + ["pipeline", "non_projective", "sentences_without_parse",
+                                                         "without_sentence_boundaries", "empty"]
+
+
+@pytest.fixture(params=DOCS)
+def doc(request, nlp):
+    if request.param.startswith("random_"):
+        return create_random_doc(nlp.vocab, 1 + int(request.param[7:]) % 9, int(request.param[7:]))
+    if request.param == "pipeline":
+        return nlp("Die Banane ist reif, als ob sie gegessen ist. Der Mann macht eine Gurke, aber sie ist reif.")
+    if request.param == "non_projective":
+        return create_non_projective_doc(nlp.vocab)
+    if request.param == "empty":
+        return nlp.make_doc("")
+    return create_doc_without_parse(nlp.vocab, request.param == "sentences_without_parse")
+
+
+def test_statistics_of_the_backends_are_equal(doc):
+    assert count_doc_statistics_from_array(doc) == count_doc_statistics(doc)
+
+
+def test_noun_phrases_of_the_backends_are_equal(doc):
+    if not doc.has_annotation("DEP"):
+        for count in (count_noun_phrases, count_noun_phrases_from_array):
+            with pytest.raises(ValueError):
+                count(doc)
+        return
+    assert count_noun_phrases_from_array(doc) == count_noun_phrases(doc)
+
+
+def test_discourse_markers_of_the_backends_are_equal(doc, discourse_marker):
+    matcher = discourse_marker["matcher"]
+    assert match_discourse_markers_from_array(doc, matcher) == match_discourse_markers(doc, matcher)
+
+
+def test_features_of_the_backends_are_equal(doc, nlp, log_rank_table, discourse_marker):
+    if not len(doc):
+        pytest.skip("empty docs are rejected by validate_parsed_doc before the features are calculated")
+    if not doc.has_annotation("DEP"):
+        # the syntactic features need the parse
+        groups = ["surface", "pos_tags", "lexical", "verb_tense", "semantic_similarity", "discourse",
+                  "discourse_marker_senses"]
+    else:
+        groups = None
+    features = calculate_features(doc, nlp, log_rank_table, discourse_marker, "python", groups)
+    doc.user_data.clear()
+    assert calculate_features(doc, nlp, log_rank_table, discourse_marker, "array", groups) == features
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+import extract_features
+from extract_features import generate_features, create_run_options
+from utils_and_preprocess.utils import split_text_into_chunks
+
+PARAGRAPHS = ["Die Banane ist reif. Der Mann macht eine große Gurke, weil sie reif ist.",
+              "Ich geht mit der Banane in die Gurke. Sie sind tolle Bananen.",
+              "Aber der Mann ist reif, obwohl die Gurke 2023 gegessen ist."]
+TEXT = "\n\n".join(PARAGRAPHS)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 40, 80, len(TEXT)])
+def test_chunks_cover_the_text(chunk_size):
+    chunks = split_text_into_chunks(TEXT, chunk_size)
+    assert "".join(chunks) == TEXT
+    assert all(0 < len(chunk) <= chunk_size for chunk in chunks)
+
+
+@pytest.mark.parametrize("chunk_size", [0, -1])
+def test_chunk_size_must_be_positive(chunk_size):
+    with pytest.raises(ValueError):
+        split_text_into_chunks(TEXT, chunk_size)
+
+
+def test_chunked_document_equals_whole_document(nlp, log_rank_table, discourse_marker):
+    whole = dict(generate_features([(TEXT, "long.txt")], nlp, log_rank_table, discourse_marker))
+    chunked = dict(generate_features([(TEXT, "long.txt")], nlp, log_rank_table, discourse_marker,
+                                     options=create_run_options(chunk_size=len(PARAGRAPHS[0]) + 10)))
+    np.testing.assert_allclose(np.array(chunked["long.txt"], dtype=float),
+                               np.array(whole["long.txt"], dtype=float), rtol=1e-6, atol=1e-9)
+
+
+def test_document_with_an_invalid_chunk_is_reported(nlp, log_rank_table, discourse_marker, monkeypatch, capsys):
+    validate_text = extract_features.validate_text
+    monkeypatch.setattr(extract_features, "validate_text",
+                        lambda text, nlp: validate_text(text, nlp) and "2023" not in text)
+    documents = [(TEXT, "long.txt"), (PARAGRAPHS[0], "short.txt")]
+    features = dict(generate_features(documents, nlp, log_rank_table, discourse_marker,
+                                      options=create_run_options(chunk_size=len(PARAGRAPHS[0]) + 10)))
+    assert list(features) == ["short.txt"]
+    assert "The file long.txt is invalid." in capsys.readouterr().out
@@ -0,0 +1,39 @@
+import pytest
+
+from features.discourse_features import find_discourse_markers, get_average_count_of_discourse_markers_per_sentence, \
+    get_count_for_discourse_marker_senses, DISCOURSE_MARKER_BACKENDS
+
+
+def get_matched_markers(doc, discourse_marker, backend):
+    return [tuple(marker_with_sense) for entry in DISCOURSE_MARKER_BACKENDS[backend](doc, discourse_marker["matcher"])
+            for marker_with_sense in entry["senses"]]
+
+
+@pytest.mark.parametrize("backend", sorted(DISCOURSE_MARKER_BACKENDS))
+def test_multi_word_marker_is_one_match(nlp, discourse_marker, backend):
+    doc = nlp("Abgesehen davon, dass die Banane reif ist, macht der Mann eine Gurke.")
+    matches = DISCOURSE_MARKER_BACKENDS[backend](doc, discourse_marker["matcher"])
+    assert matches == [discourse_marker["matcher"]["markers"][("abgesehen", "davon", ",", "dass")]]
+
+
+@pytest.mark.parametrize("backend", sorted(DISCOURSE_MARKER_BACKENDS))
+def test_overlapping_markers_match_the_longest(nlp, discourse_marker, backend):
+    # "als ob" is not also counted as "als" (Temporal.Synchronous) and "ob"
+    doc = nlp("Die Banane ist reif, als ob sie gegessen ist.")
+    assert get_matched_markers(doc, discourse_marker, backend) == \
+        [("als ob", "Comparison.Concession.Arg2-as-denier")]
+    assert get_average_count_of_discourse_markers_per_sentence(doc, discourse_marker["matcher"]) == 1
+    senses = get_count_for_discourse_marker_senses(doc, discourse_marker["sense_index"], discourse_marker["matcher"])
+    assert senses[discourse_marker["sense_index"]["Comparison.Concession.Arg2-as-denier"]] == 1
+    assert senses[discourse_marker["sense_index"]["Temporal.Synchronous"]] == 0
+    assert senses.sum() == 1
+
+
+@pytest.mark.parametrize("backend", sorted(DISCOURSE_MARKER_BACKENDS))
+def test_markers_with_a_gap_are_not_matched(nlp, discourse_marker, backend):
+    assert "entweder...oder" in discourse_marker["disc_marker"]
+    assert not any("..." in "".join(tokens) for tokens in discourse_marker["matcher"]["markers"])
+    # only "oder" is matched, not "entweder...oder"
+    doc = nlp("Entweder ich oder sie.")
+    assert get_matched_markers(doc, discourse_marker, backend) == [("oder", "Expansion.Disjunction")]
+    assert find_discourse_markers(doc, discourse_marker["matcher"]) == [("oder", "Expansion.Disjunction")]
@@ -0,0 +1,71 @@
+import json
+
+import numpy as np
+import pytest
+
+from extract_features import get_document_id, read_documents, generate_features_for_all_docs, \
+    generate_features_from_parses, generate_features, calculate_features, create_run_options, get_parse_components
+from utils_and_preprocess.parse_store import open_parse_store, add_parsed_doc, close_parse_store
+from utils_and_preprocess.feature_cache import open_feature_cache, save_features, get_cached_features, \
+    close_feature_cache
+from utils_and_preprocess.utils import convert_to_python_numbers
+
+# names which lose more than the extension with str.strip(".txt")
+NAMES = ["text.txt", "tt.txt", "xtext.txt", "a.b.txt"]
+TEXT = "Die Banane ist reif. Der Mann macht eine große Gurke."
+
+
+@pytest.mark.parametrize("name, document_id", [("text.txt", "text"), ("tt.txt", "tt"), ("xtext.txt", "xtext"),
+                                               ("a.b.txt", "a.b"), (".txt", ""), ("text", "text")])
+def test_document_id_removes_only_the_extension(name, document_id):
+    assert get_document_id(name) == document_id
+
+
+@pytest.fixture
+def directory(tmp_path):
+    for name in NAMES + ["notes.md"]:
+        (tmp_path / name).write_text(TEXT, encoding="utf-8")
+    return str(tmp_path) + "/"
+
+
+def test_read_documents_skips_the_ids(directory):
+    names = [name for _, name in read_documents(directory, skip_ids={"tt", "a.b"})]
+    assert sorted(names) == ["text.txt", "xtext.txt"]
+
+
+def test_features_have_the_document_ids(directory, nlp, log_rank_table, discourse_marker):
+    options = create_run_options(groups=["surface"], skip_ids={"tt"})
+    ids = [document_id for document_id, _ in generate_features_for_all_docs(directory, nlp, log_rank_table,
+                                                                             discourse_marker, options=options)]
+    assert sorted(ids) == ["a.b", "text", "xtext"]
+
+
+def test_features_from_parses_have_the_document_ids(tmp_path, nlp, log_rank_table, discourse_marker):
+    parse_store = open_parse_store(str(tmp_path), get_parse_components(["surface"]))
+    for name in NAMES:
+        add_parsed_doc(parse_store, nlp(TEXT), name)
+    close_parse_store(parse_store)
+    options = create_run_options(groups=["surface"], skip_ids={"tt"})
+    ids = [document_id for document_id, _ in generate_features_from_parses(str(tmp_path), nlp, log_rank_table,
+                                                                            discourse_marker, options=options)]
+    assert sorted(ids) == ["a.b", "text", "xtext"]
+
+
+def test_numpy_numbers_keep_their_values():
+    feature_vector = convert_to_python_numbers([np.float32(0.1), np.int64(3), np.float64(0.5), 2, 0.25])
+    assert feature_vector == [float(np.float32(0.1)), 3, 0.5, 2, 0.25]
+    assert [type(value) for value in feature_vector] == [float, int, float, int, float]
+
+
+def test_feature_vectors_are_saved_unchanged(tmp_path, nlp, log_rank_table, discourse_marker):
+    text = TEXT + "\n\nSie ist reif, als ob die Gurke gegessen ist."
+    vectors = [calculate_features(nlp(text), nlp, log_rank_table, discourse_marker),
+               dict(generate_features([(text, "long.txt")], nlp, log_rank_table, discourse_marker,
+                                      options=create_run_options(chunk_size=len(TEXT) + 2)))["long.txt"]]
+    feature_cache = open_feature_cache(str(tmp_path), "fingerprint")
+    for index, feature_vector in enumerate(vectors):
+        assert all(type(value) in (int, float) for value in feature_vector)
+        assert json.loads(json.dumps(feature_vector)) == feature_vector
+        save_features(feature_cache, str(index), feature_vector)
+        assert get_cached_features(feature_cache, str(index)) == feature_vector
+    close_feature_cache(feature_cache)
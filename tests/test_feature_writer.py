@@ -0,0 +1,86 @@
+import pytest
+
+from utils_and_preprocess.feature_writer import open_feature_writer, write_feature_row, close_feature_writer, \
+    create_feature_row, SPOOL_SUFFIX, MANIFEST_SUFFIX
+
+HEADER = ["#id", "a", "b"]
+FLUSH_INTERVAL = 10
+ROWS = [create_feature_row(f"d{index:03d}", [index / 7, index]) for index in range(50)]
+
+
+def write_rows(feature_writer, rows):
+    completed_ids = feature_writer["completed_ids"]
+    for row in rows:
+        if row[0] not in completed_ids:
+            write_feature_row(feature_writer, row, row[0])
+
+
+def kill_feature_writer(output_path, sort_rows, rows):
+    """Writes the rows and stops like a killed run: the writer is not closed
+    and the written file and the manifest end with a torn line."""
+    feature_writer = open_feature_writer(output_path, HEADER, sort_rows, flush_interval=FLUSH_INTERVAL)
+    write_rows(feature_writer, rows)
+    feature_writer["file"].write('["d999", ["d999", 0.1')
+    feature_writer["file"].close()
+    feature_writer["manifest_file"].write('{"ids": ["d999"')
+    feature_writer["manifest_file"].close()
+
+
+def read_files(output_path, sort_rows):
+    path = output_path + SPOOL_SUFFIX if sort_rows else output_path
+    with open(path, "rb") as file, open(output_path + MANIFEST_SUFFIX, "rb") as manifest_file:
+        return file.read(), manifest_file.read()
+
+
+@pytest.mark.parametrize("sort_rows", [True, False])
+def test_resumed_run_equals_an_uninterrupted_run(tmp_path, sort_rows):
+    output_path = str(tmp_path / "features.csv")
+    # the rows are written in reverse order, so that the sorted output differs
+    rows = ROWS[::-1]
+    kill_feature_writer(output_path, sort_rows, rows[:25])
+    feature_writer = open_feature_writer(output_path, HEADER, sort_rows, flush_interval=FLUSH_INTERVAL,
+                                         resume=True)
+    # only the flushed rows were written, the rows after the last flush and the torn lines are dropped
+    assert feature_writer["completed_ids"] == {row[0] for row in rows[:20]}
+    write_rows(feature_writer, rows)
+    close_feature_writer(feature_writer)
+
+    # without sorting the resumed rows follow the 20 flushed rows in the order of the rows
+    reference_path = str(tmp_path / "reference.csv")
+    feature_writer = open_feature_writer(reference_path, HEADER, sort_rows)
+    write_rows(feature_writer, rows)
+    close_feature_writer(feature_writer)
+    with open(output_path, "r", encoding="utf-8") as output, open(reference_path, "r", encoding="utf-8") as reference:
+        assert output.read() == reference.read()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["features.csv", "reference.csv"]
+
+
+@pytest.mark.parametrize("sort_rows", [True, False])
+def test_run_with_another_header_is_not_resumed(tmp_path, sort_rows):
+    output_path = str(tmp_path / "features.csv")
+    kill_feature_writer(output_path, sort_rows, ROWS[:25])
+    written = read_files(output_path, sort_rows)
+    with pytest.raises(ValueError, match="header"):
+        open_feature_writer(output_path, HEADER + ["c"], sort_rows, resume=True)
+    with pytest.raises(ValueError, match="sort_rows"):
+        open_feature_writer(output_path, HEADER, not sort_rows, resume=True)
+    # the written rows of the killed run are not changed
+    assert read_files(output_path, sort_rows) == written
+
+
+def test_run_without_its_written_rows_is_not_resumed(tmp_path):
+    output_path = str(tmp_path / "features.csv")
+    kill_feature_writer(output_path, True, ROWS[:25])
+    (tmp_path / ("features.csv" + SPOOL_SUFFIX)).unlink()
+    with pytest.raises(ValueError, match="missing"):
+        open_feature_writer(output_path, HEADER, resume=True)
+
+
+def test_resume_without_a_manifest_starts_a_new_run(tmp_path):
+    output_path = str(tmp_path / "features.csv")
+    feature_writer = open_feature_writer(output_path, HEADER, resume=True)
+    assert feature_writer["completed_ids"] == set()
+    write_rows(feature_writer, ROWS[:3])
+    close_feature_writer(feature_writer)
+    with open(output_path, "r", encoding="utf-8") as output:
+        assert output.read().splitlines() == ["#id,a,b", "d000,0.0,0", "d001,0.142857,1", "d002,0.285714,2"]
@@ -0,0 +1,76 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from features.lexical_features import create_log_rank_table, get_log_ranks, calculate_lexical_complexity_score, \
+    load_log_rank_table, hash_token_freq_file
+
+# tied frequencies, a key which is the prefix of another key and keys with multi-byte characters
+TOKENS_FREQ = {"der": 9, "sein": 9, "banane": 5, "ban": 5, "essen": 5, "mann": 3, "größe": 3, "reif": 1,
+               "übermäßig": 1}
+
+
+def get_log_ranks_from_list(tokens, tokens_freq):
+    """The former lookup: the rank of a token is the position of the first token
+    with the same frequency in the frequency table (list.index)."""
+    log_ranks = np.log(np.arange(1, len(tokens_freq) + 1))
+    tokens_freq_sentence = {token: tokens_freq[token] for token in tokens if token in tokens_freq}
+    return [log_ranks[list(tokens_freq.values()).index(freq)] for freq in tokens_freq_sentence.values()]
+
+
+@pytest.mark.parametrize("tokens", [
+    ["der", "sein", "banane", "essen", "reif"],
+    ["sein", "sein", "ban", "banane", "übermäßig", "größe", "mann"],
+    ["unbekannt", "der", "ba", "bananen", "x"],
+    ["übermäßigübermäßigübermäßig", "reif"],
+    ["unbekannt"],
+    []
+])
+def test_log_ranks_equal_the_list_lookup(tokens):
+    log_ranks = get_log_ranks(tokens, create_log_rank_table(TOKENS_FREQ))
+    assert log_ranks.tolist() == get_log_ranks_from_list(tokens, TOKENS_FREQ)
+
+
+def test_tied_frequencies_get_the_rank_of_the_first_token():
+    log_rank_table = create_log_rank_table(TOKENS_FREQ)
+    assert get_log_ranks(["sein"], log_rank_table).tolist() == [0.0]
+    assert get_log_ranks(["essen"], log_rank_table).tolist() == [np.log(3)]
+    assert get_log_ranks(["übermäßig"], log_rank_table).tolist() == [np.log(8)]
+
+
+def test_lexical_complexity_score_equals_the_list_lookup(nlp):
+    log_rank_table = create_log_rank_table(TOKENS_FREQ)
+    doc = nlp("Die Banane ist reif. Der Mann macht eine große Gurke, weil sie reif ist. Sie sind 2023 gegessen.")
+    tokens = [tok.lemma_.lower() for tok in doc if not tok.is_punct]
+    assert calculate_lexical_complexity_score(doc, log_rank_table) == \
+        np.percentile(get_log_ranks_from_list(tokens, TOKENS_FREQ), 75)
+
+
+def get_table_paths(directory):
+    return [str(directory / name) for name in ("keys.npy", "log_ranks.npy", "table.sha256", "token_freq.json")]
+
+
+def test_log_rank_table_is_generated_at_the_first_use(tmp_path):
+    paths = get_table_paths(tmp_path)
+    (tmp_path / "token_freq.json").write_text(json.dumps(TOKENS_FREQ), encoding="utf-8")
+    log_rank_table = load_log_rank_table(*paths)
+    assert isinstance(log_rank_table["keys"], np.memmap)
+    assert (tmp_path / "table.sha256").read_text(encoding="utf-8") == hash_token_freq_file(paths[3])
+    assert get_log_ranks(["reif", "sein"], log_rank_table).tolist() == [np.log(8), 0.0]
+    assert sorted(os.listdir(tmp_path)) == ["keys.npy", "log_ranks.npy", "table.sha256", "token_freq.json"]
+
+
+def test_log_rank_table_is_generated_again_if_the_hash_differs(tmp_path):
+    paths = get_table_paths(tmp_path)
+    (tmp_path / "token_freq.json").write_text(json.dumps(TOKENS_FREQ), encoding="utf-8")
+    load_log_rank_table(*paths)
+    # a newer json file with the same content does not generate the table again
+    generated = os.stat(paths[0]).st_mtime_ns
+    os.utime(paths[3], ns=(generated + 10 ** 9, generated + 10 ** 9))
+    load_log_rank_table(*paths)
+    assert os.stat(paths[0]).st_mtime_ns == generated
+
+    (tmp_path / "token_freq.json").write_text(json.dumps({"reif": 2, **TOKENS_FREQ}), encoding="utf-8")
+    assert get_log_ranks(["reif", "sein"], load_log_rank_table(*paths)).tolist() == [0.0, np.log(2)]
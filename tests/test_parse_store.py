@@ -0,0 +1,60 @@
+from utils_and_preprocess.feature_cache import hash_text
+from utils_and_preprocess.parse_store import open_parse_store, add_doc_bin, add_parsed_doc, close_parse_store, \
+    read_parsed_docs, read_parse_store_index, create_doc_bin
+
+TEXTS = {"a.txt": "Die Banane ist reif.", "b.txt": "Der Mann macht eine Gurke.", "c.txt": "Ich geht mit der Banane.",
+         "d.txt": "Sie sind tolle Bananen."}
+
+
+def create_doc_bin_bytes(nlp, documents):
+    """Serializes the parsed documents like a worker process, see extract_features.extract_features_for_shard."""
+    doc_bin = create_doc_bin()
+    names = []
+    for name, text in documents:
+        doc = nlp(text)
+        doc_bin.add(doc)
+        names.append((name, hash_text(doc.text)))
+    return doc_bin.to_bytes(), names
+
+
+def read_store(store_dir, nlp):
+    documents = dict()
+    for doc, name in read_parsed_docs(store_dir, nlp.vocab):
+        # the annotations are kept, also of the documents read with an empty vocab in add_doc_bin
+        parsed = nlp(doc.text)
+        assert [(tok.pos_, tok.lemma_, tok.dep_, tok.head.i) for tok in doc] == \
+            [(tok.pos_, tok.lemma_, tok.dep_, tok.head.i) for tok in parsed]
+        documents[name] = doc.text
+    return documents
+
+
+def test_doc_bins_store_every_document_once(tmp_path, nlp):
+    parse_store = open_parse_store(str(tmp_path), shard_size=100)
+    add_parsed_doc(parse_store, nlp(TEXTS["a.txt"]), "a.txt")
+    # all documents are new, the DocBin is merged as a whole
+    add_doc_bin(parse_store, *create_doc_bin_bytes(nlp, [("b.txt", TEXTS["b.txt"])]))
+    # a and b are already stored, d is twice in the DocBin
+    add_doc_bin(parse_store, *create_doc_bin_bytes(nlp, [("a.txt", TEXTS["a.txt"]), ("c.txt", TEXTS["c.txt"]),
+                                                         ("d.txt", TEXTS["d.txt"]), ("b.txt", TEXTS["b.txt"]),
+                                                         ("d.txt", TEXTS["d.txt"])]))
+    close_parse_store(parse_store)
+    assert [entry["name"] for entry in read_parse_store_index(str(tmp_path))] == ["a.txt", "b.txt", "c.txt", "d.txt"]
+    assert read_store(str(tmp_path), nlp) == TEXTS
+
+
+def test_doc_bins_of_a_reopened_store(tmp_path, nlp):
+    parse_store = open_parse_store(str(tmp_path), shard_size=2)
+    add_doc_bin(parse_store, *create_doc_bin_bytes(nlp, [("a.txt", TEXTS["a.txt"]), ("b.txt", TEXTS["b.txt"])]))
+    close_parse_store(parse_store)
+
+    # a changed text of a stored document is stored again and read instead of the old parse
+    parse_store = open_parse_store(str(tmp_path), shard_size=2)
+    add_doc_bin(parse_store, *create_doc_bin_bytes(nlp, [("b.txt", TEXTS["b.txt"]), ("a.txt", TEXTS["c.txt"]),
+                                                         ("c.txt", TEXTS["c.txt"])]))
+    close_parse_store(parse_store)
+    index = read_parse_store_index(str(tmp_path))
+    assert [(entry["name"], entry["shard"]) for entry in index] == \
+        [("a.txt", "parses_00000.spacy"), ("b.txt", "parses_00000.spacy"),
+         ("a.txt", "parses_00001.spacy"), ("c.txt", "parses_00001.spacy")]
+    assert read_store(str(tmp_path), nlp) == {"a.txt": TEXTS["c.txt"], "b.txt": TEXTS["b.txt"],
+                                              "c.txt": TEXTS["c.txt"]}
@@ -0,0 +1,118 @@
+import itertools
+import random
+
+import pytest
+
+from constants import SEMANTIC_SIMILARITY_FEATURES, SEMANTIC_SIMILARITY_INTERVAL_FEATURES
+from extract_features import calculate_features, generate_features, get_output_features, create_run_options
+from features.semantic_similarity_features import calculate_average_semantic_similarity, \
+    calculate_linear_average_semantic_similarity, sample_average_semantic_similarity, create_similarity_options, \
+    SIMILARITY_SAMPLE_BUDGET, SIMILARITY_SEED
+
+TEXT = "Die Banane ist reif. Der Mann macht eine große Gurke, weil sie reif ist.\n\n" \
+       "Ich geht mit der Banane in die Gurke. Sie sind tolle Bananen, aber der Mann ist reif."
+
+
+def create_list_of_lemmas(nlp, number_of_lemmas, seed=0):
+    """Draws the lemmas with a vector and a lemma without a vector."""
+    lemmas = sorted(nlp.vocab.strings[key] for key in nlp.vocab.vectors.keys()) + ["Xyzzy"]
+    return random.Random(seed).choices(lemmas, k=number_of_lemmas)
+
+
+def calculate_pairwise_semantic_similarity(list_of_lemmas, nlp):
+    """The average of the former loop over all pairs with Token.similarity (float32)."""
+    pairs = list(itertools.combinations(list_of_lemmas, 2))
+    sem_sim = 0.0
+    for first, second in pairs:
+        tokens = nlp.make_doc(f"{first} {second}")
+        if tokens[0].has_vector and tokens[1].has_vector:
+            sem_sim += tokens[0].similarity(tokens[1])
+    return sem_sim / len(pairs) if pairs else 0.0
+
+
+@pytest.mark.parametrize("list_of_lemmas", [
+    [],
+    ["Banane"],
+    ["Xyzzy"],
+    ["Banane", "Gurke"],
+    ["Banane", "Banane", "Banane"],
+    ["Banane", "Xyzzy", "Xyzzy", "Gurke"],
+    ["Mann", "Banane", "Mann", "Gurke", "Xyzzy", "Mann", "Jahr", "Banane"]
+])
+def test_exact_equals_pairwise_similarity(nlp, list_of_lemmas):
+    assert calculate_average_semantic_similarity(list_of_lemmas, nlp) == \
+        pytest.approx(calculate_pairwise_semantic_similarity(list_of_lemmas, nlp), abs=1e-6)
+
+
+def test_exact_equals_pairwise_similarity_of_many_lemmas(nlp):
+    list_of_lemmas = create_list_of_lemmas(nlp, 120)
+    assert calculate_average_semantic_similarity(list_of_lemmas, nlp) == \
+        pytest.approx(calculate_pairwise_semantic_similarity(list_of_lemmas, nlp), abs=1e-6)
+
+
+@pytest.mark.parametrize("number_of_lemmas", [0, 1, 2, 17, 500])
+def test_linear_equals_exact(nlp, number_of_lemmas):
+    list_of_lemmas = create_list_of_lemmas(nlp, number_of_lemmas)
+    assert calculate_linear_average_semantic_similarity(list_of_lemmas, nlp) == \
+        pytest.approx(calculate_average_semantic_similarity(list_of_lemmas, nlp), abs=1e-6)
+
+
+def test_sampled_interval_contains_exact(nlp):
+    list_of_lemmas = create_list_of_lemmas(nlp, 500)
+    exact = calculate_average_semantic_similarity(list_of_lemmas, nlp)
+    estimate = sample_average_semantic_similarity(list_of_lemmas, nlp, SIMILARITY_SAMPLE_BUDGET, SIMILARITY_SEED)
+    assert estimate["sampled"] and estimate["pairs"] == SIMILARITY_SAMPLE_BUDGET
+    assert estimate["low"] <= exact <= estimate["high"]
+    assert estimate["low"] < estimate["mean"] < estimate["high"]
+    assert sample_average_semantic_similarity(list_of_lemmas, nlp, SIMILARITY_SAMPLE_BUDGET,
+                                              SIMILARITY_SEED) == estimate
+
+
+def test_sampled_intervals_cover_exact_in_most_samples(nlp):
+    list_of_lemmas = create_list_of_lemmas(nlp, 500)
+    exact = calculate_average_semantic_similarity(list_of_lemmas, nlp)
+    estimates = [sample_average_semantic_similarity(list_of_lemmas, nlp, budget=2000, seed=seed)
+                 for seed in range(200)]
+    coverage = sum(estimate["low"] <= exact <= estimate["high"] for estimate in estimates) / len(estimates)
+    assert 0.9 <= coverage <= 0.99
+
+
+def test_sampled_is_exact_within_the_budget(nlp):
+    list_of_lemmas = create_list_of_lemmas(nlp, 40)
+    exact = calculate_average_semantic_similarity(list_of_lemmas, nlp)
+    estimate = sample_average_semantic_similarity(list_of_lemmas, nlp, budget=780)
+    assert not estimate["sampled"]
+    assert estimate["low"] == estimate["mean"] == estimate["high"] == exact
+
+
+@pytest.mark.parametrize("mode, budget", [("approximate", 100), ("sampled", 1)])
+def test_invalid_similarity_options(mode, budget):
+    with pytest.raises(ValueError):
+        create_similarity_options(mode, budget)
+
+
+def test_features_have_the_intervals_in_the_mode_sampled(nlp, log_rank_table, discourse_marker):
+    groups = ["surface", "semantic_similarity"]
+    similarity = create_similarity_options("sampled", budget=2)
+    columns = get_output_features(groups, similarity)
+    assert columns[-len(SEMANTIC_SIMILARITY_INTERVAL_FEATURES):] == SEMANTIC_SIMILARITY_INTERVAL_FEATURES
+    assert get_output_features(groups, create_similarity_options("linear")) == \
+        columns[:-len(SEMANTIC_SIMILARITY_INTERVAL_FEATURES)]
+
+    features = dict(zip(columns, calculate_features(nlp(TEXT), nlp, log_rank_table, discourse_marker,
+                                                    groups=groups, similarity=similarity)))
+    assert len(features) == len(columns)
+    for feature in SEMANTIC_SIMILARITY_FEATURES:
+        assert features[f"{feature}_low"] <= features[feature] <= features[f"{feature}_high"]
+
+
+def test_chunked_documents_have_exact_intervals(nlp, log_rank_table, discourse_marker):
+    groups = ["semantic_similarity"]
+    similarity = create_similarity_options("sampled", budget=2)
+    columns = get_output_features(groups, similarity)
+    options = create_run_options(groups=groups, similarity=similarity, chunk_size=TEXT.index("\n\n") + 2)
+    chunked = dict(generate_features([(TEXT, "long.txt")], nlp, log_rank_table, discourse_marker, options=options))
+    features = dict(zip(columns, chunked["long.txt"]))
+    assert len(chunked["long.txt"]) == len(columns)
+    for feature in SEMANTIC_SIMILARITY_FEATURES:
+        assert features[f"{feature}_low"] == features[feature] == features[f"{feature}_high"]
@@ -0,0 +1,128 @@
+# A persistent cache for the extracted feature vectors of documents, stored in
+# a SQLite database in a cache directory. A vector is stored under the hash of
+# the text and a fingerprint of everything the features depend on: the spacy
+# model (name and version), the feature set (FEATURES and FEATURES_VERSION in
+# constants.py) and the lookup tables. Documents with a cached vector skip the
+# parsing and the feature extraction, a changed model, feature set or table
+# changes the fingerprint, so old vectors are not used anymore.
+import json
+import sqlite3
+import hashlib
+import threading
+
+from pathlib import Path
+
+CACHE_FILE_NAME = "feature_cache.sqlite"
+# number of saved vectors after which the changes are committed
+COMMIT_INTERVAL = 100
+
+
+def hash_text(text):
+    """Returns the sha256 hash of the text.
+    :param text: str
+    :return: str """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def create_fingerprint(model_name, model_version, features, features_version, table_paths, similarity=None,
+                       components=None):
+    """Creates a fingerprint of the spacy model and its pipeline components, the
+    feature set, the contents of the lookup tables and the mode of the semantic
+    similarity (if it is not "exact", so that the cache of an exact run stays
+    valid). The sentence boundaries of the senter and the parser can differ.
+    :param model_name: str
+    :param model_version: str
+    :param features: list of feature names
+    :param features_version: int
+    :param table_paths: list of paths (str) of the lookup tables, missing
+                        (generated) tables are hashed by their path
+    :param similarity: dict or None, see features.semantic_similarity_features.create_similarity_options
+    :param components: list of the names of the pipeline components or None
+    :return: str """
+    fingerprint = hashlib.sha256()
+    settings = [model_name, model_version, features, features_version]
+    if components is not None:
+        settings.append(sorted(components))
+    if similarity is not None and similarity["mode"] != "exact":
+        settings.append(similarity)
+    fingerprint.update(json.dumps(settings).encode("utf-8"))
+    for table_path in table_paths:
+        if Path(table_path).exists():
+            fingerprint.update(Path(table_path).read_bytes())
+        else:
+            fingerprint.update(f"missing:{table_path}".encode("utf-8"))
+    return fingerprint.hexdigest()
+
+
+def open_feature_cache(cache_dir, fingerprint):
+    """Opens (and creates) the feature cache in the cache directory.
+    :param cache_dir: str
+    :param fingerprint: str, see create_fingerprint
+    :return: dict """
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    # the documents are filtered in the task thread of the worker pool while the
+    # main thread saves the vectors, so the connection is shared with a lock
+    connection = sqlite3.connect(Path(cache_dir) / CACHE_FILE_NAME, check_same_thread=False)
+    connection.execute("CREATE TABLE IF NOT EXISTS features ("
+                       "text_hash TEXT, fingerprint TEXT, vector TEXT, "
+                       "PRIMARY KEY (text_hash, fingerprint))")
+    return {"connection": connection, "lock": threading.Lock(), "fingerprint": fingerprint, "uncommitted": 0}
+
+
+def get_cached_features(feature_cache, text_hash):
+    """Returns the cached feature vector for the text hash or None.
+    :param feature_cache: dict, see open_feature_cache
+    :param text_hash: str, see hash_text
+    :return: list of numbers or None """
+    with feature_cache["lock"]:
+        row = feature_cache["connection"].execute(
+            "SELECT vector FROM features WHERE text_hash = ? AND fingerprint = ?",
+            (text_hash, feature_cache["fingerprint"])).fetchone()
+    if row is None:
+        return None
+    return json.loads(row[0])
+
+
+def save_features(feature_cache, text_hash, feature_vector):
+    """Saves the feature vector for the text hash.
+    :param feature_cache: dict, see open_feature_cache
+    :param text_hash: str, see hash_text
+    :param feature_vector: list of python numbers, see utils_and_preprocess.utils.convert_to_python_numbers
+    """
+    with feature_cache["lock"]:
+        feature_cache["connection"].execute(
+            "INSERT OR REPLACE INTO features VALUES (?, ?, ?)",
+            (text_hash, feature_cache["fingerprint"], json.dumps(list(feature_vector))))
+        feature_cache["uncommitted"] += 1
+        if feature_cache["uncommitted"] >= COMMIT_INTERVAL:
+            feature_cache["connection"].commit()
+            feature_cache["uncommitted"] = 0
+
+
+def close_feature_cache(feature_cache):
+    """Commits the saved vectors and closes the feature cache.
+    :param feature_cache: dict, see open_feature_cache
+    """
+    with feature_cache["lock"]:
+        feature_cache["connection"].commit()
+        feature_cache["connection"].close()
+
+
+def filter_cached_documents(documents, feature_cache, results, text_hashes):
+    """Yields the documents which are not in the feature cache. The cached
+    feature vectors are added to results, the hashes of the not cached texts
+    to text_hashes, so that their vectors can be saved after the extraction.
+    :param documents: iterable of tuples (text, name)
+    :param feature_cache: dict, see open_feature_cache
+    :param results: dict with names as keys and feature vectors as values
+    :param text_hashes: dict with names as keys and text hashes as values
+    :return: generator of tuples (text, name)
+    """
+    for text, name in documents:
+        text_hash = hash_text(text)
+        feature_vector = get_cached_features(feature_cache, text_hash)
+        if feature_vector is not None:
+            results[name] = feature_vector
+        else:
+            text_hashes[name] = text_hash
+            yield text, name
@@ -0,0 +1,435 @@
+# Writes the extracted feature vectors while they are produced, so that the
+# results of a run are not only kept in memory. The rows are flushed to disk
+# every FLUSH_INTERVAL rows. If the rows should be sorted (the default, the
+# order of the CSV files before), they are written to a spool file next to the
+# output file together with a sort key. When the writer is closed, the spool
+# file is sorted in runs of RUN_SIZE rows and the sorted runs are merged into
+# the output file, so only one run has to fit in memory.
+# Without sorting, CSV rows are written directly to the output file in the
+# order in which they are produced.
+# Every flush is recorded in a manifest next to the output file: the ids of the
+# flushed rows and the size of the written file. The first line of the manifest
+# holds the settings of the writer (sorting, format, float type and header). A
+# killed run can be resumed with the same settings, the written file is cut back
+# to the size of the last flush, the recorded ids are skipped and the new rows
+# are appended. The manifest is removed when the writer is closed, before the
+# spool file.
+# Output formats (see OUTPUT_FORMATS):
+# csv: the values are rounded to 6 decimal places
+# parquet, arrow: a table with a string column for the id and a float32 or
+# float64 column for each other column of the header (needs pyarrow)
+# npy: a float32 or float64 matrix with the columns of the header without the
+# id, the ids are written line by line to an index file (ID_INDEX_SUFFIX)
+# The binary formats are written from the spool file when the writer is closed
+# (also without sorting), the values are not rounded.
+import os
+import csv
+import json
+import heapq
+import tempfile
+import numpy as np
+
+from pathlib import Path
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# suffix of the spool file with the unsorted rows and their sort keys
+SPOOL_SUFFIX = ".unsorted.jsonl"
+# suffix of the manifest with the ids of the written rows
+MANIFEST_SUFFIX = ".manifest.jsonl"
+# suffix of the id index of the npy format
+ID_INDEX_SUFFIX = ".ids.txt"
+# number of written rows after which the file is flushed
+FLUSH_INTERVAL = 100
+# number of rows which are sorted in memory per run of the external sort
+RUN_SIZE = 100000
+# number of rows which are written at once from the spool file to the output
+WRITE_BATCH_SIZE = 10000
+# the float types of the binary formats
+FLOAT_TYPES = ["float64", "float32"]
+
+
+def create_feature_row(row_id, feature_vector, labels=()):
+    """Creates the row of a feature vector.
+    :param row_id: str
+    :param feature_vector: list of numbers
+    :param labels: values written between the id and the features
+    :return: list """
+    row = [row_id]
+    row.extend(labels)
+    row.extend(feature_vector)
+    return row
+
+
+def open_csv_output(output_path, header, float_type, number_of_rows):
+    """Opens the CSV output and writes the header.
+    :param output_path: str
+    :param header: list of column names
+    :param float_type: not used
+    :param number_of_rows: not used
+    :return: dict """
+    file = open(output_path, "w", encoding="utf-8")
+    writer = csv.writer(file, delimiter=',')
+    writer.writerow(header)
+    return {"file": file, "writer": writer}
+
+
+def write_csv_rows(output, rows):
+    """Writes rows to the CSV output, the values are rounded to 6 decimal places.
+    :param output: dict, see open_csv_output
+    :param rows: list of rows, see create_feature_row
+    """
+    output["writer"].writerows([row[0]] + [round(i, 6) for i in row[1:]] for row in rows)
+
+
+def close_csv_output(output):
+    output["file"].close()
+
+
+def check_pyarrow():
+    if pyarrow is None:
+        raise ImportError("The parquet and arrow formats need pyarrow, install it with: pip install pyarrow")
+
+
+def open_arrow_output(output_path, header, float_type, number_of_rows, file_format="arrow"):
+    """Opens the Parquet or Arrow IPC output with a string column for the id and
+    float columns for the other columns of the header.
+    :param output_path: str
+    :param header: list of column names
+    :param float_type: "float64" or "float32"
+    :param number_of_rows: not used
+    :param file_format: "arrow" or "parquet"
+    :return: dict """
+    check_pyarrow()
+    value_type = pyarrow.float32() if float_type == "float32" else pyarrow.float64()
+    schema = pyarrow.schema([pyarrow.field(header[0], pyarrow.string())] +
+                            [pyarrow.field(name, value_type) for name in header[1:]])
+    if file_format == "parquet":
+        writer = pyarrow.parquet.ParquetWriter(output_path, schema)
+    else:
+        writer = pyarrow.ipc.new_file(output_path, schema)
+    return {"schema": schema, "writer": writer}
+
+
+def open_parquet_output(output_path, header, float_type, number_of_rows):
+    return open_arrow_output(output_path, header, float_type, number_of_rows, "parquet")
+
+
+def write_arrow_rows(output, rows):
+    """Writes rows as one record batch to the Parquet or Arrow IPC output.
+    :param output: dict, see open_arrow_output
+    :param rows: list of rows, see create_feature_row
+    """
+    columns = [pyarrow.array([str(row[0]) for row in rows], type=pyarrow.string())]
+    columns.extend(pyarrow.array([row[i] for row in rows], type=field.type)
+                   for i, field in enumerate(output["schema"]) if i > 0)
+    output["writer"].write_table(pyarrow.Table.from_arrays(columns, schema=output["schema"]))
+
+
+def close_arrow_output(output):
+    output["writer"].close()
+
+
+def open_npy_output(output_path, header, float_type, number_of_rows):
+    """Opens the npy output as a memory-mapped matrix with a row for each
+    written row and a column for each column of the header without the id. The
+    ids are written to the id index next to the matrix.
+    :param output_path: str
+    :param header: list of column names
+    :param float_type: "float64" or "float32"
+    :param number_of_rows: int
+    :return: dict """
+    matrix = np.lib.format.open_memmap(output_path, mode="w+", dtype=float_type,
+                                       shape=(number_of_rows, len(header) - 1))
+    return {"matrix": matrix, "position": 0,
+            "id_index": open(output_path + ID_INDEX_SUFFIX, "w", encoding="utf-8")}
+
+
+def write_npy_rows(output, rows):
+    """Writes rows to the npy matrix and their ids to the id index.
+    :param output: dict, see open_npy_output
+    :param rows: list of rows, see create_feature_row
+    """
+    position = output["position"]
+    output["matrix"][position:position + len(rows)] = [row[1:] for row in rows]
+    output["position"] += len(rows)
+    output["id_index"].writelines(f"{row[0]}\n" for row in rows)
+
+
+def close_npy_output(output):
+    output["matrix"].flush()
+    del output["matrix"]
+    output["id_index"].close()
+
+
+# functions to open, write rows to and close an output of each format
+OUTPUT_FORMATS = {
+    "csv": (open_csv_output, write_csv_rows, close_csv_output),
+    "parquet": (open_parquet_output, write_arrow_rows, close_arrow_output),
+    "arrow": (open_arrow_output, write_arrow_rows, close_arrow_output),
+    "npy": (open_npy_output, write_npy_rows, close_npy_output)
+}
+
+
+def create_writer_settings(header, sort_rows, output_format, float_type):
+    """Creates the settings of a writer, which are recorded in the manifest.
+    :param header: list of column names
+    :param sort_rows: bool
+    :param output_format: str, see OUTPUT_FORMATS
+    :param float_type: str, see FLOAT_TYPES
+    :return: dict """
+    return {"sort_rows": sort_rows, "output_format": output_format, "float_type": float_type,
+            "header": list(header)}
+
+
+def read_manifest(manifest_path):
+    """Reads the manifest of a killed run.
+    :param manifest_path: str
+    :return: tuple (dict of the settings of the writer or None, set of the ids
+        of the written rows, size of the written file at the last flush) """
+    settings = None
+    completed_ids = set()
+    size = 0
+    with open(manifest_path, "r", encoding="utf-8") as manifest_file:
+        for line in manifest_file:
+            # a line which was not written completely belongs to no flush
+            if not line.endswith("\n"):
+                break
+            checkpoint = json.loads(line)
+            if "settings" in checkpoint:
+                settings = checkpoint["settings"]
+                continue
+            completed_ids.update(checkpoint["ids"])
+            size = checkpoint["size"]
+    return settings, completed_ids, size
+
+
+def check_resumed_settings(settings, killed_settings, path):
+    """Checks that a killed run is resumed with the settings it was written with
+    and that its written file exists.
+    :param settings: dict, see create_writer_settings
+    :param killed_settings: dict or None, the settings in the manifest of the killed run
+    :param path: the path of the written file (the spool file or the CSV output)
+    :raise ValueError: if the run can not be resumed """
+    if killed_settings != settings:
+        killed_settings = killed_settings or dict()
+        differences = [key for key in settings if killed_settings.get(key) != settings[key]]
+        raise ValueError(f"The run can not be resumed, it was written with other settings "
+                         f"({', '.join(differences)}). Run it again without resume.")
+    if not os.path.exists(path):
+        raise ValueError(f"The run can not be resumed, its written rows ({path}) are missing. "
+                         f"Run it again without resume.")
+
+
+def open_feature_writer(output_path, header, sort_rows=True, flush_interval=FLUSH_INTERVAL, resume=False,
+                        output_format="csv", float_type="float64"):
+    """Opens the writer for the output file. With sort_rows or a binary output
+    format the rows are written to the spool file and written to the output
+    when the writer is closed. With resume and a manifest of a killed run (with
+    the same sort_rows and output_format) the rows are appended to the rows of
+    the killed run, else a new file is written. A manifest with other settings
+    (see create_writer_settings) is not resumed.
+    :param output_path: str
+    :param header: list of column names
+    :param sort_rows: bool
+    :param flush_interval: number of rows after which the file is flushed
+    :param resume: bool
+    :param output_format: "csv", "parquet", "arrow" or "npy", see OUTPUT_FORMATS
+    :param float_type: "float64" or "float32", the type of the binary formats
+    :return: dict, the ids of the rows of the killed run are in "completed_ids"
+    :raise ValueError: if the killed run can not be resumed, see check_resumed_settings """
+    if output_format in ("parquet", "arrow"):
+        check_pyarrow()
+    spool_rows = sort_rows or output_format != "csv"
+    path = output_path + SPOOL_SUFFIX if spool_rows else output_path
+    manifest_path = output_path + MANIFEST_SUFFIX
+    settings = create_writer_settings(header, sort_rows, output_format, float_type)
+    completed_ids = set()
+    resumed = resume and os.path.exists(manifest_path)
+    if resumed:
+        killed_settings, completed_ids, size = read_manifest(manifest_path)
+        check_resumed_settings(settings, killed_settings, path)
+        # remove the rows after the last flush, they are not in the manifest
+        with open(path, "r+b") as file:
+            file.truncate(size)
+        file = open(path, "a", encoding="utf-8")
+        # the manifest is replaced by the settings and one line for the killed
+        # run, so that a not completely written last line is removed
+        with open(manifest_path + ".tmp", "w", encoding="utf-8") as manifest_file:
+            write_settings(manifest_file, settings)
+            write_checkpoint(manifest_file, list(completed_ids), size)
+        os.replace(manifest_path + ".tmp", manifest_path)
+        manifest_file = open(manifest_path, "a", encoding="utf-8")
+    else:
+        file = open(path, "w", encoding="utf-8")
+        manifest_file = open(manifest_path, "w", encoding="utf-8")
+        write_settings(manifest_file, settings)
+
+    writer = None if spool_rows else csv.writer(file, delimiter=',')
+    if writer is not None and not resumed:
+        writer.writerow(header)
+    feature_writer = {
+        "output_path": output_path,
+        "header": header,
+        "sort_rows": sort_rows,
+        "spool_rows": spool_rows,
+        "output_format": output_format,
+        "float_type": float_type,
+        "flush_interval": flush_interval,
+        "file": file,
+        "writer": writer,
+        "manifest_file": manifest_file,
+        "completed_ids": completed_ids,
+        "unflushed_ids": []
+    }
+    flush_feature_writer(feature_writer)
+    return feature_writer
+
+
+def write_settings(manifest_file, settings):
+    """Writes the settings of the writer as the first line of the manifest.
+    :param manifest_file: file object
+    :param settings: dict, see create_writer_settings
+    """
+    manifest_file.write(json.dumps({"settings": settings}) + "\n")
+    manifest_file.flush()
+
+
+def write_checkpoint(manifest_file, ids, size):
+    """Writes a line of the manifest and flushes it.
+    :param manifest_file: file object
+    :param ids: list of the ids of the flushed rows
+    :param size: size of the written file after the flush
+    """
+    manifest_file.write(json.dumps({"ids": ids, "size": size}) + "\n")
+    manifest_file.flush()
+
+
+def flush_feature_writer(feature_writer):
+    """Flushes the written rows to disk and records them in the manifest.
+    :param feature_writer: dict, see open_feature_writer
+    """
+    feature_writer["file"].flush()
+    os.fsync(feature_writer["file"].fileno())
+    write_checkpoint(feature_writer["manifest_file"], feature_writer["unflushed_ids"],
+                     os.fstat(feature_writer["file"].fileno()).st_size)
+    feature_writer["unflushed_ids"] = []
+
+
+def write_feature_row(feature_writer, row, sort_key=None):
+    """Writes a row. The sort key (e.g. the id) has to be JSON serializable,
+    keys of the rows of one output have to be comparable with each other.
+    The first value of the row is recorded in the manifest as its id.
+    :param feature_writer: dict, see open_feature_writer
+    :param row: list, see create_feature_row
+    :param sort_key: str, int or list of them (only used with sort_rows)
+    """
+    if feature_writer["spool_rows"]:
+        feature_writer["file"].write(json.dumps([sort_key, row]) + "\n")
+    else:
+        write_csv_rows(feature_writer, [row])
+    feature_writer["unflushed_ids"].append(row[0])
+    if len(feature_writer["unflushed_ids"]) >= feature_writer["flush_interval"]:
+        flush_feature_writer(feature_writer)
+
+
+def write_run(rows):
+    """Writes a sorted run of the external sort to a temporary file.
+    :param rows: sorted list of [sort key, row]
+    :return: temporary file, positioned at the start """
+    run_file = tempfile.TemporaryFile("w+", encoding="utf-8")
+    for sort_key_and_row in rows:
+        run_file.write(json.dumps(sort_key_and_row) + "\n")
+    run_file.seek(0)
+    return run_file
+
+
+def read_rows(file):
+    """Reads the [sort key, row] lines of a spool or run file.
+    :param file: file object
+    :return: generator of lists [sort key, row] """
+    for line in file:
+        yield json.loads(line)
+
+
+def sort_spool_file(spool_file, run_size=RUN_SIZE):
+    """Sorts the rows of the spool file by their sort keys. If all rows fit in
+    one run they are sorted in memory, else the sorted runs are written to
+    temporary files and merged.
+    :param spool_file: file object of the spool file
+    :param run_size: number of rows sorted in memory per run
+    :return: generator of rows """
+    run_files = []
+    rows = []
+    for sort_key_and_row in read_rows(spool_file):
+        rows.append(sort_key_and_row)
+        if len(rows) == run_size:
+            rows.sort(key=lambda x: x[0])
+            run_files.append(write_run(rows))
+            rows = []
+    rows.sort(key=lambda x: x[0])
+
+    if not run_files:
+        for sort_key, row in rows:
+            yield row
+        return
+
+    run_files.append(write_run(rows))
+    for sort_key, row in heapq.merge(*[read_rows(run_file) for run_file in run_files], key=lambda x: x[0]):
+        yield row
+    for run_file in run_files:
+        run_file.close()
+
+
+def create_batches(rows, batch_size=WRITE_BATCH_SIZE):
+    """Splits the rows into lists of at most batch_size rows.
+    :param rows: iterable of rows
+    :param batch_size: int
+    :return: generator of lists of rows """
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def close_feature_writer(feature_writer, run_size=RUN_SIZE):
+    """Closes the writer. The rows of the spool file are written (sorted with
+    sort_rows) in batches to the output in its format. Then the manifest is
+    removed and at last the spool file, so that a run which is killed in between
+    is not resumed (its output is complete).
+    :param feature_writer: dict, see open_feature_writer
+    :param run_size: number of rows sorted in memory per run
+    """
+    flush_feature_writer(feature_writer)
+    feature_writer["file"].close()
+    feature_writer["manifest_file"].close()
+    manifest_path = Path(feature_writer["output_path"] + MANIFEST_SUFFIX)
+    if not feature_writer["spool_rows"]:
+        manifest_path.unlink()
+        return
+
+    spool_path = Path(feature_writer["output_path"] + SPOOL_SUFFIX)
+    with open(spool_path, "r", encoding="utf-8") as spool_file:
+        number_of_rows = sum(1 for _ in spool_file)
+        spool_file.seek(0)
+        open_output, write_rows, close_output = OUTPUT_FORMATS[feature_writer["output_format"]]
+        output = open_output(feature_writer["output_path"], feature_writer["header"],
+                             feature_writer["float_type"], number_of_rows)
+        if feature_writer["sort_rows"]:
+            rows = sort_spool_file(spool_file, run_size)
+        else:
+            rows = (row for sort_key, row in read_rows(spool_file))
+        for batch in create_batches(rows):
+            write_rows(output, batch)
+        close_output(output)
+    manifest_path.unlink()
+    spool_path.unlink()
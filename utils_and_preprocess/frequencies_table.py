@@ -2,7 +2,14 @@
 # based on this DeReWo corpus:
 # https://www.ids-mannheim.de/digspra/kl/projekte/methoden/derewo/
 # And provides a function to read in this list for further work.
+# The log-rank table of the frequencies is saved as two .npy files (the sorted
+# tokens and their log-ranks, see features.lexical_features) with the hash of the
+# json file, which are loaded memory-mapped by the feature extraction. They are
+# generated at the first use of the json file and can also be created with
+# create_log_rank_table_from_json_file.
 from utils_and_preprocess.utils import save_to_json_file
+from features.lexical_features import generate_log_rank_table
+from constants import TOKEN_FREQ, TOKEN_LOG_RANK_KEYS, TOKEN_LOG_RANKS, TOKEN_LOG_RANK_HASH
 
 
 def get_token_frequencies_from_corpus(corpus_path):
@@ -25,11 +32,25 @@ def get_token_frequencies_from_corpus(corpus_path):
     return frequency_table
 
 
+def create_log_rank_table_from_json_file(json_path=TOKEN_FREQ, keys_path=TOKEN_LOG_RANK_KEYS,
+                                         log_ranks_path=TOKEN_LOG_RANKS, hash_path=TOKEN_LOG_RANK_HASH):
+    """Creates the .npy files of the log-rank table and the hash file from the
+    json frequency table.
+    :param json_path: str
+    :param keys_path: str
+    :param log_ranks_path: str
+    :param hash_path: str
+    """
+    generate_log_rank_table(json_path, keys_path, log_ranks_path, hash_path)
+
+
 def main():
     corpus_path = "data/DeReWo/DeReKo-2014-II-MainArchive-STT.100000.freq"
     data = get_token_frequencies_from_corpus(corpus_path)
     tok_freq_out_file = "token_freq_table.json"
     save_to_json_file(data, tok_freq_out_file)
+    create_log_rank_table_from_json_file(tok_freq_out_file, "token_log_rank_keys.npy", "token_log_ranks.npy",
+                                         "token_log_rank_table.sha256")
 
 
 if __name__ == "__main__":
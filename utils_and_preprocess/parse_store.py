@@ -0,0 +1,157 @@
+# Stores the parsed documents as shards of spacy DocBin files in a directory,
+# so that the features can be computed again (e.g. after a change of the feature
+# set) without parsing the texts again. The index.jsonl of the directory maps
+# each document (name and hash of the text) to its shard and position and
+# records the pipeline components which parsed it.
+# The parses can be read with a spacy model without any pipeline components,
+# only the vocab (with the vectors) of the model is needed.
+import json
+
+from pathlib import Path
+
+from utils_and_preprocess.feature_cache import hash_text
+
+INDEX_FILE_NAME = "index.jsonl"
+# number of documents per shard
+SHARD_SIZE = 1000
+
+
+def read_parse_store_index(store_dir):
+    """Returns the entries of the index of the parse store.
+    :param store_dir: str
+    :return: list of dicts """
+    index_path = Path(store_dir) / INDEX_FILE_NAME
+    if not index_path.exists():
+        return []
+    with open(index_path, "r", encoding="utf-8") as index_file:
+        return [json.loads(line) for line in index_file]
+
+
+def create_doc_bin():
+    """Creates an empty DocBin for the parsed documents, the user data (e.g. the
+    doc statistics) is not stored. spacy is only imported when it is needed.
+    :return: spacy.tokens.DocBin """
+    from spacy.tokens import DocBin
+    return DocBin(store_user_data=False)
+
+
+def read_parse_store_components(store_dir):
+    """Returns the sets of pipeline components which parsed the documents of the
+    parse store. Entries from before the components were recorded were parsed
+    with the whole pipeline and are left out.
+    :param store_dir: str
+    :return: set of frozensets of component names """
+    return set(frozenset(entry["components"]) for entry in read_parse_store_index(store_dir)
+               if "components" in entry)
+
+
+def open_parse_store(store_dir, components=(), shard_size=SHARD_SIZE):
+    """Opens (and creates) the parse store in the directory. New shards are
+    numbered after the existing ones, documents with the same name and text
+    as an already stored document are not stored again.
+    :param store_dir: str
+    :param components: list of the names of the pipeline components which parse
+        the documents, they are recorded in the index
+    :param shard_size: number of documents per shard
+    :return: dict """
+    Path(store_dir).mkdir(parents=True, exist_ok=True)
+    index = read_parse_store_index(store_dir)
+    return {
+        "store_dir": Path(store_dir),
+        "shard_size": shard_size,
+        "components": sorted(components),
+        "shard_number": len(set(entry["shard"] for entry in index)),
+        "stored": set((entry["name"], entry["text_hash"]) for entry in index),
+        "doc_bin": create_doc_bin(),
+        "entries": []
+    }
+
+
+def write_shard(parse_store):
+    """Writes the buffered documents as a new shard and adds them to the index.
+    :param parse_store: dict, see open_parse_store
+    """
+    if not parse_store["entries"]:
+        return
+    shard = f"parses_{parse_store['shard_number']:05d}.spacy"
+    parse_store["doc_bin"].to_disk(parse_store["store_dir"] / shard)
+    with open(parse_store["store_dir"] / INDEX_FILE_NAME, "a", encoding="utf-8") as index_file:
+        for position, (name, text_hash) in enumerate(parse_store["entries"]):
+            index_file.write(json.dumps({"name": name, "text_hash": text_hash, "shard": shard,
+                                         "position": position, "components": parse_store["components"]}) + "\n")
+    parse_store["shard_number"] += 1
+    parse_store["doc_bin"] = create_doc_bin()
+    parse_store["entries"] = []
+
+
+def add_parsed_doc(parse_store, doc, name):
+    """Adds a parsed document to the parse store.
+    :param parse_store: dict, see open_parse_store
+    :param doc: spacy.tokens.doc.Doc
+    :param name: str
+    """
+    key = (name, hash_text(doc.text))
+    if key in parse_store["stored"]:
+        return
+    parse_store["stored"].add(key)
+    parse_store["doc_bin"].add(doc)
+    parse_store["entries"].append(key)
+    if len(parse_store["entries"]) >= parse_store["shard_size"]:
+        write_shard(parse_store)
+
+
+def add_doc_bin(parse_store, doc_bin_bytes, names):
+    """Adds the parsed documents of a serialized DocBin (e.g. from a worker
+    process) to the parse store. Like in add_parsed_doc, documents with the
+    same name and text as an already stored document are not stored again. If
+    all documents are new, the DocBin is merged as a whole, else its documents
+    are read (with an empty vocab, the main process has no spacy model) and
+    only the new ones are added.
+    :param parse_store: dict, see open_parse_store
+    :param doc_bin_bytes: bytes, see spacy.tokens.DocBin.to_bytes
+    :param names: list of tuples (name, text hash) of the documents in the DocBin
+    """
+    names = [tuple(key) for key in names]
+    doc_bin = create_doc_bin().from_bytes(doc_bin_bytes)
+    if len(set(names)) == len(names) and parse_store["stored"].isdisjoint(names):
+        parse_store["doc_bin"].merge(doc_bin)
+        parse_store["entries"].extend(names)
+        parse_store["stored"].update(names)
+    else:
+        from spacy.vocab import Vocab
+        for doc, key in zip(doc_bin.get_docs(Vocab()), names):
+            if key in parse_store["stored"]:
+                continue
+            parse_store["stored"].add(key)
+            parse_store["doc_bin"].add(doc)
+            parse_store["entries"].append(key)
+    if len(parse_store["entries"]) >= parse_store["shard_size"]:
+        write_shard(parse_store)
+
+
+def close_parse_store(parse_store):
+    """Writes the last shard of the parse store.
+    :param parse_store: dict, see open_parse_store
+    """
+    write_shard(parse_store)
+
+
+def read_parsed_docs(store_dir, vocab):
+    """Reads the parsed documents of the parse store shard by shard. If a
+    document name was stored more than once, only its latest parse is read.
+    :param store_dir: str
+    :param vocab: spacy.vocab.Vocab (of the spacy model that parsed the texts)
+    :return: generator of tuples (spacy.tokens.doc.Doc, name)
+    """
+    from spacy.tokens import DocBin
+
+    latest = dict()
+    for entry in read_parse_store_index(store_dir):
+        latest[entry["name"]] = (entry["shard"], entry["position"])
+    names = {shard_and_position: name for name, shard_and_position in latest.items()}
+
+    for shard in sorted(set(shard for shard, position in latest.values())):
+        doc_bin = DocBin().from_disk(Path(store_dir) / shard)
+        for position, doc in enumerate(doc_bin.get_docs(vocab)):
+            if (shard, position) in names:
+                yield doc, names[(shard, position)]
@@ -0,0 +1,222 @@
+# An optional profiler of the feature extraction. It records the wall time of
+# the steps of a run (the parse, the token statistics, every feature group and
+# every feature getter, the aggregates of the chunks of long documents and the
+# writing of the rows), the number of documents, tokens and characters and the
+# slowest documents with the times of their feature groups. The report is
+# written at the end of the run as JSON, CSV or in the text format of
+# Prometheus, see PROFILE_REPORT_FORMATS.
+# The profiler is a dict which is passed as profiler to the functions of
+# extract_features.py, without a profiler (None) nothing is recorded. The
+# profilers of worker processes are merged into the profiler of the main process.
+import csv
+import json
+import time
+import heapq
+
+# number of the slowest documents in the report
+NUMBER_OF_SLOWEST = 10
+# prefix of the metric names in the Prometheus report
+METRIC_PREFIX = "text_complexity"
+
+
+def create_profiler(number_of_slowest=NUMBER_OF_SLOWEST):
+    """Creates an empty profiler.
+    :param number_of_slowest: number of the slowest documents which are kept
+    :return: dict """
+    return {
+        "start": time.perf_counter(),
+        "timings": dict(),
+        "documents": 0,
+        "tokens": 0,
+        "characters": 0,
+        "number_of_slowest": number_of_slowest,
+        # heap of tuples (seconds, number of the record, record of the document)
+        "slowest": [],
+        "records": 0
+    }
+
+
+def record_time(profiler, name, seconds, calls=1, max_seconds=None):
+    """Adds the wall time of a step (e.g. "parse", a feature group or a getter
+    "group.getter") to the profiler.
+    :param profiler: dict, see create_profiler
+    :param name: str
+    :param seconds: float
+    :param calls: number of calls of the step
+    :param max_seconds: the wall time of the longest of the calls or None (seconds)
+    """
+    timing = profiler["timings"].get(name)
+    if timing is None:
+        timing = profiler["timings"][name] = {"calls": 0, "total": 0.0, "max": 0.0}
+    timing["calls"] += calls
+    timing["total"] += seconds
+    timing["max"] = max(timing["max"], seconds if max_seconds is None else max_seconds)
+
+
+def add_slowest_document(profiler, record):
+    """Keeps the record of a document if it is one of the slowest documents.
+    :param profiler: dict, see create_profiler
+    :param record: dict, see record_document
+    """
+    profiler["records"] += 1
+    entry = (record["seconds"], profiler["records"], record)
+    if len(profiler["slowest"]) < profiler["number_of_slowest"]:
+        heapq.heappush(profiler["slowest"], entry)
+    else:
+        heapq.heappushpop(profiler["slowest"], entry)
+
+
+def record_document(profiler, name, tokens, characters, seconds, group_seconds):
+    """Adds a document with the wall time of its features to the profiler.
+    :param profiler: dict, see create_profiler
+    :param name: the name of the document (a chunk of a long document is a
+        tuple (name, index, number of chunks))
+    :param tokens: number of tokens
+    :param characters: number of characters
+    :param seconds: the wall time of the features of the document
+    :param group_seconds: dict with the feature groups as keys and their wall times as values
+    """
+    if isinstance(name, tuple):
+        name = f"{name[0]} (chunk {name[1] + 1} of {name[2]})"
+    profiler["documents"] += 1
+    profiler["tokens"] += tokens
+    profiler["characters"] += characters
+    add_slowest_document(profiler, {"name": str(name), "tokens": tokens, "characters": characters,
+                                    "seconds": seconds, "groups": group_seconds})
+
+
+def time_iterator(iterator, profiler, name):
+    """Yields the items of the iterator and records the time which is spent to
+    get each of them (e.g. the parse of nlp.pipe) under name.
+    :param iterator: iterable
+    :param profiler: dict, see create_profiler
+    :param name: str
+    :return: generator """
+    iterator = iter(iterator)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            record_time(profiler, name, time.perf_counter() - start, calls=0)
+            return
+        record_time(profiler, name, time.perf_counter() - start)
+        yield item
+
+
+def merge_profilers(profiler, other_profiler):
+    """Adds the records of another profiler (e.g. of a worker process) to the profiler.
+    :param profiler: dict, see create_profiler, is changed
+    :param other_profiler: dict, see create_profiler
+    """
+    for name, timing in other_profiler["timings"].items():
+        record_time(profiler, name, timing["total"], timing["calls"], timing["max"])
+    for key in ("documents", "tokens", "characters"):
+        profiler[key] += other_profiler[key]
+    for seconds, number, record in other_profiler["slowest"]:
+        add_slowest_document(profiler, record)
+
+
+def create_profile_report(profiler):
+    """Creates the report of the profiler: the steps sorted by their total wall
+    time and the slowest documents, the slowest first.
+    :param profiler: dict, see create_profiler
+    :return: dict """
+    timings = [{"name": name, "calls": timing["calls"], "total": timing["total"],
+                "mean": timing["total"] / timing["calls"] if timing["calls"] else 0.0, "max": timing["max"]}
+               for name, timing in profiler["timings"].items()]
+    return {
+        "wall_time": time.perf_counter() - profiler["start"],
+        "documents": profiler["documents"],
+        "tokens": profiler["tokens"],
+        "characters": profiler["characters"],
+        "timings": sorted(timings, key=lambda timing: timing["total"], reverse=True),
+        "slowest_documents": [record for seconds, number, record in sorted(profiler["slowest"], reverse=True)]
+    }
+
+
+def write_json_report(report, report_path):
+    """Writes the report as JSON.
+    :param report: dict, see create_profile_report
+    :param report_path: str
+    """
+    with open(report_path, "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=2)
+
+
+def write_csv_report(report, report_path):
+    """Writes the report as CSV, one row for the run, each step and each of the
+    slowest documents (kind "run", "step" and "document").
+    :param report: dict, see create_profile_report
+    :param report_path: str
+    """
+    with open(report_path, "w", encoding="utf-8", newline="") as report_file:
+        writer = csv.writer(report_file, delimiter=",")
+        writer.writerow(["kind", "name", "calls", "total_seconds", "mean_seconds", "max_seconds",
+                         "tokens", "characters"])
+        writer.writerow(["run", "documents", report["documents"], report["wall_time"], "", "",
+                         report["tokens"], report["characters"]])
+        for timing in report["timings"]:
+            writer.writerow(["step", timing["name"], timing["calls"], timing["total"], timing["mean"],
+                             timing["max"], "", ""])
+        for record in report["slowest_documents"]:
+            writer.writerow(["document", record["name"], 1, record["seconds"], record["seconds"],
+                             record["seconds"], record["tokens"], record["characters"]])
+
+
+def escape_label(value):
+    """Escapes the value of a label of the Prometheus text format.
+    :param value: str
+    :return: str """
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def write_prometheus_report(report, report_path):
+    """Writes the report in the text format of Prometheus (e.g. for the textfile
+    collector of the node exporter).
+    :param report: dict, see create_profile_report
+    :param report_path: str
+    """
+    metrics = [
+        ("run_seconds", "gauge", "Wall time of the run.", [("", report["wall_time"])]),
+        ("documents_total", "counter", "Number of documents whose features were calculated.",
+         [("", report["documents"])]),
+        ("tokens_total", "counter", "Number of tokens of the documents.", [("", report["tokens"])]),
+        ("characters_total", "counter", "Number of characters of the documents.", [("", report["characters"])]),
+        ("step_seconds_total", "counter", "Wall time of a step of the feature extraction.",
+         [(f'step="{escape_label(timing["name"])}"', timing["total"]) for timing in report["timings"]]),
+        ("step_calls_total", "counter", "Number of calls of a step of the feature extraction.",
+         [(f'step="{escape_label(timing["name"])}"', timing["calls"]) for timing in report["timings"]]),
+        ("step_max_seconds", "gauge", "Longest call of a step of the feature extraction.",
+         [(f'step="{escape_label(timing["name"])}"', timing["max"]) for timing in report["timings"]]),
+        ("slowest_document_seconds", "gauge", "Wall time of the features of the slowest documents.",
+         [(f'document="{escape_label(record["name"])}",tokens="{record["tokens"]}"', record["seconds"])
+          for record in report["slowest_documents"]])
+    ]
+    with open(report_path, "w", encoding="utf-8") as report_file:
+        for metric, metric_type, description, samples in metrics:
+            name = f"{METRIC_PREFIX}_{metric}"
+            report_file.write(f"# HELP {name} {description}\n")
+            report_file.write(f"# TYPE {name} {metric_type}\n")
+            for labels, value in samples:
+                labels = f"{{{labels}}}" if labels else ""
+                report_file.write(f"{name}{labels} {value}\n")
+
+
+# functions to write the report in each format
+PROFILE_REPORT_FORMATS = {
+    "json": write_json_report,
+    "csv": write_csv_report,
+    "prometheus": write_prometheus_report
+}
+
+
+def write_profile_report(profiler, report_path, report_format="json"):
+    """Writes the report of the profiler.
+    :param profiler: dict, see create_profiler
+    :param report_path: str
+    :param report_format: "json", "csv" or "prometheus", see PROFILE_REPORT_FORMATS
+    :return: dict, the report """
+    report = create_profile_report(profiler)
+    PROFILE_REPORT_FORMATS[report_format](report, report_path)
+    return report
@@ -0,0 +1,73 @@
+# A registry of the resources of the feature extraction: the spacy model, the
+# log-rank table of the token frequencies and the discourse marker tables of
+# the DimLex. Every resource is loaded on its first use and cached for the rest
+# of the process (also in each worker process), so a run only loads what its
+# features need and nothing is loaded before the input is checked. spacy is
+# only imported when a model is loaded.
+from functools import lru_cache
+
+from constants import SPACY_MODEL, TOKEN_FREQ, TOKEN_LOG_RANK_KEYS, TOKEN_LOG_RANKS, TOKEN_LOG_RANK_HASH, \
+    DISCOURSE_MARKER, DISCOURSE_MARKER_WITH_SENSE, ALL_DISCOURSE_MARKER
+from utils_and_preprocess.utils import get_data_from_json_file
+from features.lexical_features import load_log_rank_table
+from features.discourse_features import create_discourse_marker_matcher, create_sense_index
+
+
+@lru_cache(maxsize=None)
+def get_nlp(model_name=SPACY_MODEL, exclude=(), enable=()):
+    """Returns the spacy model, it is loaded on the first call.
+    :param model_name: str
+    :param exclude: tuple of the names of pipeline components which are not loaded
+    :param enable: tuple of the names of pipeline components which are disabled
+        by default (e.g. the senter) and are enabled
+    :return: spacy model """
+    import spacy
+    nlp = spacy.load(model_name, exclude=list(exclude))
+    for component in enable:
+        if component in nlp.disabled:
+            nlp.enable_pipe(component)
+    return nlp
+
+
+def get_model_version(model_name=SPACY_MODEL):
+    """Returns the version of the installed spacy model without loading it.
+    :param model_name: str
+    :return: str """
+    import spacy
+    return spacy.util.get_package_version(model_name)
+
+
+@lru_cache(maxsize=None)
+def get_log_rank_table():
+    """Returns the log-rank table of the token frequencies (based on the DeReWo
+    corpus), see features.lexical_features.load_log_rank_table.
+    :return: dict """
+    return load_log_rank_table(TOKEN_LOG_RANK_KEYS, TOKEN_LOG_RANKS, TOKEN_LOG_RANK_HASH, TOKEN_FREQ)
+
+
+@lru_cache(maxsize=None)
+def get_json_table(path):
+    """Returns the content of a json table. The result is cached, so it must
+    not be changed.
+    :param path: str
+    :return: dict or list """
+    return get_data_from_json_file(path)
+
+
+@lru_cache(maxsize=None)
+def get_discourse_marker(nlp):
+    """Returns the discourse marker tables (based on the DimLex) with the sense
+    index and the matcher, which is compiled with the tokenizer of the spacy
+    model, see features.discourse_features.
+    :param nlp: spacy model
+    :return: dict of discourse markers and senses """
+    disc_marker = get_json_table(DISCOURSE_MARKER)
+    discourse_markers_with_sense = get_json_table(DISCOURSE_MARKER_WITH_SENSE)
+    all_disc_marker_senses = get_json_table(ALL_DISCOURSE_MARKER)
+    return {
+        "disc_marker": disc_marker,
+        "discourse_markers_with_sense": discourse_markers_with_sense,
+        "all_disc_marker_senses": all_disc_marker_senses,
+        "sense_index": create_sense_index(all_disc_marker_senses),
+        "matcher": create_discourse_marker_matcher(nlp, disc_marker, discourse_markers_with_sense)
+    }
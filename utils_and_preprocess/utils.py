@@ -1,5 +1,8 @@
 import json
 import csv
+import numpy as np
+
+from constants import FEATURE_GROUPS, CHUNK_SEPARATORS
 
 
 def get_data_from_json_file(json_file_path):
@@ -49,11 +52,99 @@ def add_nummeric_label(vectores_file_path):
             writer.writerow(line)
 
 
+def select_feature_groups(groups=None):
+    """Returns the selected feature groups in the order of constants.FEATURE_GROUPS,
+    so that the order of the features does not depend on the order of the selection.
+    :param groups: iterable of feature groups or None (all groups)
+    :return: list of feature groups
+    """
+    if not groups:
+        return list(FEATURE_GROUPS)
+    return [group for group in FEATURE_GROUPS if group in groups]
+
+
 def safe_division(n, d):
     """Divides two numbers and returns the result, or 0 if the d is 0."""
     return n / d if d else 0
 
 
+def convert_to_python_numbers(feature_vector):
+    """Converts the numpy numbers of a feature vector (e.g. the counts of the
+    discourse marker senses or a float32 similarity) to python numbers, so
+    that the vector can be serialized as JSON without changing its values.
+    :param feature_vector: list of numbers
+    :return: list of ints and floats
+    """
+    return [value.item() if isinstance(value, np.generic) else value for value in feature_vector]
+
+
+def split_text_into_chunks(text, chunk_size):
+    """Splits the text into chunks of at most chunk_size characters. A chunk ends
+    before the last paragraph boundary in it, or else before the last line break
+    or after the last space (see constants.CHUNK_SEPARATORS), so that the chunks
+    cover the text and are tokenized like the whole text: the line breaks are a
+    whitespace token at the start of the next chunk, a space belongs to the token
+    before it.
+    :param text: str
+    :param chunk_size: int, at least 1
+    :return: list of strings
+    """
+    if chunk_size < 1:
+        raise ValueError(f"The chunk size must be at least 1, not {chunk_size}.")
+    chunks = []
+    start = 0
+    while len(text) - start > chunk_size:
+        end = start + chunk_size
+        for separator in CHUNK_SEPARATORS:
+            position = text.rfind(separator, start, end)
+            if separator == " ":
+                position += 1
+            else:
+                while position > start and text[position - 1].isspace() and text[position - 1] != " ":
+                    position -= 1
+            if position > start:
+                end = position
+                break
+        chunks.append(text[start:end])
+        start = end
+    chunks.append(text[start:])
+    return chunks
+
+
+def validate_text(text, nlp):
+    """Validates the text before parsing and returns True if the text is not
+    empty and not longer than the maximum length the spacy model can parse.
+    :param text (str): Text to be validated.
+    :param nlp: spacy model
+    :return: bool
+    """
+    if not text:
+        return False
+    if len(text) > nlp.max_length:
+        return False
+
+    return True
+
+
+def validate_parsed_doc(doc):
+    """Validates the parsed doc and returns True if the number of sentences
+    is greater than zero. A doc without sentence boundaries (no parser or
+    senter was needed for the features) is one sentence, if it has tokens.
+    :param doc: spacy.tokens.doc.Doc
+    :return: bool
+    """
+    if not doc.has_annotation("SENT_START"):
+        return len(doc) > 0
+    try:
+        first_sentence = next(doc.sents, None)
+    except ValueError:
+        return False
+    if first_sentence is None:
+        return False
+
+    return True
+
+
 def validate_doc(text, nlp):
     """Validates the text and returns True if all of the following conditions are met:
     1. The text is not empty.
@@ -62,15 +153,11 @@ def validate_doc(text, nlp):
     :param text (str): Text to be validated.
     :return: bool
     """
-    if not text:
+    if not validate_text(text, nlp):
         return False
     try:
         doc = nlp(text)
-        sentences = doc.sents
     except ValueError:
         return False
-    if not sentences:
-        return False
-
-    return True
 
+    return validate_parsed_doc(doc)